@@ -1,7 +1,13 @@
+import os
+import cv2
 import numpy as np
-from auxiliares import ler_imagens, calcular_autofaces, centralizar_imagem, exibir_imagens
+from auxiliares import listar_imagens, exibir_imagens
+from modelo import obter_modelo, desempacotar_modelo
+from projecao import matriz_de_autofaces, projetar_lote, reconstruir_lote
+from instrumentacao import instrumentar
 
 
+@instrumentar("aproximacao")
 def aproximar_imagem(imagem, face_media, autofaces):
     """
     Aproxima uma imagem da base usando a combinação linear das autofaces.
@@ -15,49 +21,190 @@ def aproximar_imagem(imagem, face_media, autofaces):
         numpy.array: Imagem aproximada reconstruída.
     """
 
-    matriz_autofaces = np.array([af.flatten() for af in autofaces])
+    pesos = projetar_lote([imagem], face_media, autofaces)[0]
 
-    imagem_centralizada = centralizar_imagem(imagem, face_media)
+    return reconstruir_lote(pesos, face_media, autofaces)
 
-    pesos = np.dot(matriz_autofaces, imagem_centralizada)
 
-    imagem_aproximada = np.dot(
-        matriz_autofaces.T, pesos) + face_media.flatten()
+@instrumentar("aproximacao_postos")
+def aproximar_imagem_postos(imagem, face_media, autofaces, lista_autofaces,
+                            retornar_projecao=False):
+    """
+    Aproxima uma imagem com vários números de autofaces a partir de uma única projeção.
+
+    Como as bases menores são prefixos da maior, cada aproximação é a anterior somada à
+    contribuição das autofaces seguintes: o custo total é o de uma única reconstrução
+    com max(lista_autofaces) autofaces, independentemente de quantos postos são pedidos.
+    Números de autofaces maiores que os disponíveis geram um ValueError, em vez de uma
+    aproximação com menos autofaces que o pedido.
+
+    Args:
+        imagem (numpy.array): Imagem original que será aproximada.
+        face_media (numpy.array): Face média calculada para a base.
+        autofaces (list): Lista de autofaces calculadas, com pelo menos max(lista_autofaces).
+        lista_autofaces (list): Lista com os números de autofaces a serem utilizados.
+        retornar_projecao (bool, opcional): Se True, retorna também os pesos da imagem e a
+            sua distância ao espaço das faces, para reaproveitar a projeção (como em
+            `curva_de_erro`). Padrão é False.
+
+    Returns:
+        list: Imagens aproximadas, na mesma ordem de `lista_autofaces` (e, com
+        `retornar_projecao`, o vetor de pesos e a distância ao espaço das faces).
+    """
+
+    matriz_autofaces = matriz_de_autofaces(autofaces)
+    invalidos = [posto for posto in lista_autofaces if not 0 <= posto <= len(matriz_autofaces)]
+    if invalidos:
+        raise ValueError(f"Há {len(matriz_autofaces)} autofaces disponíveis; números de "
+                         f"autofaces fora do intervalo: {invalidos}.")
+
+    pesos, residuos = projetar_lote([imagem], face_media, matriz_autofaces,
+                                    retornar_residuos=True)
+    pesos = pesos[0]
+
+    acumulada = face_media.flatten().astype(np.float32)
+    aproximacoes = {}
+    posto_anterior = 0
+
+    for posto in sorted(set(lista_autofaces)):
+        acumulada = acumulada + np.dot(
+            pesos[posto_anterior:posto], matriz_autofaces[posto_anterior:posto])
+        aproximacoes[posto] = acumulada.reshape(face_media.shape)
+        posto_anterior = posto
+
+    aproximacoes = [aproximacoes[posto] for posto in lista_autofaces]
+    if retornar_projecao:
+        return aproximacoes, pesos, float(residuos[0])
+    return aproximacoes
+
+
+@instrumentar("curva_erro")
+def calcular_curva_erro(imagem, face_media, autofaces):
+    """
+    Calcula o erro de reconstrução da imagem para todos os números de autofaces de 0 a K.
+
+    Args:
+        imagem (numpy.array): Imagem original.
+        face_media (numpy.array): Face média calculada para a base.
+        autofaces (list): Lista de autofaces calculadas.
+
+    Returns:
+        numpy.array: Erro relativo (norma do resíduo / norma da imagem centralizada) para
+        0, 1, ..., K autofaces.
+    """
 
-    return imagem_aproximada.reshape(face_media.shape)
+    pesos, residuos = projetar_lote([imagem], face_media, autofaces, retornar_residuos=True)
+    return curva_de_erro(pesos[0], residuos[0])
 
 
-def executar_aproximacao(diretorio_imagens, imagem_teste, lista_autofaces, limite=None):
+def curva_de_erro(pesos, residuo):
+    """
+    Calcula a curva de erro de reconstrução a partir de uma projeção já feita.
+
+    Com autofaces ortonormais, o erro quadrático com r autofaces é a soma dos pesos ao
+    quadrado de r em diante mais o quadrado da distância ao espaço das faces, então a
+    curva inteira sai de uma soma acumulada, sem reconstruir nenhuma imagem nem projetar
+    a imagem de novo.
+
+    Args:
+        pesos (numpy.array): Vetor de K pesos da imagem, como os de `projecao.projetar_lote`.
+        residuo (float): Distância da imagem ao espaço das faces.
+
+    Returns:
+        numpy.array: Erro relativo para 0, 1, ..., K autofaces.
+    """
+
+    quadrados = np.asarray(pesos, dtype=np.float64) ** 2
+    restantes = np.append(np.cumsum(quadrados[::-1])[::-1], 0.0) + float(residuo) ** 2
+
+    return np.sqrt(restantes / max(restantes[0], 1e-12))
+
+
+def plotar_curva_erro(erros):
+    """
+    Plota o erro relativo de reconstrução em função do número de autofaces.
+
+    Args:
+        erros (numpy.array): Curva retornada por `calcular_curva_erro`.
+    """
+
+    from matplotlib import pyplot as plt
+
+    plt.figure(figsize=(8, 5))
+    plt.plot(np.arange(len(erros)), erros, marker=".")
+    plt.xlabel("Número de autofaces")
+    plt.ylabel("Erro relativo de reconstrução")
+    plt.title("Erro de Aproximação por Número de Autofaces")
+    plt.grid(True)
+    plt.show()
+
+
+def executar_aproximacao(diretorio_imagens, imagem_teste, lista_autofaces, limite=None,
+                         diretorio_cache=None, exibir_curva=False, cinza=False, resolucao=None,
+                         exibir=True, diretorio_saida=None):
     """
     Aproxima uma imagem utilizando diferentes números de autofaces e exibe os resultados no Matplotlib.
 
     Args:
         diretorio_imagens (str): Caminho do diretório contendo as imagens da base.
-        imagem_teste (numpy.array): Imagem a ser aproximada.
+        imagem_teste (numpy.array): Imagem a ser aproximada, no formato de entrada do modelo
+            (ver `auxiliares.opcoes_de_leitura`).
         lista_autofaces (list): Lista com os números de autofaces a serem utilizados.
         limite (int): Limite máximo de imagens a serem carregadas. Padrão é None.
+        diretorio_cache (str, opcional): Diretório do cache de modelos treinados. Se None,
+            o modelo é treinado a cada execução. Padrão é None.
+        exibir_curva (bool, opcional): Se True, também exibe a curva de erro de reconstrução
+            para todos os números de autofaces até max(lista_autofaces). Padrão é False.
+        cinza (bool, opcional): Se True, trabalha com as imagens em escala de cinza.
+            Padrão é False.
+        resolucao (tuple, opcional): Resolução (altura, largura) para a qual as imagens são
+            redimensionadas na leitura. Padrão é None.
+        exibir (bool, opcional): Se False, nada é exibido (nem a curva) e o Matplotlib não é
+            importado. Padrão é True.
+        diretorio_saida (str, opcional): Se informado, salva cada aproximação nesse diretório
+            como "aproximacao_<num_autofaces>.png". Padrão é None.
 
     Exibe:
         Um grid com a imagem original e as aproximações geradas.
-    """
-
-    imagens = ler_imagens(diretorio_imagens, limite=limite)
-
-    face_media, _ = calcular_autofaces(imagens, max(lista_autofaces))
 
-    imagens_para_exibir = [imagem_teste]
-    titulos_imagens = ["Imagem Original"]
-
-    for num_autofaces in lista_autofaces:
-        _, autofaces = calcular_autofaces(imagens, num_autofaces)
-        imagem_aproximada = aproximar_imagem(
-            imagem_teste, face_media, autofaces)
-        imagens_para_exibir.append(imagem_aproximada)
-        titulos_imagens.append(f"{num_autofaces} Autofaces")
+    Returns:
+        numpy.array: Curva de erro relativo de reconstrução de 0 a max(lista_autofaces).
+    """
 
-    exibir_imagens(
-        imagens_para_exibir,
-        num_colunas=min(4, len(imagens_para_exibir)),
-        titulo_grid="Resultados de Aproximação",
-        titulos_imagens=titulos_imagens
-    )
+    arquivos = listar_imagens(diretorio_imagens, limite=limite)
+    # Com N imagens o modelo tem no máximo N autofaces: números fora desse intervalo falham
+    # antes do treino
+    invalidos = [posto for posto in lista_autofaces if not 0 <= posto <= len(arquivos)]
+    if invalidos:
+        raise ValueError(f"A base tem {len(arquivos)} imagens, então os números de autofaces "
+                         f"devem estar entre 0 e {len(arquivos)}; recebidos: {invalidos}.")
+
+    modelo = obter_modelo(arquivos, num_autofaces=max(lista_autofaces),
+                          diretorio_cache=diretorio_cache, cinza=cinza, resolucao=resolucao)
+    face_media, autofaces_base = desempacotar_modelo(modelo)
+
+    aproximacoes, pesos, residuo = aproximar_imagem_postos(
+        imagem_teste, face_media, autofaces_base, lista_autofaces, retornar_projecao=True)
+
+    if diretorio_saida is not None:
+        os.makedirs(diretorio_saida, exist_ok=True)
+        for num_autofaces, aproximacao in zip(lista_autofaces, aproximacoes):
+            cv2.imwrite(os.path.join(diretorio_saida, f"aproximacao_{num_autofaces}.png"),
+                        np.uint8(np.clip(aproximacao, 0.0, 1.0) * 255.0 + 0.5))
+
+    if exibir:
+        titulos_imagens = ["Imagem Original"] + \
+            [f"{num_autofaces} Autofaces" for num_autofaces in lista_autofaces]
+        exibir_imagens(
+            [imagem_teste] + aproximacoes,
+            num_colunas=min(4, len(aproximacoes) + 1),
+            titulo_grid="Resultados de Aproximação",
+            titulos_imagens=titulos_imagens
+        )
+
+    erros = curva_de_erro(pesos, residuo)
+
+    if exibir and exibir_curva:
+        plotar_curva_erro(erros)
+
+    return erros
@@ -0,0 +1,106 @@
+import os
+import json
+import numpy as np
+
+MAGICO = b"AUTOFACE"
+VERSAO_FORMATO = 1
+ALINHAMENTO = 64
+
+
+def salvar_arrays(dados, caminho):
+    """
+    Salva um dicionário de arrays e metadados em um único arquivo binário.
+
+    O arquivo contém um cabeçalho JSON (metadados e posição de cada array) seguido dos
+    arrays em formato bruto, alinhados a 64 bytes. A escrita é feita em um arquivo
+    temporário e renomeada ao final, para nunca deixar um arquivo pela metade no disco.
+
+    Args:
+        dados (dict): Dicionário com arrays numpy e valores serializáveis em JSON.
+        caminho (str): Caminho do arquivo de saída.
+    """
+
+    arrays = {chave: np.ascontiguousarray(valor)
+              for chave, valor in dados.items() if isinstance(valor, np.ndarray)}
+    metadados = {chave: valor
+                 for chave, valor in dados.items() if not isinstance(valor, np.ndarray)}
+
+    descritores = {}
+    deslocamento = 0
+    for chave, array in arrays.items():
+        descritores[chave] = {
+            "dtype": array.dtype.str,
+            "forma": list(array.shape),
+            "deslocamento": deslocamento,
+        }
+        deslocamento = _alinhar(deslocamento + array.nbytes)
+
+    cabecalho = json.dumps({
+        "versao": VERSAO_FORMATO,
+        "metadados": metadados,
+        "arrays": descritores,
+    }, ensure_ascii=False).encode("utf-8")
+
+    inicio_dados = _alinhar(len(MAGICO) + 8 + len(cabecalho))
+
+    diretorio = os.path.dirname(os.path.abspath(caminho))
+    os.makedirs(diretorio, exist_ok=True)
+    caminho_temporario = f"{caminho}.{os.getpid()}.tmp"
+
+    with open(caminho_temporario, "wb") as arquivo:
+        arquivo.write(MAGICO)
+        arquivo.write(np.uint64(len(cabecalho)).tobytes())
+        arquivo.write(cabecalho)
+        for chave, array in arrays.items():
+            arquivo.seek(inicio_dados + descritores[chave]["deslocamento"])
+            arquivo.write(array.tobytes())
+
+    os.replace(caminho_temporario, caminho)
+
+
+def carregar_arrays(caminho, mmap=True):
+    """
+    Carrega um arquivo salvo por `salvar_arrays`.
+
+    Args:
+        caminho (str): Caminho do arquivo.
+        mmap (bool, opcional): Se True, os arrays são mapeados em memória (somente leitura)
+            em vez de lidos por completo. Padrão é True.
+
+    Returns:
+        dict: Dicionário com os metadados e os arrays salvos.
+    """
+
+    with open(caminho, "rb") as arquivo:
+        if arquivo.read(len(MAGICO)) != MAGICO:
+            raise ValueError(f"O arquivo não é um arquivo de autofaces válido: {caminho}")
+        tamanho_cabecalho = int(np.frombuffer(arquivo.read(8), dtype=np.uint64)[0])
+        cabecalho = json.loads(arquivo.read(tamanho_cabecalho).decode("utf-8"))
+
+    if cabecalho["versao"] != VERSAO_FORMATO:
+        raise ValueError(
+            f"Versão de arquivo não suportada ({cabecalho['versao']}): {caminho}")
+
+    inicio_dados = _alinhar(len(MAGICO) + 8 + tamanho_cabecalho)
+
+    dados = dict(cabecalho["metadados"])
+
+    for chave, descritor in cabecalho["arrays"].items():
+        dtype = np.dtype(descritor["dtype"])
+        forma = tuple(descritor["forma"])
+        deslocamento = inicio_dados + descritor["deslocamento"]
+        if int(np.prod(forma)) == 0:
+            dados[chave] = np.empty(forma, dtype=dtype)
+        elif mmap:
+            dados[chave] = np.memmap(
+                caminho, dtype=dtype, mode="r", offset=deslocamento, shape=forma)
+        else:
+            dados[chave] = np.fromfile(
+                caminho, dtype=dtype, count=int(np.prod(forma)),
+                offset=deslocamento).reshape(forma)
+
+    return dados
+
+
+def _alinhar(deslocamento):
+    return -(-deslocamento // ALINHAMENTO) * ALINHAMENTO
@@ -1,55 +1,257 @@
 import os
+import time
 import cv2
 import numpy as np
-from matplotlib import pyplot as plt
 from glob import glob
+from concurrent.futures import ThreadPoolExecutor
+from instrumentacao import instrumentar, medir_etapa
 
 
-def ler_imagens(diretorio, limite=None):
+FORMATOS_IMAGEM = ("*.jpg", "*.png")
+
+# Fatores de redução aplicados pelo próprio decodificador (no JPEG, via DCT reduzida)
+REDUCOES_COLORIDAS = {2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                      8: cv2.IMREAD_REDUCED_COLOR_8}
+REDUCOES_CINZA = {2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+                  8: cv2.IMREAD_REDUCED_GRAYSCALE_8}
+
+
+def listar_imagens(diretorio, limite=None):
     """
-    Lê todas as imagens de um diretório e seus subdiretórios, até o limite especificado.
-    Caso o diretório contenha apenas uma imagem, retorna essa única imagem como elemento
-    dentro de uma lista.
+    Lista os caminhos das imagens de um diretório e seus subdiretórios, até o limite especificado.
+    Caso o caminho aponte para um arquivo, retorna apenas esse arquivo.
 
     Args:
-        diretorio (str): Caminho do diretório contendo as imagens.
-        limite (int, opcional): Número máximo de imagens a carregar. Padrão é None.
+        diretorio (str): Caminho do diretório (ou arquivo) contendo as imagens.
+        limite (int, opcional): Número máximo de caminhos a retornar. Padrão é None.
 
     Returns:
-        list: Lista de imagens carregadas como arrays numpy normalizados.
+        list: Lista de caminhos das imagens encontradas.
     """
 
     diretorio = os.path.normpath(diretorio)
-    imagens = []
 
     if os.path.isfile(diretorio):
-        imagem = cv2.imread(diretorio)
-        if imagem is None:
-            raise ValueError(
-                f"O arquivo especificado não é uma imagem válida: {diretorio}")
-        return [np.float32(imagem) / 255.0]
+        return [diretorio]
 
-    formatos = ("*.jpg", "*.png")
     arquivos = []
-    for formato in formatos:
+    for formato in FORMATOS_IMAGEM:
         arquivos.extend(
             glob(os.path.join(diretorio, "**", formato), recursive=True))
 
-    if len(arquivos) == 1:
-        imagem = cv2.imread(arquivos[0])
+    if limite is not None:
+        arquivos = arquivos[:limite]
+
+    return arquivos
+
+
+def escolher_modo_leitura(cinza=False, reducao=1):
+    """
+    Escolhe a flag do `cv2.imread` para o modo de cor e o fator de redução desejados.
+
+    Args:
+        cinza (bool, opcional): Se True, decodifica direto em escala de cinza. Padrão é False.
+        reducao (int, opcional): Fator de redução na decodificação (1, 2, 4 ou 8). Padrão é 1.
+
+    Returns:
+        int: Flag de leitura do OpenCV.
+    """
+
+    if reducao > 1:
+        return (REDUCOES_CINZA if cinza else REDUCOES_COLORIDAS)[reducao]
+    return cv2.IMREAD_GRAYSCALE if cinza else cv2.IMREAD_COLOR
+
+
+def escolher_reducao(altura, largura, resolucao):
+    """
+    Escolhe o maior fator de redução na decodificação que ainda mantém a imagem pelo menos
+    do tamanho da resolução alvo, de modo que o redimensionamento final só reduza.
+
+    Args:
+        altura (int): Altura original da imagem.
+        largura (int): Largura original da imagem.
+        resolucao (tuple): Resolução alvo (altura, largura).
+
+    Returns:
+        int: Fator de redução (1, 2, 4 ou 8).
+    """
+
+    reducao = 1
+    for fator in (2, 4, 8):
+        if altura // fator >= resolucao[0] and largura // fator >= resolucao[1]:
+            reducao = fator
+    return reducao
+
+
+def ler_arquivo_imagem(arquivo_imagem, cinza=False, resolucao=None, reducao=1):
+    """
+    Decodifica um arquivo de imagem no modo de cor e na resolução pedidos.
+
+    Args:
+        arquivo_imagem (str): Caminho da imagem.
+        cinza (bool, opcional): Se True, decodifica direto em escala de cinza, com um único
+            canal. Padrão é False.
+        resolucao (tuple, opcional): Resolução alvo (altura, largura). Se None, mantém a
+            resolução original. Padrão é None.
+        reducao (int, opcional): Fator de redução aplicado já na decodificação, como o de
+            `escolher_reducao`. Padrão é 1.
+
+    Returns:
+        numpy.array: Imagem uint8 (altura, largura) em escala de cinza ou (altura, largura, 3)
+        em BGR, ou None se o arquivo não puder ser lido.
+    """
+
+    imagem = cv2.imread(arquivo_imagem, escolher_modo_leitura(cinza, reducao))
+    if imagem is not None and resolucao is not None and imagem.shape[:2] != tuple(resolucao):
+        imagem = cv2.resize(imagem, (resolucao[1], resolucao[0]), interpolation=cv2.INTER_AREA)
+    return imagem
+
+
+def opcoes_de_leitura(formato):
+    """
+    Obtém as opções de leitura que produzem imagens no formato de entrada de um modelo.
+
+    Args:
+        formato (tuple): Formato das imagens do modelo, (altura, largura) ou
+            (altura, largura, canais).
+
+    Returns:
+        dict: Argumentos `cinza` e `resolucao` para `carregar_arquivos` e `ler_imagens`.
+    """
+
+    return {"cinza": len(formato) == 2, "resolucao": tuple(formato[:2])}
+
+
+@instrumentar("decodificacao")
+def carregar_arquivos(arquivos, num_threads=None, relatorio=False, cinza=False, resolucao=None,
+                      normalizar=True):
+    """
+    Carrega uma lista de arquivos de imagem em paralelo, escrevendo cada imagem
+    diretamente em um único array contíguo pré-alocado. Arquivos que não puderem
+    ser lidos são ignorados.
+
+    A decodificação usa um pool de threads, já que o `cv2.imread` libera o GIL. O
+    resultado tem formato (N, altura, largura, canais): pode ser percorrido como uma
+    lista de imagens e visto como a matriz N×D de dados com `reshape(N, -1)`, sem cópia.
+
+    Com `cinza`, as imagens são decodificadas direto com um canal (um terço da memória e
+    do custo das etapas seguintes). Com `resolucao`, são redimensionadas na leitura; quando
+    a resolução alvo é bem menor que a original, parte da redução é feita pelo próprio
+    decodificador, o que também acelera a leitura de JPEGs.
+
+    Args:
+        arquivos (list): Lista de caminhos das imagens.
+        num_threads (int, opcional): Número de threads de decodificação. Se None, usa o
+            número de CPUs disponíveis. Padrão é None.
+        relatorio (bool, opcional): Se True, exibe o tempo total e a vazão da leitura.
+            Padrão é False.
+        cinza (bool, opcional): Se True, decodifica em escala de cinza. Padrão é False.
+        resolucao (tuple, opcional): Resolução alvo (altura, largura). Se None, todas as
+            imagens devem ter a resolução da primeira. Padrão é None.
+        normalizar (bool, opcional): Se False, mantém os pixels em uint8, sem converter
+            para float32. Padrão é True.
+
+    Returns:
+        tuple: Array numpy com as imagens normalizadas (float32 entre 0 e 1), no formato
+        (N, altura, largura, canais) ou (N, altura, largura) em escala de cinza, e lista
+        com os índices, em `arquivos`, das imagens carregadas com sucesso.
+    """
+
+    inicio = time.perf_counter()
+
+    # A primeira imagem válida define o formato do array pré-alocado
+    primeira = None
+    for indice_inicial, arquivo_imagem in enumerate(arquivos):
+        primeira = ler_arquivo_imagem(arquivo_imagem, cinza)
+        if primeira is not None:
+            break
+
+    if primeira is None:
+        return np.empty((0,), dtype=np.float32), []
+
+    # A redução na decodificação é escolhida pelo tamanho da primeira imagem
+    reducao = 1
+    if resolucao is not None:
+        reducao = escolher_reducao(*primeira.shape[:2], resolucao)
+        primeira = ler_arquivo_imagem(arquivos[indice_inicial], cinza, resolucao, reducao)
+
+    formato = primeira.shape
+    restantes = len(arquivos) - indice_inicial
+    imagens = np.empty((restantes,) + formato, dtype=np.float32 if normalizar else np.uint8)
+
+    def copiar(imagem, destino):
+        if normalizar:
+            np.divide(imagem, np.float32(255.0), out=destino, dtype=np.float32)
+        else:
+            destino[...] = imagem
+
+    copiar(primeira, imagens[0])
+
+    def decodificar(posicao):
+        arquivo_imagem = arquivos[indice_inicial + posicao]
+        imagem = ler_arquivo_imagem(arquivo_imagem, cinza, resolucao, reducao)
         if imagem is None:
+            return False
+        if imagem.shape != formato:
             raise ValueError(
-                f"O arquivo encontrado não é uma imagem válida: {arquivos[0]}")
-        return [np.float32(imagem) / 255.0]
+                f"A imagem {arquivo_imagem} tem formato {imagem.shape}, "
+                f"diferente do formato da base {formato}.")
+        copiar(imagem, imagens[posicao])
+        return True
 
-    for i, arquivo_imagem in enumerate(arquivos):
-        if limite is not None and i >= limite:
-            break
-        imagem = cv2.imread(arquivo_imagem)
-        if imagem is not None:
-            imagens.append(np.float32(imagem) / 255.0)
+    num_threads = num_threads or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        carregadas = [True] + list(executor.map(decodificar, range(1, restantes)))
+
+    validos = [indice_inicial + i for i, ok in enumerate(carregadas) if ok]
+
+    if len(validos) < restantes:
+        # Compacta as linhas válidas no início do array, sem realocar
+        for destino, origem in enumerate(i for i, ok in enumerate(carregadas) if ok):
+            if destino != origem:
+                imagens[destino] = imagens[origem]
+        imagens = imagens[:len(validos)]
+
+    if relatorio:
+        duracao = time.perf_counter() - inicio
+        megabytes = imagens.nbytes / 2 ** 20
+        print(f"{len(validos)} imagens carregadas em {duracao:.2f} s "
+              f"({len(validos) / max(duracao, 1e-9):.1f} imagens/s, "
+              f"{megabytes / max(duracao, 1e-9):.1f} MB/s).")
+
+    return imagens, validos
+
+
+def ler_imagens(diretorio, limite=None, cinza=False, resolucao=None):
+    """
+    Lê todas as imagens de um diretório e seus subdiretórios, até o limite especificado.
+    Caso o diretório contenha apenas uma imagem, retorna essa única imagem como elemento
+    dentro de uma lista.
+
+    Args:
+        diretorio (str): Caminho do diretório contendo as imagens.
+        limite (int, opcional): Número máximo de imagens a carregar. Padrão é None.
+        cinza (bool, opcional): Se True, decodifica em escala de cinza. Padrão é False.
+        resolucao (tuple, opcional): Resolução alvo (altura, largura). Padrão é None.
 
-    if not imagens:
+    Returns:
+        numpy.array: Array (N, altura, largura, canais), ou (N, altura, largura) em escala
+        de cinza, com as imagens normalizadas.
+    """
+
+    diretorio = os.path.normpath(diretorio)
+    arquivos = listar_imagens(diretorio, limite=limite)
+
+    if len(arquivos) == 1:
+        imagens, _ = carregar_arquivos(arquivos, cinza=cinza, resolucao=resolucao)
+        if len(imagens) == 0:
+            raise ValueError(
+                f"O arquivo especificado não é uma imagem válida: {arquivos[0]}")
+        return imagens
+
+    imagens, _ = carregar_arquivos(arquivos, cinza=cinza, resolucao=resolucao)
+
+    if len(imagens) == 0:
         raise ValueError(
             f"Nenhuma imagem válida encontrada no diretório: {diretorio}")
 
@@ -70,46 +272,321 @@ def centralizar_imagem(imagem, face_media):
     return imagem.flatten() - face_media.flatten()
 
 
-def calcular_autofaces(imagens, num_autofaces=15):
+METODOS_AUTOFACES = ("exato", "aleatorio", "auto")
+TAMANHO_BLOCO_GRAM = 256
+
+
+@instrumentar("autofaces")
+def calcular_autofaces(imagens, num_autofaces=15, retornar_autovalores=False, metodo="exato",
+                       iteracoes_potencia=4, semente=None, variancia_explicada=None,
+                       retornar_variancia_total=False, sobrescrever=False,
+                       tamanho_bloco=TAMANHO_BLOCO_GRAM):
     """
     Calcula a face média e as autofaces (autovetores) de forma otimizada,
     utilizando a matriz de covariância reduzida.
 
+    O método "exato" decompõe a menor entre a matriz reduzida N×N (Gram) e a matriz de
+    covariância D×D. O método "aleatorio" usa uma SVD aleatorizada com iterações de
+    potência, que calcula apenas os primeiros componentes em O(N·D·k). O método "auto"
+    escolhe o aleatorizado quando `num_autofaces` é bem menor que min(N, D).
+
+    Com `variancia_explicada`, `num_autofaces` passa a ser o máximo: são mantidas apenas
+    as primeiras autofaces necessárias para explicar essa fração da variância total, e a
+    retroprojeção (no método exato pela matriz de Gram) só é feita para elas.
+
+    Memória: a matriz de dados nunca é copiada por inteiro. Se ela pode ser alterada
+    (`sobrescrever`, ou quando a conversão de `imagens` já criou uma cópia), é centralizada
+    no lugar; senão (por exemplo, um `numpy.memmap` somente leitura), cada bloco de
+    `tamanho_bloco` linhas é centralizado num buffer reutilizado no momento do uso. Só o
+    triângulo superior da matriz de Gram é calculado, bloco a bloco e direto na matriz
+    float64 que o `numpy.linalg.eigh` usa (que, em float32, seria convertida numa cópia),
+    e a retroprojeção acumula a base K×D contígua por blocos. Além dos dados, o pico é de
+    cerca de 2·N² valores float64 (a matriz de Gram e os seus autovetores; D² no caso da
+    covariância), a base K×D e dois blocos de `tamanho_bloco` linhas: para 3.000 imagens
+    de 112×92, 137 MB além dos 118 MB dos dados, contra 290 MB antes, quando a base era
+    centralizada numa cópia.
+
     Args:
-        imagens (list): Lista de imagens da base, cada uma representada como um array numpy.
+        imagens (list): Lista de imagens da base, cada uma representada como um array numpy,
+            ou array (N, altura, largura, canais) como o retornado por `carregar_arquivos`.
         num_autofaces (int, opcional): Número de autofaces a serem calculadas. Padrão é 15.
+        retornar_autovalores (bool, opcional): Se True, também retorna os autovalores
+            da matriz reduzida em ordem decrescente. Padrão é False.
+        metodo (str, opcional): "exato", "aleatorio" ou "auto". Padrão é "exato".
+        iteracoes_potencia (int, opcional): Iterações de potência do método aleatorizado.
+            Padrão é 4.
+        semente (int, opcional): Semente do gerador aleatório do método aleatorizado.
+            Padrão é None.
+        variancia_explicada (float, opcional): Fração da variância total (entre 0 e 1) que
+            as autofaces mantidas devem explicar. Padrão é None.
+        retornar_variancia_total (bool, opcional): Se True, também retorna a variância
+            total dos dados (soma de todos os autovalores), inclusive no método aleatorizado,
+            que não calcula todos eles. Padrão é False.
+        sobrescrever (bool, opcional): Se True e `imagens` for um array float32, ele é
+            centralizado no lugar e, ao final, contém as imagens menos a face média.
+            Padrão é False.
+        tamanho_bloco (int, opcional): Linhas da matriz de dados processadas por vez.
+            Padrão é 256.
 
     Returns:
-        tuple: Face média (numpy.array) e lista de autofaces (list).
+        tuple: Face média (numpy.array) e array contíguo (K, altura, largura[, canais])
+        com as autofaces. Com `retornar_autovalores`, inclui ainda o array de autovalores
+        e, com `retornar_variancia_total`, a variância total.
     """
 
-    dados = np.array([imagem.flatten()
-                     for imagem in imagens], dtype=np.float32)
+    if metodo not in METODOS_AUTOFACES:
+        raise ValueError(
+            f"Método desconhecido: {metodo}. Use um de {METODOS_AUTOFACES}.")
+
+    formato = imagens[0].shape
+    if isinstance(imagens, np.ndarray):
+        # Array contíguo do carregador: a matriz de dados é apenas uma visão
+        dados = np.asarray(imagens, dtype=np.float32).reshape(len(imagens), -1)
+        alteravel = dados.flags.writeable and (
+            sobrescrever or not np.may_share_memory(dados, imagens))
+    else:
+        dados = np.empty((len(imagens), imagens[0].size), dtype=np.float32)
+        for linha, imagem in zip(dados, imagens):
+            linha[:] = np.ravel(imagem)
+        alteravel = True
+
+    with medir_etapa("centralizacao", dados.nbytes):
+        face_media = np.mean(dados, axis=0, dtype=np.float64).astype(np.float32)
+        media_pendente = face_media
+        if alteravel:
+            for inicio in range(0, len(dados), tamanho_bloco):
+                dados[inicio:inicio + tamanho_bloco] -= face_media
+            media_pendente = None
+
+    if metodo == "auto":
+        metodo = escolher_metodo_autofaces(*dados.shape, num_autofaces)
+
+    # Os métodos exatos calculam todos os autovalores, cuja soma já é a variância total;
+    # o aleatorizado só calcula os primeiros, então ela vem do traço de XᵀX
+    variancia_total = None
+    if metodo == "aleatorio" and (variancia_explicada is not None or retornar_variancia_total):
+        variancia_total = sum(
+            float(np.einsum("ij,ij->", bloco, bloco, dtype=np.float64))
+            for _, bloco in _blocos_centralizados(dados, media_pendente, tamanho_bloco))
+
+    if metodo == "aleatorio":
+        autovalores, autovetores_norm = _decompor_aleatorio(
+            dados, media_pendente, num_autofaces, iteracoes_potencia, semente)
+        if variancia_explicada is not None:
+            autovetores_norm = autovetores_norm[:escolher_num_autofaces(
+                autovalores, variancia_total, variancia_explicada, num_autofaces)]
+    elif dados.shape[1] < dados.shape[0]:
+        autovalores, autovetores_norm = _decompor_covariancia(
+            dados, media_pendente, num_autofaces, variancia_explicada, tamanho_bloco)
+    else:
+        autovalores, autovetores_norm = _decompor_gram(
+            dados, media_pendente, num_autofaces, variancia_explicada, tamanho_bloco)
 
-    face_media = np.mean(dados, axis=0)
+    if variancia_total is None:
+        variancia_total = float(np.maximum(autovalores, 0).sum())
 
-    dados_centralizados = dados - face_media
+    autofaces = np.ascontiguousarray(autovetores_norm, dtype=np.float32).reshape(
+        (-1,) + tuple(formato))
 
-    matriz_reduzida = np.dot(dados_centralizados, dados_centralizados.T)
+    if retornar_autovalores and retornar_variancia_total:
+        return face_media.reshape(formato), autofaces, autovalores, variancia_total
+    if retornar_autovalores:
+        return face_media.reshape(formato), autofaces, autovalores
 
-    autovalores, autovetores_reduzidos = np.linalg.eigh(matriz_reduzida)
+    return face_media.reshape(formato), autofaces
 
-    indices = np.argsort(autovalores)[::-1]
-    autovalores = autovalores[indices]
-    autovetores_reduzidos = autovetores_reduzidos[:, indices]
 
-    autovetores_reduzidos = autovetores_reduzidos[:, :num_autofaces]
+def escolher_metodo_autofaces(num_imagens, dimensao, num_autofaces):
+    """
+    Escolhe o método de decomposição mais barato para o tamanho do problema.
 
-    autovetores_originais = np.dot(
-        dados_centralizados.T, autovetores_reduzidos)
+    Args:
+        num_imagens (int): Número de imagens da base (N).
+        dimensao (int): Número de pixels de cada imagem (D).
+        num_autofaces (int): Número de autofaces desejadas (k).
 
-    autovetores_norm = np.array([
-        vetor / np.linalg.norm(vetor) for vetor in autovetores_originais.T
-    ])
+    Returns:
+        str: "aleatorio" quando k é pequeno frente a min(N, D) e o problema é grande,
+        "exato" caso contrário.
+    """
 
-    autofaces = [vetor.reshape(imagens[0].shape) for vetor in autovetores_norm]
+    menor_lado = min(num_imagens, dimensao)
+    if menor_lado >= 1000 and num_autofaces <= menor_lado // 10:
+        return "aleatorio"
+    return "exato"
 
-    return face_media.reshape(imagens[0].shape), autofaces
+
+def escolher_num_autofaces(autovalores, variancia_total, variancia_explicada, maximo=None):
+    """
+    Escolhe o menor número de autofaces que explica uma fração da variância total.
+
+    Args:
+        autovalores (numpy.array): Autovalores em ordem decrescente (podem ser só os primeiros).
+        variancia_total (float): Soma de todos os autovalores. Se None, usa a soma de
+            `autovalores`, que então devem ser todos.
+        variancia_explicada (float): Fração desejada, entre 0 e 1.
+        maximo (int, opcional): Número máximo de autofaces. Padrão é None.
+
+    Returns:
+        int: Número de autofaces (ao menos 1). Se os autovalores disponíveis não atingem a
+        fração desejada, retorna todos (limitados a `maximo`).
+    """
+
+    if not 0 < variancia_explicada <= 1:
+        raise ValueError("A variância explicada deve estar entre 0 e 1.")
+
+    autovalores = np.maximum(np.asarray(autovalores, dtype=np.float64), 0)
+    if variancia_total is None:
+        variancia_total = autovalores.sum()
+    acumulada = np.cumsum(autovalores) / max(variancia_total, 1e-30)
+    num_autofaces = int(np.searchsorted(acumulada, variancia_explicada * (1 - 1e-9))) + 1
+    num_autofaces = min(num_autofaces, len(autovalores))
+    if maximo is not None:
+        num_autofaces = min(num_autofaces, maximo)
+    return max(num_autofaces, 1)
+
+
+def _blocos_centralizados(dados, media, tamanho_bloco, buffer=None):
+    # Percorre blocos de linhas já centralizados. Se `media` é None os dados já estão
+    # centralizados e os blocos são visões; senão cada bloco é centralizado num buffer
+    # reutilizado, sem alterar os dados
+    for inicio in range(0, len(dados), tamanho_bloco):
+        bloco = dados[inicio:inicio + tamanho_bloco]
+        if media is not None:
+            if buffer is None:
+                buffer = np.empty((min(tamanho_bloco, len(dados)), dados.shape[1]),
+                                  dtype=np.float32)
+            bloco = np.subtract(bloco, media, out=buffer[:len(bloco)])
+        yield inicio, bloco
+
+
+def montar_gram(dados, media=None, tamanho_bloco=TAMANHO_BLOCO_GRAM, simetrica=False):
+    """
+    Monta a matriz de Gram (X - m)(X - m)ᵀ por blocos de linhas, sem copiar os dados.
+
+    Só o triângulo superior é calculado, e cada bloco é escrito direto na posição final.
+    Os produtos são em float32; a matriz é float64 porque é o tipo usado pelo
+    `numpy.linalg.eigh`.
+
+    Args:
+        dados (numpy.array): Matriz N×D (pode ser um `numpy.memmap`).
+        media (numpy.array, opcional): Vetor subtraído de cada linha. Se None, os dados são
+            usados como estão. Padrão é None.
+        tamanho_bloco (int, opcional): Linhas processadas por vez. Padrão é 256.
+        simetrica (bool, opcional): Se True, o triângulo inferior também é preenchido.
+            Padrão é False.
+
+    Returns:
+        numpy.array: Matriz N×N float64.
+    """
+
+    num_imagens = len(dados)
+    gram = np.empty((num_imagens, num_imagens), dtype=np.float64)
+    buffer = None
+    if media is not None:
+        buffer = np.empty((min(tamanho_bloco, num_imagens), dados.shape[1]), dtype=np.float32)
+
+    for inicio, bloco in _blocos_centralizados(dados, media, tamanho_bloco):
+        fim = inicio + len(bloco)
+        # O bloco da linha fica no buffer do gerador externo enquanto os blocos das colunas
+        # à direita usam `buffer`
+        gram[inicio:fim, inicio:fim] = np.dot(bloco, bloco.T)
+        restantes = dados[fim:]
+        for deslocamento, coluna in _blocos_centralizados(restantes, media, tamanho_bloco,
+                                                          buffer):
+            inicio_coluna = fim + deslocamento
+            fim_coluna = inicio_coluna + len(coluna)
+            gram[inicio:fim, inicio_coluna:fim_coluna] = np.dot(bloco, coluna.T)
+            if simetrica:
+                gram[inicio_coluna:fim_coluna, inicio:fim] = \
+                    gram[inicio:fim, inicio_coluna:fim_coluna].T
+
+    return gram
+
+
+def _decompor_gram(dados, media, num_autofaces, variancia_explicada=None,
+                   tamanho_bloco=TAMANHO_BLOCO_GRAM):
+    with medir_etapa("gram", dados.nbytes):
+        matriz_reduzida = montar_gram(dados, media, tamanho_bloco)
+
+    with medir_etapa("autovetores", matriz_reduzida.nbytes):
+        autovalores, autovetores_reduzidos = np.linalg.eigh(matriz_reduzida, UPLO="U")
+        # Liberada antes da retroprojeção, que aloca a base
+        del matriz_reduzida
+
+    autovalores = autovalores[::-1]
+    if variancia_explicada is not None:
+        num_autofaces = escolher_num_autofaces(
+            autovalores, None, variancia_explicada, num_autofaces)
+    num_autofaces = min(num_autofaces, len(autovalores))
+    # Autovetores dos maiores autovalores (eigh os retorna em ordem crescente), um por linha
+    autovetores_reduzidos = np.ascontiguousarray(
+        autovetores_reduzidos[:, ::-1][:, :num_autofaces].T, dtype=np.float32)
+
+    with medir_etapa("retroprojecao", dados.nbytes):
+        # Base K×D acumulada por blocos de linhas: U = Vᵀ X_c
+        autovetores_norm = np.zeros((num_autofaces, dados.shape[1]), dtype=np.float32)
+        for inicio, bloco in _blocos_centralizados(dados, media, tamanho_bloco):
+            autovetores_norm += np.dot(autovetores_reduzidos[:, inicio:inicio + len(bloco)],
+                                       bloco)
+        normas = np.linalg.norm(autovetores_norm, axis=1, keepdims=True)
+        autovetores_norm /= np.maximum(normas, np.finfo(np.float32).tiny)
+
+    return autovalores, autovetores_norm
+
+
+def _decompor_covariancia(dados, media, num_autofaces, variancia_explicada=None,
+                          tamanho_bloco=TAMANHO_BLOCO_GRAM):
+    # Com menos pixels que imagens, a covariância D×D é menor que a matriz de Gram
+    with medir_etapa("covariancia", dados.nbytes):
+        covariancia = np.zeros((dados.shape[1], dados.shape[1]), dtype=np.float64)
+        for _, bloco in _blocos_centralizados(dados, media, tamanho_bloco):
+            covariancia += np.dot(bloco.T, bloco)
+
+    with medir_etapa("autovetores", covariancia.nbytes):
+        autovalores, autovetores = np.linalg.eigh(covariancia)
+        del covariancia
+
+    autovalores = autovalores[::-1]
+    if variancia_explicada is not None:
+        num_autofaces = escolher_num_autofaces(
+            autovalores, None, variancia_explicada, num_autofaces)
+    autovetores_norm = np.ascontiguousarray(autovetores[:, ::-1][:, :num_autofaces].T)
+
+    return autovalores, autovetores_norm
+
+
+def _produto_centralizado(dados, media, matriz, transposta=False):
+    # X_c·M (ou X_cᵀ·M) sem formar X_c: X_c·M = X·M - 1(mᵀM) e X_cᵀ·M = Xᵀ·M - m(1ᵀM)
+    if transposta:
+        produto = np.dot(dados.T, matriz)
+        if media is not None:
+            produto -= np.outer(media, matriz.sum(axis=0))
+        return produto
+    produto = np.dot(dados, matriz)
+    if media is not None:
+        produto -= np.dot(media, matriz)
+    return produto
+
+
+@instrumentar("svd_aleatoria")
+def _decompor_aleatorio(dados, media, num_autofaces, iteracoes_potencia, semente,
+                        sobreamostragem=10):
+    # SVD aleatorizada (Halko, Martinsson e Tropp), com reortogonalização por QR
+    gerador = np.random.default_rng(semente)
+    num_colunas = min(num_autofaces + sobreamostragem, *dados.shape)
+
+    aleatoria = gerador.standard_normal((dados.shape[1], num_colunas)).astype(np.float32)
+    base, _ = np.linalg.qr(_produto_centralizado(dados, media, aleatoria))
+
+    for _ in range(iteracoes_potencia):
+        base, _ = np.linalg.qr(_produto_centralizado(dados, media, base, transposta=True))
+        base, _ = np.linalg.qr(_produto_centralizado(dados, media, base))
+
+    pequena = _produto_centralizado(dados, media, base, transposta=True).T
+    _, valores_singulares, autovetores_norm = np.linalg.svd(pequena, full_matrices=False)
+
+    return valores_singulares ** 2, autovetores_norm[:num_autofaces]
 
 
 def exibir_imagens(imagens, num_colunas=5, titulo_grid="Grid de Imagens", titulos_imagens=None):
@@ -123,6 +600,9 @@ def exibir_imagens(imagens, num_colunas=5, titulo_grid="Grid de Imagens", titulo
         titulos_imagens (list, opcional): Lista de títulos para cada imagem. Padrão é None.
         cmap (str, opcional): Mapa de cores a ser utilizado. Padrão é "gray".
     """
+    # Importado aqui para que execuções sem interface gráfica não paguem o custo do Matplotlib
+    from matplotlib import pyplot as plt
+
     num_linhas = -(-len(imagens) // num_colunas)
 
     fig, axes = plt.subplots(num_linhas, num_colunas,
@@ -136,7 +616,10 @@ def exibir_imagens(imagens, num_colunas=5, titulo_grid="Grid de Imagens", titulo
         axes = axes.flatten()
 
     for i, imagem in enumerate(imagens):
-        axes[i].imshow(cv2.cvtColor(imagem, cv2.COLOR_BGR2RGB))
+        if imagem.ndim == 2:
+            axes[i].imshow(imagem, cmap="gray")
+        else:
+            axes[i].imshow(cv2.cvtColor(imagem, cv2.COLOR_BGR2RGB))
         if titulos_imagens:
             axes[i].set_title(titulos_imagens[i], fontsize=10)
         axes[i].axis("off")
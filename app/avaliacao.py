@@ -0,0 +1,483 @@
+import os
+import json
+import time
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from auxiliares import carregar_arquivos, montar_gram
+from reconhecimento import listar_bases_de_dados
+
+# Matrizes (Gram ou decomposição da base inteira) e rótulos compartilhados pelas dobras de
+# um processo
+_COMPARTILHADO = {}
+
+
+def dividir_em_dobras(rotulos, num_dobras=5, semente=0):
+    """
+    Divide as amostras em dobras estratificadas: as imagens de cada pessoa são
+    embaralhadas e distribuídas em rodízio, para que cada dobra tenha aproximadamente a
+    mesma proporção de cada pessoa.
+
+    Args:
+        rotulos (list): Rótulo de cada amostra.
+        num_dobras (int, opcional): Número de dobras. Se for igual ao número de amostras,
+            a divisão é a de deixar-um-de-fora. Padrão é 5.
+        semente (int, opcional): Semente do embaralhamento. Padrão é 0.
+
+    Returns:
+        list: Array de índices de teste de cada dobra.
+    """
+
+    rotulos = np.asarray(rotulos)
+    if not 2 <= num_dobras <= len(rotulos):
+        raise ValueError(f"O número de dobras deve estar entre 2 e {len(rotulos)}.")
+    if num_dobras == len(rotulos):
+        return [np.array([i]) for i in range(len(rotulos))]
+
+    gerador = np.random.default_rng(semente)
+    dobra_de = np.empty(len(rotulos), dtype=np.int64)
+    deslocamento = 0
+    for rotulo in np.unique(rotulos):
+        amostras = gerador.permutation(np.flatnonzero(rotulos == rotulo))
+        # O deslocamento evita que as pessoas com poucas imagens fiquem todas nas primeiras
+        # dobras
+        dobra_de[amostras] = (np.arange(len(amostras)) + deslocamento) % num_dobras
+        deslocamento += len(amostras)
+
+    return [np.flatnonzero(dobra_de == dobra) for dobra in range(num_dobras)]
+
+
+def _iniciar_processo(caminhos, rotulos):
+    for nome, caminho in caminhos.items():
+        _COMPARTILHADO[nome] = np.load(caminho, mmap_mode="r")
+    _COMPARTILHADO["rotulos"] = np.asarray(rotulos)
+
+
+def remover_posto_um(autovalores, vetor, rho, k):
+    """
+    Calcula os k maiores autopares de diag(autovalores) - rho·vetor·vetorᵀ, com rho > 0,
+    sem decompor a matriz.
+
+    Os novos autovalores são as raízes da equação secular 1 = rho·Σ vⱼ²/(dⱼ - t), uma em
+    cada intervalo entre autovalores antigos consecutivos, encontradas por interpolação
+    racional (um modelo com o polo mais próximo) com salvaguarda de bisseção. Cada raiz é
+    procurada como deslocamento em relação ao polo mais próximo, para que as diferenças
+    dⱼ - t (e os autovetores (D - t)⁻¹v) não percam precisão. Componentes desprezíveis de
+    `vetor` e autovalores repetidos são deflacionados como no LAPACK (rotações de Givens):
+    os autopares correspondentes não mudam. O custo é O(k·n) por iteração, contra O(n³) de
+    uma decomposição completa.
+
+    Args:
+        autovalores (numpy.array): Autovalores em ordem decrescente.
+        vetor (numpy.array): Vetor da atualização, nas coordenadas da base dos autovetores.
+        rho (float): Peso da atualização.
+        k (int): Número de autopares retornados.
+
+    Returns:
+        tuple: Os k maiores autovalores, em ordem decrescente, e a matriz n×k dos autovetores
+        correspondentes, nas coordenadas da base original.
+    """
+
+    d = np.asarray(autovalores, dtype=np.float64)
+    num = len(d)
+    k = min(k, num)
+    norma = float(np.dot(vetor, vetor))
+    rho_total = rho * norma
+    u = np.array(vetor, dtype=np.float64) / np.sqrt(max(norma, np.finfo(np.float64).tiny))
+    tolerancia = 8 * np.finfo(np.float64).eps * max(np.abs(d).max(), rho_total)
+
+    # Deflação: componentes nulas e pares de autovalores quase iguais (a rotação zera uma
+    # das componentes do par, cujo autopar passa a ser exato)
+    secular = rho_total * np.abs(u) > tolerancia
+    if not secular.any():
+        return d[:k].copy(), np.eye(num, k)
+    rotacoes = []
+    ativos = np.flatnonzero(secular)
+    if np.any(d[ativos[:-1]] - d[ativos[1:]] <= 2 * tolerancia):
+        anterior = ativos[0]
+        for atual in ativos[1:]:
+            raio = np.hypot(u[anterior], u[atual])
+            c, s = u[atual] / raio, u[anterior] / raio
+            if abs((d[anterior] - d[atual]) * c * s) <= tolerancia:
+                u[anterior], u[atual] = 0.0, raio
+                secular[anterior] = False
+                rotacoes.append((anterior, atual, c, s))
+            anterior = atual
+
+    indices_secular = np.flatnonzero(secular)
+    ds, us = d[indices_secular], u[indices_secular]
+    quadrados = rho_total * us ** 2
+    m = min(k, len(ds))
+
+    # A raiz j fica entre ds[j + 1] e ds[j]; a última, entre ds[-1] - rho_total e ds[-1]
+    superiores = ds[:m]
+    inferiores = np.append(ds[1:], ds[-1] - rho_total)[:m]
+    meios = (inferiores + superiores) / 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        secular_meio = 1 - (quadrados / (ds[None, :] - meios[:, None])).sum(axis=1)
+    perto_inferior = secular_meio < 0
+    origens = np.where(perto_inferior, inferiores, superiores)
+    a = np.where(perto_inferior, 0.0, meios - superiores)
+    b = np.where(perto_inferior, meios - inferiores, 0.0)
+    diferencas = ds[None, :] - origens[:, None]
+
+    deslocamentos = (a + b) / 2
+    epsilon = np.finfo(np.float64).eps
+    pendentes = np.arange(m)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for _ in range(100):
+            denominadores = diferencas[pendentes] - deslocamentos[pendentes, None]
+            termos = quadrados / denominadores
+            valores = 1 - termos.sum(axis=1)
+            # Como no LAPACK, a raiz está pronta quando o valor da função é da ordem do erro
+            # de arredondamento da soma (ou quando o intervalo se esgota)
+            continuar = (np.abs(valores) > 8 * epsilon * (1 + np.abs(termos).sum(axis=1))) & (
+                b[pendentes] - a[pendentes] > 2 * epsilon * np.abs(origens[pendentes]))
+            pendentes, valores = pendentes[continuar], valores[continuar]
+            if len(pendentes) == 0:
+                break
+            termos, denominadores = termos[continuar], denominadores[continuar]
+            derivadas = -(termos / denominadores).sum(axis=1)
+            atuais = deslocamentos[pendentes]
+
+            # A função secular é decrescente em t
+            a[pendentes] = np.where(valores > 0, atuais, a[pendentes])
+            b[pendentes] = np.where(valores > 0, b[pendentes], atuais)
+            # Modelo c + s/δ, que tem o mesmo polo da função secular na origem, ajustado ao
+            # valor e à derivada atuais
+            coeficientes = -derivadas * atuais ** 2
+            novos = -coeficientes / (valores - coeficientes / atuais)
+            dentro = (novos > a[pendentes]) & (novos < b[pendentes])
+            deslocamentos[pendentes] = np.where(dentro, novos, (a[pendentes] + b[pendentes]) / 2)
+        vetores_secular = us[:, None] / (diferencas - deslocamentos[:, None]).T
+
+    # Os k maiores entre as raízes e os autovalores deflacionados
+    deflacionados = np.flatnonzero(~secular)
+    candidatos = np.concatenate((origens + deslocamentos, d[deflacionados]))
+    escolhidos = np.argsort(-candidatos, kind="stable")[:k]
+
+    novos_vetores = np.zeros((num, k))
+    for coluna, escolhido in enumerate(escolhidos):
+        if escolhido < m:
+            novos_vetores[indices_secular, coluna] = vetores_secular[:, escolhido]
+            novos_vetores[:, coluna] /= np.linalg.norm(novos_vetores[:, coluna])
+        else:
+            novos_vetores[deflacionados[escolhido - m], coluna] = 1.0
+    for anterior, atual, c, s in reversed(rotacoes):
+        linha_anterior = novos_vetores[anterior].copy()
+        novos_vetores[anterior] = c * linha_anterior + s * novos_vetores[atual]
+        novos_vetores[atual] = c * novos_vetores[atual] - s * linha_anterior
+
+    return candidatos[escolhidos], novos_vetores
+
+
+def _pontuar(pesos_teste, pesos_treino, rotulos_teste, rotulos_treino, lista_autofaces):
+    # Como as bases menores são prefixos da maior, as distâncias de cada número de
+    # autofaces são somas parciais sobre as mesmas coordenadas
+    distancias = np.zeros((len(pesos_teste), len(pesos_treino)))
+    acertos = np.zeros((len(pesos_teste), len(lista_autofaces)), dtype=bool)
+    menores = np.zeros((len(pesos_teste), len(lista_autofaces)))
+    anterior = 0
+    for coluna, posto in enumerate(lista_autofaces):
+        posto = min(posto, pesos_teste.shape[1])
+        parte_teste, parte_treino = pesos_teste[:, anterior:posto], pesos_treino[:, anterior:posto]
+        distancias += np.einsum("ij,ij->i", parte_teste, parte_teste)[:, None]
+        distancias += np.einsum("ij,ij->i", parte_treino, parte_treino)[None, :]
+        distancias -= 2 * np.dot(parte_teste, parte_treino.T)
+        anterior = posto
+
+        vizinhos = np.argmin(distancias, axis=1)
+        acertos[:, coluna] = rotulos_treino[vizinhos] == rotulos_teste
+        menores[:, coluna] = np.sqrt(np.maximum(
+            distancias[np.arange(len(pesos_teste)), vizinhos], 0.0))
+
+    return acertos, menores
+
+
+def avaliar_dobra(indices_teste, lista_autofaces):
+    """
+    Avalia uma dobra a partir da matriz de Gram compartilhada, sem voltar ao espaço dos
+    pixels.
+
+    As autofaces do treino da dobra são U = X̃ᵀVΛ^(-1/2), em que X̃ são as imagens de treino
+    centralizadas na média do treino e VΛVᵀ é a decomposição de X̃X̃ᵀ. Essa matriz, e o
+    produto das imagens de teste centralizadas pelas de treino, são obtidos da matriz de
+    Gram compartilhada por centralização de núcleo (G - média das linhas - média das
+    colunas + média total), então cada dobra custa uma decomposição n×n, e não uma
+    passada pelos pixels. Os pesos são VΛ^(1/2) no treino e X̃ₛX̃ᵀVΛ^(-1/2) no teste, e
+    como as bases menores são prefixos da maior, as distâncias para todos os números de
+    autofaces saem de somas parciais sobre as mesmas coordenadas. Para deixar-um-de-fora,
+    `avaliar_sem_amostra` evita essa decomposição.
+
+    Args:
+        indices_teste (numpy.array): Índices das amostras de teste da dobra.
+        lista_autofaces (list): Números de autofaces avaliados, em ordem crescente.
+
+    Returns:
+        dict: Tamanhos de treino e teste, tempo (s), e, para cada amostra de teste e cada
+        número de autofaces, se o vizinho mais próximo tem o mesmo rótulo e a distância a ele.
+    """
+
+    inicio = time.perf_counter()
+    gram, rotulos = _COMPARTILHADO["gram"], _COMPARTILHADO["rotulos"]
+
+    treino = np.ones(len(rotulos), dtype=bool)
+    treino[indices_teste] = False
+    indices_treino = np.flatnonzero(treino)
+
+    gram_treino = np.array(gram[np.ix_(indices_treino, indices_treino)])
+    medias_treino = gram_treino.mean(axis=0)
+    media_total = medias_treino.mean()
+    gram_treino -= medias_treino[:, None]
+    gram_treino -= medias_treino[None, :]
+    gram_treino += media_total
+
+    autovalores, autovetores = np.linalg.eigh(gram_treino)
+    del gram_treino
+    num_autofaces = min(lista_autofaces[-1], len(autovalores))
+    autovalores = autovalores[::-1][:num_autofaces]
+    autovetores = autovetores[:, ::-1][:, :num_autofaces]
+    # Componentes de variância nula (posto menor que k) não têm direção definida
+    validos = autovalores > autovalores[0] * 1e-10
+    escala = np.sqrt(np.where(validos, autovalores, 1.0))
+    pesos_treino = autovetores * (escala * validos)
+
+    cruzada = np.array(gram[np.ix_(indices_teste, indices_treino)])
+    cruzada -= cruzada.mean(axis=1)[:, None]
+    cruzada -= medias_treino[None, :]
+    cruzada += media_total
+    pesos_teste = np.dot(cruzada, autovetores) * (validos / escala)
+
+    acertos, menores = _pontuar(pesos_teste, pesos_treino, rotulos[indices_teste],
+                                rotulos[indices_treino], lista_autofaces)
+
+    return {
+        "tamanho_treino": len(indices_treino),
+        "tamanho_teste": len(indices_teste),
+        "tempo_s": time.perf_counter() - inicio,
+        "acertos": acertos,
+        "distancias": menores,
+    }
+
+
+def avaliar_sem_amostra(indices_teste, lista_autofaces):
+    """
+    Avalia uma dobra de deixar-um-de-fora atualizando a decomposição da base inteira, em
+    vez de decompor o treino da dobra.
+
+    Sejam VΛVᵀ a decomposição da matriz de Gram da base centralizada na média global e
+    zᵢ = Λ^(1/2)Vᵢ as coordenadas da imagem i na base das autofaces da base inteira. Tirar
+    a imagem i move a média de treino em -x̃ᵢ/(N - 1), e a matriz de espalhamento do treino
+    centralizado na nova média é, nessas coordenadas, Λ - N/(N - 1)·zᵢzᵢᵀ: uma atualização
+    de posto um, cujos k maiores autopares saem de `remover_posto_um` em O(k·N). As
+    autofaces do treino são combinações W das da base inteira, e a distância entre as
+    imagens i e j nas k primeiras é ||Wₖᵀ(zᵢ - zⱼ)|| (a mudança da média se cancela), então
+    a dobra custa um produto N×N×k em vez de uma decomposição O(N³).
+
+    Args:
+        indices_teste (numpy.array): Índice da única amostra de teste da dobra.
+        lista_autofaces (list): Números de autofaces avaliados, em ordem crescente.
+
+    Returns:
+        dict: Mesmo formato de `avaliar_dobra`.
+    """
+
+    inicio = time.perf_counter()
+    coordenadas = _COMPARTILHADO["coordenadas"]
+    autovalores, rotulos = _COMPARTILHADO["autovalores"], _COMPARTILHADO["rotulos"]
+    num_amostras = len(rotulos)
+    amostra = int(indices_teste[0])
+
+    novos_autovalores, rotacao = remover_posto_um(
+        autovalores, coordenadas[amostra], num_amostras / (num_amostras - 1),
+        lista_autofaces[-1])
+    pesos = np.dot(coordenadas, rotacao)
+    # Componentes de variância nula (posto menor que k) não têm direção definida
+    pesos[:, novos_autovalores <= novos_autovalores[0] * 1e-10] = 0.0
+
+    treino = np.ones(num_amostras, dtype=bool)
+    treino[amostra] = False
+    acertos, menores = _pontuar(pesos[[amostra]], pesos[treino], rotulos[[amostra]],
+                                rotulos[treino], lista_autofaces)
+
+    return {
+        "tamanho_treino": num_amostras - 1,
+        "tamanho_teste": 1,
+        "tempo_s": time.perf_counter() - inicio,
+        "acertos": acertos,
+        "distancias": menores,
+    }
+
+
+def avaliar_num_autofaces(imagens, rotulos, lista_autofaces, num_dobras=5, num_processos=None,
+                          semente=0):
+    """
+    Mede a acurácia de reconhecimento (vizinho mais próximo) por validação cruzada em
+    k dobras ou deixando-um-de-fora, para vários números de autofaces de uma vez.
+
+    A matriz de Gram da base inteira é montada uma única vez (a única etapa que percorre
+    os pixels) e compartilhada por todas as dobras, que só recentralizam e decompõem a
+    submatriz do seu treino (ver `avaliar_dobra`). Em deixar-um-de-fora, a matriz de Gram é
+    decomposta uma única vez e cada dobra atualiza essa decomposição com a remoção da sua
+    imagem (ver `avaliar_sem_amostra`), sem as N decomposições completas. As dobras rodam
+    em processos; nesse caso as matrizes compartilhadas são gravadas em arquivos
+    temporários que cada processo abre mapeados em memória, em vez de copiadas para cada um.
+
+    Args:
+        imagens (numpy.array): Array (N, altura, largura[, canais]) de imagens.
+        rotulos (list): Rótulo de cada imagem.
+        lista_autofaces (list): Números de autofaces avaliados.
+        num_dobras (int, opcional): Número de dobras; use o número de imagens (ou
+            `len(rotulos)`) para deixar-um-de-fora. Padrão é 5.
+        num_processos (int, opcional): Número de processos. Se None, usa o número de CPUs;
+            com 1, tudo roda no processo atual. Padrão é None.
+        semente (int, opcional): Semente da divisão em dobras. Padrão é 0.
+
+    Returns:
+        dict: Acurácia média por número de autofaces, tempo de cada dobra, tempos da matriz
+        de Gram e da decomposição compartilhada (deixar-um-de-fora) e tempo total, além
+        dos arrays N×len(lista_autofaces) "acertos" e "distancias" (distância ao vizinho
+        mais próximo), úteis para ajustar limiares.
+    """
+
+    inicio = time.perf_counter()
+    lista_autofaces = sorted(set(int(posto) for posto in lista_autofaces))
+    rotulos = np.asarray(rotulos)
+    dobras = dividir_em_dobras(rotulos, num_dobras, semente)
+
+    dados = np.asarray(imagens, dtype=np.float32).reshape(len(imagens), -1)
+    # Centralizar na média global reduz o cancelamento numérico; a recentralização de
+    # cada dobra é exata de qualquer forma
+    gram = montar_gram(dados, dados.mean(axis=0), simetrica=True)
+    tempo_gram = time.perf_counter() - inicio
+
+    tempo_decomposicao = 0.0
+    if len(dobras) == len(rotulos):
+        inicio_decomposicao = time.perf_counter()
+        autovalores, autovetores = np.linalg.eigh(gram)
+        del gram
+        autovalores, autovetores = autovalores[::-1], autovetores[:, ::-1]
+        # Só as direções com variância entram: nas outras, todas as coordenadas são nulas
+        validos = autovalores > max(autovalores[0], 0.0) * 1e-12
+        autovalores = autovalores[validos]
+        compartilhado = {"autovalores": autovalores,
+                         "coordenadas": autovetores[:, validos] * np.sqrt(autovalores)}
+        del autovetores
+        funcao = avaliar_sem_amostra
+        tempo_decomposicao = time.perf_counter() - inicio_decomposicao
+    else:
+        compartilhado = {"gram": gram}
+        del gram
+        funcao = avaliar_dobra
+
+    num_processos = min(num_processos or os.cpu_count() or 1, len(dobras))
+    if num_processos == 1:
+        _COMPARTILHADO.clear()
+        _COMPARTILHADO.update(compartilhado, rotulos=rotulos)
+        resultados = [funcao(dobra, lista_autofaces) for dobra in dobras]
+    else:
+        with tempfile.TemporaryDirectory() as diretorio:
+            caminhos = {}
+            for nome, matriz in compartilhado.items():
+                caminhos[nome] = os.path.join(diretorio, f"{nome}.npy")
+                np.save(caminhos[nome], matriz)
+            del compartilhado
+            with ProcessPoolExecutor(max_workers=num_processos, initializer=_iniciar_processo,
+                                     initargs=(caminhos, rotulos)) as executor:
+                resultados = list(executor.map(
+                    funcao, dobras, [lista_autofaces] * len(dobras),
+                    chunksize=max(1, len(dobras) // (num_processos * 4))))
+
+    acertos = np.zeros((len(rotulos), len(lista_autofaces)), dtype=bool)
+    distancias = np.zeros((len(rotulos), len(lista_autofaces)))
+    for dobra, resultado in zip(dobras, resultados):
+        acertos[dobra] = resultado["acertos"]
+        distancias[dobra] = resultado["distancias"]
+
+    return {
+        "num_imagens": len(rotulos),
+        "num_dobras": len(dobras),
+        "lista_autofaces": lista_autofaces,
+        "acuracia": {posto: float(acertos[:, coluna].mean())
+                     for coluna, posto in enumerate(lista_autofaces)},
+        "dobras": [{"dobra": i, "tamanho_treino": resultado["tamanho_treino"],
+                    "tamanho_teste": resultado["tamanho_teste"], "tempo_s": resultado["tempo_s"]}
+                   for i, resultado in enumerate(resultados)],
+        "tempo_gram_s": tempo_gram,
+        "tempo_decomposicao_s": tempo_decomposicao,
+        "tempo_total_s": time.perf_counter() - inicio,
+        "acertos": acertos,
+        "distancias": distancias,
+    }
+
+
+def exibir_tabelas(resultado):
+    """
+    Imprime as tabelas de acurácia por número de autofaces e de tempo por dobra.
+
+    Args:
+        resultado (dict): Resultado de `avaliar_num_autofaces`.
+    """
+
+    print(f"{'autofaces':>10} {'acurácia':>9}")
+    for posto, acuracia in resultado["acuracia"].items():
+        print(f"{posto:>10} {acuracia:>9.2%}")
+
+    tempos = np.array([dobra["tempo_s"] for dobra in resultado["dobras"]])
+    decomposicao = ""
+    if resultado.get("tempo_decomposicao_s"):
+        decomposicao = f"decomposição em {resultado['tempo_decomposicao_s']:.2f} s, "
+    print(f"\n{resultado['num_dobras']} dobras: matriz de Gram em "
+          f"{resultado['tempo_gram_s']:.2f} s, {decomposicao}{tempos.mean() * 1000:.1f} ms "
+          f"por dobra (máx. {tempos.max() * 1000:.1f} ms), "
+          f"total {resultado['tempo_total_s']:.2f} s.")
+    if resultado["num_dobras"] <= 20:
+        print(f"{'dobra':>6} {'treino':>7} {'teste':>6} {'tempo (ms)':>11}")
+        for dobra in resultado["dobras"]:
+            print(f"{dobra['dobra']:>6} {dobra['tamanho_treino']:>7} {dobra['tamanho_teste']:>6} "
+                  f"{dobra['tempo_s'] * 1000:>11.1f}")
+
+
+def executar_avaliacao(diretorio_base, lista_autofaces, num_dobras=5, deixar_um_de_fora=False,
+                       num_processos=None, cinza=False, resolucao=None, semente=0,
+                       caminho_relatorio=None):
+    """
+    Avalia a acurácia de reconhecimento de uma base organizada em uma pasta por pessoa
+    para vários números de autofaces e imprime as tabelas de resultado.
+
+    Args:
+        diretorio_base (str): Diretório contendo a base de imagens, uma pasta por pessoa.
+        lista_autofaces (list): Números de autofaces avaliados.
+        num_dobras (int, opcional): Número de dobras. Padrão é 5.
+        deixar_um_de_fora (bool, opcional): Se True, usa uma dobra por imagem.
+            Padrão é False.
+        num_processos (int, opcional): Número de processos. Padrão é None.
+        cinza (bool, opcional): Se True, usa as imagens em escala de cinza. Padrão é False.
+        resolucao (tuple, opcional): Resolução (altura, largura) das imagens. Padrão é None.
+        semente (int, opcional): Semente da divisão em dobras. Padrão é 0.
+        caminho_relatorio (str, opcional): Se informado, salva o resultado em JSON, com a
+            distância e o acerto de cada imagem. Padrão é None.
+
+    Returns:
+        dict: Resultado de `avaliar_num_autofaces`.
+    """
+
+    arquivos, rotulos = listar_bases_de_dados([diretorio_base], rotulo_por_pasta=True)
+    imagens, validos = carregar_arquivos(arquivos, cinza=cinza, resolucao=resolucao)
+    if len(imagens) == 0:
+        raise ValueError(f"Nenhuma imagem válida encontrada nos diretórios: {[diretorio_base]}")
+    rotulos = [rotulos[i] for i in validos]
+
+    resultado = avaliar_num_autofaces(
+        imagens, rotulos, lista_autofaces, len(rotulos) if deixar_um_de_fora else num_dobras,
+        num_processos, semente)
+    exibir_tabelas(resultado)
+
+    if caminho_relatorio is not None:
+        relatorio = dict(resultado, arquivos=[arquivos[i] for i in validos],
+                         acertos=resultado["acertos"].tolist(),
+                         distancias=resultado["distancias"].tolist())
+        with open(caminho_relatorio, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+
+    return resultado
@@ -0,0 +1,478 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+import cv2
+import numpy as np
+from auxiliares import calcular_autofaces, carregar_arquivos
+from projecao import projetar_lote
+from distancias import buscar_k_vizinhos
+from quantizacao import medir_revocacao
+from fragmentos import GaleriaFragmentada
+
+
+def gerar_dados_posto_baixo(num_imagens, dimensao, posto=100, ruido=0.05, semente=0):
+    """
+    Gera uma matriz de dados sintética com espectro decrescente, parecida com uma base de faces.
+
+    Args:
+        num_imagens (int): Número de linhas (imagens).
+        dimensao (int): Número de colunas (pixels).
+        posto (int, opcional): Número de direções com variância relevante. Padrão é 100.
+        ruido (float, opcional): Desvio padrão do ruído isotrópico. Padrão é 0.05.
+        semente (int, opcional): Semente do gerador aleatório. Padrão é 0.
+
+    Returns:
+        numpy.array: Matriz float32 de formato (num_imagens, dimensao).
+    """
+
+    gerador = np.random.default_rng(semente)
+    pesos = gerador.standard_normal((num_imagens, posto)).astype(np.float32)
+    pesos *= (1.0 / np.arange(1, posto + 1, dtype=np.float32))
+    base = gerador.standard_normal((posto, dimensao)).astype(np.float32)
+    dados = np.dot(pesos, base)
+    dados += ruido * gerador.standard_normal((num_imagens, dimensao)).astype(np.float32)
+    return dados
+
+
+def comparar_metodos_autofaces(num_imagens=2000, dimensao=10000, num_autofaces=50,
+                               metodos=("exato", "aleatorio")):
+    """
+    Compara o tempo e a precisão dos métodos de `calcular_autofaces` com o método exato.
+
+    A precisão é medida pelo erro relativo dos autovalores e pela similaridade entre os
+    subespaços (média dos cossenos quadrados dos ângulos principais, 1.0 é idêntico).
+
+    Args:
+        num_imagens (int, opcional): Número de imagens sintéticas. Padrão é 2000.
+        dimensao (int, opcional): Número de pixels de cada imagem. Padrão é 10000.
+        num_autofaces (int, opcional): Número de autofaces calculadas. Padrão é 50.
+        metodos (tuple, opcional): Métodos comparados. Padrão é ("exato", "aleatorio").
+
+    Returns:
+        list: Um dicionário por método com tempo, aceleração e métricas de precisão.
+    """
+
+    dados = gerar_dados_posto_baixo(num_imagens, dimensao)
+
+    resultados = []
+    referencia = None
+
+    for metodo in metodos:
+        inicio = time.perf_counter()
+        _, autofaces, autovalores = calcular_autofaces(
+            dados, num_autofaces, retornar_autovalores=True, metodo=metodo, semente=0)
+        duracao = time.perf_counter() - inicio
+
+        matriz = np.array(autofaces).reshape(num_autofaces, -1)
+        autovalores = np.asarray(autovalores[:num_autofaces], dtype=np.float64)
+
+        if referencia is None:
+            referencia = (duracao, matriz, autovalores)
+
+        tempo_ref, matriz_ref, autovalores_ref = referencia
+        similaridade = np.sum(np.dot(matriz_ref, matriz.T) ** 2) / num_autofaces
+        erro_autovalores = np.max(np.abs(autovalores - autovalores_ref) / autovalores_ref)
+
+        resultados.append({
+            "metodo": metodo,
+            "tempo_s": duracao,
+            "aceleracao": tempo_ref / duracao,
+            "similaridade_subespaco": float(similaridade),
+            "erro_relativo_autovalores": float(erro_autovalores),
+        })
+
+    return resultados
+
+
+def exibir_resultados(resultados):
+    """
+    Exibe os resultados de um benchmark em forma de tabela.
+
+    Args:
+        resultados (list): Lista de dicionários com os mesmos campos.
+    """
+
+    colunas = list(resultados[0].keys())
+    print(" | ".join(f"{coluna:>26}" for coluna in colunas))
+    for resultado in resultados:
+        print(" | ".join(
+            f"{valor:>26.4g}" if isinstance(valor, float) else f"{valor!s:>26}"
+            for valor in resultado.values()))
+
+
+def gerar_faces_sinteticas(num_imagens, altura=56, largura=46, canais=3, num_pessoas=None,
+                           semente=0, tamanho_bloco=1000):
+    """
+    Gera imagens sintéticas parecidas com faces: cabeça elíptica, olhos, sobrancelhas, nariz
+    e boca com parâmetros próprios de cada pessoa, mais variações de pose, iluminação e
+    ruído por imagem.
+
+    Args:
+        num_imagens (int): Número de imagens geradas.
+        altura (int, opcional): Altura das imagens. Padrão é 56.
+        largura (int, opcional): Largura das imagens. Padrão é 46.
+        canais (int, opcional): 3 para BGR ou 1 para escala de cinza. Padrão é 3.
+        num_pessoas (int, opcional): Número de identidades. Se None, uma para cada 10
+            imagens. Padrão é None.
+        semente (int, opcional): Semente do gerador aleatório. Padrão é 0.
+        tamanho_bloco (int, opcional): Imagens geradas por vez, para limitar a memória
+            temporária. Padrão é 1000.
+
+    Returns:
+        tuple: Array uint8 (N, altura, largura, canais), ou (N, altura, largura) em escala
+        de cinza, e array com o rótulo (índice da pessoa) de cada imagem.
+    """
+
+    gerador = np.random.default_rng(semente)
+    num_pessoas = num_pessoas or max(1, num_imagens // 10)
+    rotulos = np.arange(num_imagens) % num_pessoas
+
+    # Parâmetros de identidade: centro e eixos da cabeça, olhos, boca, nariz e tom de pele
+    identidades = {
+        "eixo_x": gerador.uniform(0.55, 0.75, num_pessoas),
+        "eixo_y": gerador.uniform(0.75, 0.92, num_pessoas),
+        "olho_x": gerador.uniform(0.22, 0.38, num_pessoas),
+        "olho_y": gerador.uniform(-0.30, -0.10, num_pessoas),
+        "olho_raio": gerador.uniform(0.06, 0.11, num_pessoas),
+        "boca_y": gerador.uniform(0.35, 0.55, num_pessoas),
+        "boca_largura": gerador.uniform(0.15, 0.32, num_pessoas),
+        "nariz": gerador.uniform(0.1, 0.3, num_pessoas),
+        "pele": gerador.uniform(0.45, 0.9, (num_pessoas, 3)),
+        "fundo": gerador.uniform(0.05, 0.4, (num_pessoas, 3)),
+    }
+
+    y, x = np.mgrid[-1:1:altura * 1j, -1:1:largura * 1j].astype(np.float32)
+    forma = (num_imagens, altura, largura) + ((3,) if canais == 3 else ())
+    imagens = np.empty(forma, dtype=np.uint8)
+
+    for inicio in range(0, num_imagens, tamanho_bloco):
+        fim = min(inicio + tamanho_bloco, num_imagens)
+        pessoas = rotulos[inicio:fim]
+        n = fim - inicio
+
+        def parametro(nome, desvio):
+            valores = identidades[nome][pessoas]
+            ruido = gerador.normal(0, desvio, valores.shape).astype(np.float32)
+            return (valores + ruido).astype(np.float32)[:, None, None]
+
+        deslocamento_x = gerador.normal(0, 0.04, n).astype(np.float32)[:, None, None]
+        deslocamento_y = gerador.normal(0, 0.04, n).astype(np.float32)[:, None, None]
+        xs, ys = x - deslocamento_x, y - deslocamento_y
+
+        elipse = (xs / parametro("eixo_x", 0.01)) ** 2 + (ys / parametro("eixo_y", 0.01)) ** 2
+        cabeca = 1 / (1 + np.exp(np.minimum(25 * (elipse - 1), 50)))
+        olho_x, olho_y = parametro("olho_x", 0.01), parametro("olho_y", 0.01)
+        raio = parametro("olho_raio", 0.005)
+        olhos = np.exp(-((np.abs(xs) - olho_x) ** 2 + (ys - olho_y) ** 2) / (2 * raio ** 2))
+        sobrancelhas = np.exp(-((np.abs(xs) - olho_x) ** 2 / (2 * (1.8 * raio) ** 2)
+                                + (ys - olho_y + 2.2 * raio) ** 2 / (2 * (0.35 * raio) ** 2)))
+        boca = np.exp(-(xs ** 2 / (2 * parametro("boca_largura", 0.02) ** 2)
+                        + (ys - parametro("boca_y", 0.02)) ** 2 / (2 * 0.03 ** 2)))
+        nariz = np.exp(-(xs ** 2 / (2 * 0.03 ** 2) + (ys - 0.1) ** 2 / (2 * parametro("nariz", 0.01) ** 2)))
+        iluminacao = 1 + gerador.normal(0, 0.15, n).astype(np.float32)[:, None, None] * xs
+
+        tracos = (0.8 * olhos + 0.6 * sobrancelhas + 0.6 * boca + 0.2 * nariz) * cabeca
+        if canais == 3:
+            pele = identidades["pele"][pessoas][:, None, None, :].astype(np.float32)
+            fundo = identidades["fundo"][pessoas][:, None, None, :].astype(np.float32)
+            rosto = cabeca[..., None] * pele + (1 - cabeca[..., None]) * fundo
+            rosto = rosto * iluminacao[..., None] - tracos[..., None] * pele
+        else:
+            pele = identidades["pele"][pessoas, 0].astype(np.float32)[:, None, None]
+            fundo = identidades["fundo"][pessoas, 0].astype(np.float32)[:, None, None]
+            rosto = (cabeca * pele + (1 - cabeca) * fundo) * iluminacao - tracos * pele
+
+        rosto += gerador.normal(0, 0.03, rosto.shape).astype(np.float32)
+        imagens[inicio:fim] = np.clip(rosto * 255, 0, 255).astype(np.uint8)
+
+    return imagens, rotulos
+
+
+def salvar_faces_sinteticas(diretorio, num_imagens, altura=56, largura=46, canais=3,
+                            num_pessoas=None, semente=0, tamanho_bloco=1000):
+    """
+    Gera imagens sintéticas de faces e as salva em PNG, uma pasta por pessoa. Arquivos já
+    existentes não são reescritos, então a mesma base pode ser reaproveitada entre execuções.
+
+    Args:
+        diretorio (str): Diretório de saída.
+        num_imagens (int): Número de imagens geradas.
+        altura (int, opcional): Altura das imagens. Padrão é 56.
+        largura (int, opcional): Largura das imagens. Padrão é 46.
+        canais (int, opcional): 3 para BGR ou 1 para escala de cinza. Padrão é 3.
+        num_pessoas (int, opcional): Número de identidades. Padrão é None.
+        semente (int, opcional): Semente do gerador aleatório. Padrão é 0.
+        tamanho_bloco (int, opcional): Imagens geradas e salvas por vez. Padrão é 1000.
+
+    Returns:
+        tuple: Lista com os caminhos das imagens e lista com os rótulos.
+    """
+
+    num_pessoas = num_pessoas or max(1, num_imagens // 10)
+    rotulos = [f"pessoa_{i % num_pessoas:05d}" for i in range(num_imagens)]
+    arquivos = [os.path.join(diretorio, rotulo, f"{i:07d}.png") for i, rotulo in enumerate(rotulos)]
+
+    if all(os.path.exists(arquivo) for arquivo in arquivos):
+        return arquivos, rotulos
+
+    imagens, _ = gerar_faces_sinteticas(num_imagens, altura, largura, canais, num_pessoas,
+                                        semente, tamanho_bloco)
+    for arquivo, imagem in zip(arquivos, imagens):
+        if not os.path.exists(arquivo):
+            os.makedirs(os.path.dirname(arquivo), exist_ok=True)
+            cv2.imwrite(arquivo, imagem)
+
+    return arquivos, rotulos
+
+
+def medir(funcao, *args, **kwargs):
+    """
+    Executa uma função medindo o tempo de parede e o pico de memória alocada.
+
+    O pico é medido com `tracemalloc`, que também acompanha as alocações de arrays numpy.
+
+    Args:
+        funcao (callable): Função a ser medida.
+        *args: Argumentos posicionais da função.
+        **kwargs: Argumentos nomeados da função.
+
+    Returns:
+        tuple: Resultado da função, tempo em segundos e pico de memória em MB.
+    """
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        inicio = time.perf_counter()
+        resultado = funcao(*args, **kwargs)
+        duracao = time.perf_counter() - inicio
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return resultado, duracao, pico / 2 ** 20
+
+
+def executar_benchmark(tamanhos=(1000, 10000, 100000), lista_autofaces=(3, 15, 50, 200),
+                       altura=56, largura=46, canais=3, metodo="auto", num_consultas=1000,
+                       diretorio_disco=None, caminho_resultados=None):
+    """
+    Mede como as etapas do pipeline escalam com o tamanho da base (N) e com o número de
+    autofaces (k): leitura, treinamento, projeção da galeria e busca de consultas.
+
+    As imagens são sintéticas (`gerar_faces_sinteticas`) e geradas uma única vez para o
+    maior N; os tamanhos menores usam os primeiros N arquivos ou linhas. Com
+    `diretorio_disco`, a leitura decodifica PNGs do disco; caso contrário, mede apenas a
+    conversão para float32 das imagens em memória.
+
+    Args:
+        tamanhos (tuple, opcional): Valores de N. Padrão é (1000, 10000, 100000).
+        lista_autofaces (tuple, opcional): Valores de k. Padrão é (3, 15, 50, 200).
+        altura (int, opcional): Altura das imagens. Padrão é 56.
+        largura (int, opcional): Largura das imagens. Padrão é 46.
+        canais (int, opcional): 3 para BGR ou 1 para escala de cinza. Padrão é 3.
+        metodo (str, opcional): Método de decomposição usado no treinamento. Padrão é "auto".
+        num_consultas (int, opcional): Número de consultas na etapa de busca. Padrão é 1000.
+        diretorio_disco (str, opcional): Diretório onde a base sintética é salva e lida.
+            Padrão é None.
+        caminho_resultados (str, opcional): Se informado, salva os resultados em JSON.
+            Padrão é None.
+
+    Returns:
+        dict: Metadados do ambiente e uma lista de medições, uma por (N, k, etapa), com
+        tempo, pico de memória e vazão.
+    """
+
+    maior = max(tamanhos)
+    if diretorio_disco is not None:
+        arquivos, _ = salvar_faces_sinteticas(diretorio_disco, maior, altura, largura, canais)
+    else:
+        imagens_uint8, _ = gerar_faces_sinteticas(maior, altura, largura, canais)
+
+    medicoes = []
+
+    def registrar(num_imagens, num_autofaces, etapa, duracao, pico, itens):
+        medicoes.append({
+            "num_imagens": num_imagens,
+            "num_autofaces": num_autofaces,
+            "etapa": etapa,
+            "tempo_s": duracao,
+            "pico_memoria_mb": pico,
+            "itens_por_segundo": itens / max(duracao, 1e-9),
+        })
+        print(f"N={num_imagens:>7} k={num_autofaces!s:>4} {etapa:<10} "
+              f"{duracao:9.3f} s {pico:10.1f} MB")
+
+    for num_imagens in sorted(tamanhos):
+        if diretorio_disco is not None:
+            (imagens, _), duracao, pico = medir(carregar_arquivos, arquivos[:num_imagens])
+        else:
+            imagens, duracao, pico = medir(
+                lambda: imagens_uint8[:num_imagens].astype(np.float32) / 255.0)
+        registrar(num_imagens, None, "leitura", duracao, pico, num_imagens)
+
+        gerador = np.random.default_rng(1)
+        indices_consultas = gerador.choice(num_imagens, min(num_consultas, num_imagens),
+                                           replace=False)
+
+        for num_autofaces in lista_autofaces:
+            if num_autofaces >= num_imagens:
+                continue
+
+            (face_media, autofaces), duracao, pico = medir(
+                calcular_autofaces, imagens, num_autofaces, metodo=metodo, semente=0)
+            registrar(num_imagens, num_autofaces, "treino", duracao, pico, num_imagens)
+
+            pesos, duracao, pico = medir(projetar_lote, imagens, face_media, autofaces)
+            registrar(num_imagens, num_autofaces, "projecao", duracao, pico, num_imagens)
+
+            consultas = pesos[indices_consultas] + gerador.normal(
+                0, 0.01, (len(indices_consultas), num_autofaces)).astype(np.float32)
+            _, duracao, pico = medir(buscar_k_vizinhos, consultas, pesos, k=1)
+            registrar(num_imagens, num_autofaces, "consulta", duracao, pico, len(consultas))
+
+        del imagens
+
+    resultados = {
+        "metadados": {
+            "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "plataforma": platform.platform(),
+            "processador": platform.processor(),
+            "num_cpus": os.cpu_count(),
+            "altura": altura,
+            "largura": largura,
+            "canais": canais,
+            "metodo": metodo,
+            "em_disco": diretorio_disco is not None,
+        },
+        "medicoes": medicoes,
+    }
+
+    if caminho_resultados is not None:
+        with open(caminho_resultados, "w", encoding="utf-8") as arquivo:
+            json.dump(resultados, arquivo, ensure_ascii=False, indent=2)
+
+    return resultados
+
+
+def comparar_quantizacoes(num_imagens=100000, num_autofaces=50, num_consultas=1000, k=10,
+                          num_subespacos=None, altura=56, largura=46):
+    """
+    Compara memória e revocação das codificações da galeria sobre os vetores de pesos de
+    uma base sintética. As consultas são imagens da base com ruído, projetadas na mesma base.
+
+    Args:
+        num_imagens (int, opcional): Tamanho da galeria. Padrão é 100.000.
+        num_autofaces (int, opcional): Dimensão dos vetores de pesos. Padrão é 50.
+        num_consultas (int, opcional): Número de consultas. Padrão é 1000.
+        k (int, opcional): Número de vizinhos da revocação. Padrão é 10.
+        num_subespacos (int, opcional): Subespaços da quantização por produto. Padrão é None.
+        altura (int, opcional): Altura das imagens. Padrão é 56.
+        largura (int, opcional): Largura das imagens. Padrão é 46.
+
+    Returns:
+        list: Resultados de `quantizacao.medir_revocacao`.
+    """
+
+    imagens, _ = gerar_faces_sinteticas(num_imagens, altura, largura, canais=1)
+    imagens = imagens.astype(np.float32) / 255.0
+
+    treino = imagens[:min(num_imagens, 5000)]
+    face_media, autofaces = calcular_autofaces(treino, num_autofaces, metodo="auto", semente=0)
+    galeria = projetar_lote(imagens, face_media, autofaces)
+
+    gerador = np.random.default_rng(1)
+    escolhidas = gerador.choice(num_imagens, min(num_consultas, num_imagens), replace=False)
+    ruidosas = imagens[escolhidas] + gerador.normal(
+        0, 0.02, imagens[escolhidas].shape).astype(np.float32)
+    consultas = projetar_lote(ruidosas, face_media, autofaces)
+
+    parametros = {"num_subespacos": num_subespacos} if num_subespacos else {}
+    return medir_revocacao(galeria, consultas, k=k, **parametros)
+
+
+def comparar_fragmentos(num_vetores=1000000, num_autofaces=50, num_consultas=2000, k=10,
+                        configuracoes=((1, 1), (2, 2), (4, 4), (4, 16))):
+    """
+    Compara a vazão da busca na galeria inteira num só processo com a da galeria dividida
+    em fragmentos entre processos (`fragmentos.GaleriaFragmentada`). Os vetores são
+    aleatórios, já que só o custo da busca é medido.
+
+    Args:
+        num_vetores (int, opcional): Tamanho da galeria. Padrão é 1.000.000.
+        num_autofaces (int, opcional): Dimensão dos vetores de pesos. Padrão é 50.
+        num_consultas (int, opcional): Número de consultas. Padrão é 2000.
+        k (int, opcional): Número de vizinhos por consulta. Padrão é 10.
+        configuracoes (tuple, opcional): Pares (processos, fragmentos) avaliados.
+
+    Returns:
+        list: Um dicionário por configuração, com o tempo de busca, a vazão e se os
+        vizinhos são os mesmos da busca num só processo.
+    """
+
+    gerador = np.random.default_rng(0)
+    galeria = gerador.standard_normal((num_vetores, num_autofaces), dtype=np.float32)
+    consultas = gerador.standard_normal((num_consultas, num_autofaces), dtype=np.float32)
+
+    inicio = time.perf_counter()
+    referencia, _ = buscar_k_vizinhos(consultas, galeria, k=k)
+    tempo = time.perf_counter() - inicio
+    resultados = [{"processos": 0, "fragmentos": 1, "tempo_s": tempo,
+                   "consultas_por_segundo": num_consultas / tempo, "exato": True}]
+
+    for num_processos, num_fragmentos in configuracoes:
+        with GaleriaFragmentada(galeria, num_fragmentos, num_processos) as fragmentada:
+            # A primeira busca inicia os processos
+            fragmentada.buscar(consultas[:1], k=k)
+            inicio = time.perf_counter()
+            indices, _ = fragmentada.buscar(consultas, k=k)
+            tempo = time.perf_counter() - inicio
+        resultados.append({
+            "processos": num_processos,
+            "fragmentos": num_fragmentos,
+            "tempo_s": tempo,
+            "consultas_por_segundo": num_consultas / tempo,
+            "exato": bool(np.array_equal(indices, referencia)),
+        })
+
+    return resultados
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark das etapas do pipeline de autofaces.")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--autofaces", type=int, nargs="+", default=[3, 15, 50, 200])
+    parser.add_argument("--altura", type=int, default=56)
+    parser.add_argument("--largura", type=int, default=46)
+    parser.add_argument("--canais", type=int, choices=(1, 3), default=3)
+    parser.add_argument("--metodo", default="auto")
+    parser.add_argument("--consultas", type=int, default=1000)
+    parser.add_argument("--disco", help="Diretório onde a base sintética é salva e lida.")
+    parser.add_argument("--saida", help="Arquivo JSON de resultados.")
+    parser.add_argument("--comparar-metodos", action="store_true",
+                        help="Compara apenas os métodos de decomposição.")
+    parser.add_argument("--quantizacao", action="store_true",
+                        help="Compara memória e revocação das codificações da galeria.")
+    parser.add_argument("--fragmentos", action="store_true",
+                        help="Compara a busca num só processo com a galeria fragmentada.")
+    argumentos = parser.parse_args()
+
+    if argumentos.comparar_metodos:
+        exibir_resultados(comparar_metodos_autofaces())
+    elif argumentos.quantizacao:
+        exibir_resultados(comparar_quantizacoes(
+            max(argumentos.tamanhos), argumentos.autofaces[0], argumentos.consultas))
+    elif argumentos.fragmentos:
+        exibir_resultados(comparar_fragmentos(max(argumentos.tamanhos), argumentos.autofaces[0],
+                                              argumentos.consultas))
+    else:
+        executar_benchmark(argumentos.tamanhos, argumentos.autofaces, argumentos.altura,
+                           argumentos.largura, argumentos.canais, argumentos.metodo,
+                           argumentos.consultas, argumentos.disco, argumentos.saida)
@@ -0,0 +1,202 @@
+import numpy as np
+from incremental import atualizar_decomposicao, treinar_modelo_incremental
+from projecao import projetar_lote
+from modelo import treinar_modelo
+
+LIMITE_DERIVA_PADRAO = 0.02
+
+
+def decomposicao_do_modelo(modelo):
+    """
+    Reconstrói, a partir de um modelo treinado, o estado de decomposição usado pela PCA
+    incremental (`incremental.atualizar_decomposicao`).
+
+    Os autovalores do modelo são os quadrados dos valores singulares da matriz de dados
+    centralizada, então a base do modelo escalada por eles resume toda a galeria.
+
+    Args:
+        modelo (dict): Modelo de autofaces.
+
+    Returns:
+        dict: Estado com o número de amostras, a média, os valores singulares, os
+        componentes, em float64, e a energia total.
+    """
+
+    num_autofaces = len(modelo["autofaces"])
+    autovalores = np.asarray(modelo["autovalores"], dtype=np.float64)[:num_autofaces]
+
+    return {
+        "n": len(modelo["vetores_de_pesos"]),
+        "media": np.asarray(modelo["face_media"], dtype=np.float64).reshape(-1),
+        "valores_singulares": np.sqrt(np.maximum(autovalores, 0.0)),
+        "componentes": np.asarray(modelo["autofaces"], dtype=np.float64).reshape(
+            num_autofaces, -1),
+        "energia_total": float(modelo.get("variancia_total", np.maximum(autovalores, 0.0).sum())),
+    }
+
+
+def iniciar_controle_de_deriva(modelo):
+    """
+    Cria o registro de deriva de um modelo que ainda não recebeu cadastros incrementais.
+
+    A energia total é a variância total guardada no modelo ou, em modelos antigos que não
+    a guardam, a soma dos autovalores. Nesse caso, se o treinamento só calculou os
+    primeiros (métodos aleatorizado e incremental), a energia descartada inicial fica
+    subestimada e a deriva, por consequência, é superestimada.
+
+    Args:
+        modelo (dict): Modelo de autofaces.
+
+    Returns:
+        dict: Energia total, energia descartada, erro relativo inicial, deriva e número
+        de imagens cadastradas.
+    """
+
+    num_autofaces = len(modelo["autofaces"])
+    autovalores = np.maximum(np.asarray(modelo["autovalores"], dtype=np.float64), 0.0)
+    energia_total = float(modelo.get("variancia_total", autovalores.sum()))
+    energia_descartada = max(energia_total - float(autovalores[:num_autofaces].sum()), 0.0)
+    erro_inicial = energia_descartada / energia_total if energia_total > 0 else 0.0
+
+    return {
+        "energia_total": energia_total,
+        "energia_descartada": energia_descartada,
+        "erro_inicial": erro_inicial,
+        "deriva": 0.0,
+        "imagens_cadastradas": 0,
+        "retreino_recomendado": False,
+    }
+
+
+def cadastrar_pessoas(modelo, imagens, rotulos, arquivos=None, limite_deriva=LIMITE_DERIVA_PADRAO,
+                      retreinar_automaticamente=False):
+    """
+    Cadastra novas imagens num modelo treinado sem refazer a decomposição da base inteira.
+
+    A face média e as autofaces são atualizadas por uma atualização de posto baixo da
+    decomposição existente (a mesma da PCA incremental). Os pesos já guardados não são
+    recalculados a partir das imagens: como w = U(x - m), os novos pesos são obtidos por
+    w' = U'Uᵀw + U'(m - m'), um produto k×k por vetor. As novas imagens são projetadas na
+    base atualizada.
+
+    A cada cadastro, a energia que a truncagem em k componentes descarta é acumulada. A
+    deriva é o aumento do erro relativo de aproximação (energia descartada sobre energia
+    total) em relação ao do treinamento original; quando passa de `limite_deriva`, o
+    modelo é marcado para retreino, que é feito na hora com `retreinar_automaticamente` se
+    todas as imagens tiverem arquivo.
+
+    Args:
+        modelo (dict): Modelo de autofaces (não é alterado).
+        imagens (numpy.array): Imagens a cadastrar, no formato de entrada do modelo.
+        rotulos (list): Rótulo de cada imagem.
+        arquivos (list, opcional): Caminho de cada imagem, guardado na galeria e usado num
+            eventual retreino. Padrão é None.
+        limite_deriva (float, opcional): Deriva a partir da qual o retreino é recomendado.
+            Padrão é 0.02.
+        retreinar_automaticamente (bool, opcional): Se True, retreina o modelo do zero
+            quando a deriva passa do limite. Padrão é False.
+
+    Returns:
+        dict: Novo modelo com as imagens cadastradas e o registro de deriva em "cadastro".
+    """
+
+    formato = tuple(modelo["formato"])
+    imagens = np.asarray(imagens, dtype=np.float32)
+    if imagens.shape[1:] != formato:
+        raise ValueError(
+            f"As imagens têm formato {imagens.shape[1:]}, diferente do formato do modelo {formato}.")
+    if len(rotulos) != len(imagens):
+        raise ValueError("É preciso um rótulo para cada imagem cadastrada.")
+    arquivos = list(arquivos) if arquivos is not None else [""] * len(imagens)
+
+    num_autofaces = len(modelo["autofaces"])
+    controle = dict(modelo.get("cadastro") or iniciar_controle_de_deriva(modelo))
+    estado = decomposicao_do_modelo(modelo)
+
+    media_anterior = estado["media"]
+    componentes_anteriores = estado["componentes"]
+    energia_anterior = float(np.sum(estado["valores_singulares"] ** 2))
+
+    # Energia que entra na atualização: a do lote em torno da própria média e a da
+    # diferença entre as médias
+    lote = imagens.reshape(len(imagens), -1).astype(np.float64)
+    media_lote = lote.mean(axis=0)
+    n_anterior, n_lote = estado["n"], len(lote)
+    energia_lote = float(np.sum((lote - media_lote) ** 2)) + \
+        n_anterior * n_lote / (n_anterior + n_lote) * float(np.sum((media_anterior - media_lote) ** 2))
+
+    atualizar_decomposicao(estado, lote, num_autofaces)
+
+    energia_mantida = float(np.sum(estado["valores_singulares"] ** 2))
+    truncada = max(energia_anterior + energia_lote - energia_mantida, 0.0)
+
+    # Correção dos pesos guardados para a nova base e a nova média
+    rotacao = np.dot(estado["componentes"], componentes_anteriores.T)
+    translacao = np.dot(estado["componentes"], media_anterior - estado["media"])
+    pesos_corrigidos = np.dot(np.asarray(modelo["vetores_de_pesos"], dtype=np.float64), rotacao.T)
+    pesos_corrigidos += translacao
+
+    face_media = estado["media"].astype(np.float32)
+    autofaces = np.ascontiguousarray(estado["componentes"], dtype=np.float32)
+    pesos_novos = projetar_lote(imagens, face_media, autofaces)
+
+    controle["energia_total"] += energia_lote
+    controle["energia_descartada"] += truncada
+    controle["imagens_cadastradas"] += n_lote
+    erro_atual = controle["energia_descartada"] / max(controle["energia_total"], 1e-12)
+    controle["deriva"] = erro_atual - controle["erro_inicial"]
+    controle["retreino_recomendado"] = controle["deriva"] > limite_deriva
+
+    novo_modelo = {
+        "face_media": face_media,
+        "autofaces": autofaces,
+        "autovalores": (estado["valores_singulares"] ** 2).astype(np.float32),
+        "variancia_total": controle["energia_total"],
+        "vetores_de_pesos": np.vstack([pesos_corrigidos.astype(np.float32), pesos_novos]),
+        "rotulos": list(modelo["rotulos"]) + list(rotulos),
+        "arquivos": list(modelo["arquivos"]) + arquivos,
+        "formato": formato,
+        "parametros": dict(modelo["parametros"]),
+        "cadastro": controle,
+    }
+
+    if controle["retreino_recomendado"] and retreinar_automaticamente:
+        if all(novo_modelo["arquivos"]):
+            return retreinar_modelo(novo_modelo)
+        print("Deriva acima do limite, mas há imagens cadastradas sem arquivo: "
+              "o modelo não pode ser retreinado automaticamente.")
+
+    return novo_modelo
+
+
+def retreinar_modelo(modelo):
+    """
+    Retreina do zero um modelo que recebeu cadastros incrementais, a partir dos arquivos
+    da galeria e com os mesmos parâmetros do treinamento original: o modo incremental
+    (com o mesmo tamanho de lote), o método de decomposição e, com `variancia_explicada`,
+    a escolha do número de autofaces pela variância, até o mesmo máximo.
+
+    Args:
+        modelo (dict): Modelo de autofaces com todas as imagens associadas a arquivos.
+
+    Returns:
+        dict: Modelo retreinado, com a deriva zerada.
+    """
+
+    parametros = modelo["parametros"]
+    # Modelos antigos não guardam o máximo pedido; o número atual de autofaces é o melhor
+    # substituto
+    num_autofaces = parametros.get("num_autofaces") or len(modelo["autofaces"])
+    cinza = parametros.get("cinza", False)
+    resolucao = parametros.get("resolucao")
+    resolucao = tuple(resolucao) if resolucao is not None else None
+    variancia_explicada = parametros.get("variancia_explicada")
+
+    if parametros.get("tamanho_lote") is not None:
+        return treinar_modelo_incremental(
+            modelo["arquivos"], modelo["rotulos"], num_autofaces, parametros["tamanho_lote"],
+            cinza=cinza, resolucao=resolucao, variancia_explicada=variancia_explicada)
+    return treinar_modelo(
+        modelo["arquivos"], modelo["rotulos"], num_autofaces,
+        metodo=parametros.get("metodo") or "exato", cinza=cinza, resolucao=resolucao,
+        variancia_explicada=variancia_explicada)
@@ -1,8 +1,11 @@
-from matplotlib import pyplot as plt
 import numpy as np
-from auxiliares import ler_imagens, calcular_autofaces, exibir_imagens, centralizar_imagem
+from auxiliares import ler_imagens, listar_imagens, exibir_imagens
+from modelo import obter_modelo
+from projecao import projetar_lote
+from instrumentacao import instrumentar
 
 
+@instrumentar("classificacao")
 def projetar_imagens(imagens, face_media, autofaces):
     """
     Projeta as imagens no espaço gerado pelas autofaces.
@@ -16,15 +19,7 @@ def projetar_imagens(imagens, face_media, autofaces):
         numpy.array: Matriz de projeções no espaço das autofaces.
     """
 
-    matriz_autofaces = np.array([af.flatten() for af in autofaces])
-
-    projecoes = []
-    for imagem in imagens:
-        imagem_centralizada = centralizar_imagem(imagem, face_media)
-        alfa = np.dot(matriz_autofaces, imagem_centralizada)
-        projecoes.append(alfa)
-
-    return np.array(projecoes)
+    return projetar_lote(imagens, face_media, autofaces)
 
 
 def plotar_projecoes(projecoes, rotulos):
@@ -36,6 +31,8 @@ def plotar_projecoes(projecoes, rotulos):
         rotulos (list): Lista de rótulos correspondentes às imagens projetadas.
     """
 
+    from matplotlib import pyplot as plt
+
     fig = plt.figure(figsize=(8, 8))
     ax = fig.add_subplot(111, projection='3d')
 
@@ -76,34 +73,50 @@ def exibir_imagens_pessoas(diretorios):
         imagens = ler_imagens(diretorio, limite=10)
         titulos = [f"Imagem {j + 1}" for j in range(len(imagens))]
 
-        exibir_imagens(imagens, num_colunas=5, titulo_grid=f"Pessoa {
-                       i + 1}", titulos_imagens=titulos)
+        exibir_imagens(imagens, num_colunas=5, titulo_grid=f"Pessoa {i + 1}",
+                       titulos_imagens=titulos)
 
 
-def executar_classificacao(diretorios, num_autofaces=3):
+def executar_classificacao(diretorios, num_autofaces=3, diretorio_cache=None, cinza=False,
+                           resolucao=None, exibir=True):
     """
     Executa o processo de classificação das imagens no espaço das autofaces para múltiplos diretórios.
 
     Args:
         diretorios (list): Lista de caminhos para os diretórios contendo as imagens de cada pessoa.
         num_autofaces (int, opcional): Número de autofaces utilizadas. Padrão é 3.
+        diretorio_cache (str, opcional): Diretório do cache de modelos treinados. Se None,
+            o modelo é treinado a cada execução. Padrão é None.
+        cinza (bool, opcional): Se True, trabalha com as imagens em escala de cinza.
+            Padrão é False.
+        resolucao (tuple, opcional): Resolução (altura, largura) para a qual as imagens são
+            redimensionadas na leitura. Padrão é None.
+        exibir (bool, opcional): Se False, nada é exibido e o Matplotlib não é importado.
+            Padrão é True.
 
     Exibe:
         Um gráfico 3D das projeções no espaço das autofaces, com cores diferentes para cada pessoa.
+
+    Returns:
+        tuple: Matriz de projeções (uma linha por imagem) e lista de rótulos.
     """
 
-    exibir_imagens_pessoas(diretorios)
+    if exibir:
+        exibir_imagens_pessoas(diretorios)
 
-    todas_imagens = []
+    todos_arquivos = []
     rotulos = []
 
     for i, diretorio in enumerate(diretorios):
-        imagens = ler_imagens(diretorio, limite=10)
-        todas_imagens.extend(imagens)
-        rotulos.extend([f"Pessoa {i + 1}"] * len(imagens))
+        arquivos = listar_imagens(diretorio, limite=10)
+        todos_arquivos.extend(arquivos)
+        rotulos.extend([f"Pessoa {i + 1}"] * len(arquivos))
 
-    face_media, autofaces = calcular_autofaces(todas_imagens, num_autofaces)
+    modelo = obter_modelo(todos_arquivos, rotulos, num_autofaces,
+                          diretorio_cache=diretorio_cache, cinza=cinza, resolucao=resolucao)
 
-    projecoes = projetar_imagens(todas_imagens, face_media, autofaces)
+    # Os vetores de pesos da galeria já são as projeções das imagens da base
+    if exibir:
+        plotar_projecoes(modelo["vetores_de_pesos"], modelo["rotulos"])
 
-    plotar_projecoes(projecoes, rotulos)
+    return modelo["vetores_de_pesos"], modelo["rotulos"]
@@ -0,0 +1,374 @@
+import json
+import time
+import argparse
+
+# Os módulos do projeto (e, com eles, NumPy, OpenCV e Matplotlib) só são importados pelo
+# subcomando escolhido, então --help e erros de argumento respondem na hora
+INICIO = time.perf_counter()
+_TEMPOS = {}
+
+
+def marcar_importacao():
+    """
+    Registra o tempo gasto desde o início do processo até a importação dos módulos do
+    subcomando, que domina o tempo de execuções curtas.
+    """
+
+    _TEMPOS["importacao_s"] = time.perf_counter() - INICIO
+
+
+def adicionar_opcoes_modelo(parser, num_autofaces):
+    """
+    Adiciona ao parser as opções comuns de treinamento e leitura do modelo.
+
+    Args:
+        parser (argparse.ArgumentParser): Parser do subcomando.
+        num_autofaces (int): Número padrão de autofaces do subcomando.
+    """
+
+    parser.add_argument("--num-autofaces", type=int, default=num_autofaces)
+    parser.add_argument("--variancia-explicada", type=float,
+                        help="Fração da variância a explicar (--num-autofaces vira o máximo).")
+    parser.add_argument("--diretorio-cache", help="Diretório do cache de modelos treinados.")
+    parser.add_argument("--cinza", action="store_true", help="Trabalha em escala de cinza.")
+    parser.add_argument("--resolucao", type=int, nargs=2, metavar=("ALTURA", "LARGURA"))
+
+
+def treinar(argumentos):
+    """
+    Treina (ou reabre do cache) o modelo de uma base e, opcionalmente, o salva.
+
+    Args:
+        argumentos (argparse.Namespace): Argumentos do subcomando "treinar".
+
+    Returns:
+        dict: Resumo do modelo.
+    """
+
+    from modelo import obter_modelo, salvar_modelo
+    from reconhecimento import listar_bases_de_dados
+    marcar_importacao()
+
+    arquivos, rotulos = listar_bases_de_dados([argumentos.diretorio_base], rotulo_por_pasta=True)
+    if not arquivos:
+        raise ValueError(f"Nenhuma imagem válida encontrada em {argumentos.diretorio_base}.")
+
+    modelo = obter_modelo(
+        arquivos, rotulos, argumentos.num_autofaces, diretorio_cache=argumentos.diretorio_cache,
+        tamanho_lote=argumentos.tamanho_lote, metodo=argumentos.metodo, cinza=argumentos.cinza,
+        resolucao=argumentos.resolucao, empacotar=argumentos.empacotar,
+        variancia_explicada=argumentos.variancia_explicada)
+    if argumentos.saida is not None:
+        salvar_modelo(modelo, argumentos.saida)
+
+    return {
+        "num_imagens": len(modelo["arquivos"]),
+        "num_autofaces": len(modelo["autofaces"]),
+        "formato": list(modelo["formato"]),
+        "impressao_digital": modelo.get("impressao_digital"),
+    }
+
+
+def reconhecer(argumentos):
+    """
+    Reconhece a primeira imagem de um diretório de teste.
+
+    Args:
+        argumentos (argparse.Namespace): Argumentos do subcomando "reconhecer".
+
+    Returns:
+        dict: Rótulo reconhecido, arquivo da imagem reconhecida e distância.
+    """
+
+    from reconhecimento import executar_reconhecimento
+    marcar_importacao()
+
+    return executar_reconhecimento(
+        argumentos.diretorio_base, argumentos.diretorio_teste, argumentos.num_autofaces,
+        diretorio_cache=argumentos.diretorio_cache, metodo=argumentos.metodo,
+        tipo_indice=argumentos.indice, cinza=argumentos.cinza, resolucao=argumentos.resolucao,
+        variancia_explicada=argumentos.variancia_explicada,
+        limite_residuo=argumentos.limite_residuo, exibir=argumentos.exibir)
+
+
+def reconhecer_lote(argumentos):
+    """
+    Reconhece todas as imagens de um diretório de teste organizado por pessoa.
+
+    Args:
+        argumentos (argparse.Namespace): Argumentos do subcomando "reconhecer-lote".
+
+    Returns:
+        dict: Relatório de `reconhecimento.executar_reconhecimento_lote`, sem as previsões
+        por imagem (que ficam no arquivo de `--relatorio`).
+    """
+
+    from reconhecimento import executar_reconhecimento_lote
+    marcar_importacao()
+
+    relatorio = executar_reconhecimento_lote(
+        argumentos.diretorio_base, argumentos.diretorio_teste, argumentos.num_autofaces,
+        diretorio_cache=argumentos.diretorio_cache, metodo=argumentos.metodo,
+        tamanho_bloco=argumentos.tamanho_bloco, caminho_relatorio=argumentos.relatorio,
+        cinza=argumentos.cinza, resolucao=argumentos.resolucao,
+        codificacao_galeria=argumentos.codificacao,
+        variancia_explicada=argumentos.variancia_explicada,
+        num_prototipos=argumentos.prototipos, num_candidatos=argumentos.candidatos,
+        limite_residuo=argumentos.limite_residuo, num_fragmentos=argumentos.fragmentos,
+        num_processos=argumentos.processos)
+    relatorio.pop("previsoes")
+    return relatorio
+
+
+def reconhecer_video(argumentos):
+    """
+    Reconhece os quadros de um arquivo de vídeo.
+
+    Args:
+        argumentos (argparse.Namespace): Argumentos do subcomando "reconhecer-video".
+
+    Returns:
+        dict: Relatório de `video.executar_reconhecimento_video`, sem os resultados por
+        quadro (que ficam no arquivo de `--relatorio`).
+    """
+
+    from video import executar_reconhecimento_video
+    marcar_importacao()
+
+    relatorio = executar_reconhecimento_video(
+        argumentos.diretorio_base, argumentos.video, argumentos.num_autofaces,
+        argumentos.diretorio_cache, argumentos.cinza, argumentos.resolucao,
+        argumentos.variancia_explicada, argumentos.trabalhadores, argumentos.tamanho_lote,
+        argumentos.capacidade_fila, argumentos.politica, argumentos.pular_quadros,
+        argumentos.tempo_real, argumentos.detectar_rostos, argumentos.limite_quadros,
+        argumentos.relatorio)
+    relatorio.pop("quadros")
+    return relatorio
+
+
+def aproximar(argumentos):
+    """
+    Aproxima uma imagem com vários números de autofaces.
+
+    Args:
+        argumentos (argparse.Namespace): Argumentos do subcomando "aproximar".
+
+    Returns:
+        dict: Erro relativo de reconstrução para cada número de autofaces pedido.
+    """
+
+    from auxiliares import ler_imagens
+    from aproximacao import executar_aproximacao
+    marcar_importacao()
+
+    imagens = ler_imagens(argumentos.imagem, cinza=argumentos.cinza,
+                          resolucao=argumentos.resolucao)
+    if len(imagens) == 0:
+        raise ValueError(f"Não foi possível ler a imagem {argumentos.imagem}.")
+
+    erros = executar_aproximacao(
+        argumentos.diretorio_imagens, imagens[0], argumentos.autofaces, argumentos.limite,
+        argumentos.diretorio_cache, exibir_curva=argumentos.curva, cinza=argumentos.cinza,
+        resolucao=argumentos.resolucao, exibir=argumentos.exibir,
+        diretorio_saida=argumentos.saida)
+
+    return {"erro_relativo": {str(posto): float(erros[posto]) for posto in argumentos.autofaces}}
+
+
+def classificar(argumentos):
+    """
+    Projeta as imagens de cada pessoa no espaço das autofaces.
+
+    Args:
+        argumentos (argparse.Namespace): Argumentos do subcomando "classificar".
+
+    Returns:
+        dict: Centróide das projeções de cada pessoa e, se pedido, salva todas as
+        projeções em JSON.
+    """
+
+    import numpy as np
+    from classificacao import executar_classificacao
+    marcar_importacao()
+
+    projecoes, rotulos = executar_classificacao(
+        argumentos.diretorios, argumentos.num_autofaces, argumentos.diretorio_cache,
+        cinza=argumentos.cinza, resolucao=argumentos.resolucao, exibir=argumentos.exibir)
+
+    if argumentos.saida is not None:
+        with open(argumentos.saida, "w", encoding="utf-8") as arquivo:
+            json.dump({"rotulos": list(rotulos), "projecoes": np.asarray(projecoes).tolist()},
+                      arquivo, ensure_ascii=False)
+
+    rotulos = np.asarray(rotulos)
+    return {"centroides": {rotulo: np.asarray(projecoes)[rotulos == rotulo].mean(axis=0).tolist()
+                           for rotulo in np.unique(rotulos).tolist()}}
+
+
+def avaliar(argumentos):
+    """
+    Mede a acurácia de reconhecimento por validação cruzada para vários números de
+    autofaces.
+
+    Args:
+        argumentos (argparse.Namespace): Argumentos do subcomando "avaliar".
+
+    Returns:
+        dict: Acurácia por número de autofaces e tempos da avaliação.
+    """
+
+    from avaliacao import executar_avaliacao
+    marcar_importacao()
+
+    resultado = executar_avaliacao(
+        argumentos.diretorio_base, argumentos.autofaces, num_dobras=argumentos.dobras,
+        deixar_um_de_fora=argumentos.deixar_um_de_fora, num_processos=argumentos.processos,
+        cinza=argumentos.cinza, resolucao=argumentos.resolucao, semente=argumentos.semente,
+        caminho_relatorio=argumentos.relatorio)
+
+    return {chave: resultado[chave] for chave in
+            ("num_imagens", "num_dobras", "acuracia", "tempo_gram_s", "tempo_total_s")}
+
+
+def criar_parser():
+    """
+    Cria o parser de argumentos da linha de comando.
+
+    Returns:
+        argparse.ArgumentParser: Parser com um subcomando por tarefa.
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Autofaces pela linha de comando, sem interface gráfica. O Matplotlib só "
+                    "é importado com --exibir.")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    treino = subparsers.add_parser("treinar", help="Treina o modelo de uma base.")
+    treino.add_argument("diretorio_base")
+    adicionar_opcoes_modelo(treino, 50)
+    treino.add_argument("--metodo", choices=("exato", "aleatorio", "auto"), default="exato")
+    treino.add_argument("--tamanho-lote", type=int, help="Treina no modo incremental.")
+    treino.add_argument("--empacotar", action="store_true",
+                        help="Guarda a base decodificada num pacote no diretório de cache.")
+    treino.add_argument("--saida", help="Caminho onde o modelo é salvo.")
+    treino.set_defaults(funcao=treinar)
+
+    reconhecimento = subparsers.add_parser(
+        "reconhecer", help="Reconhece a primeira imagem de um diretório de teste.")
+    reconhecimento.add_argument("diretorio_base")
+    reconhecimento.add_argument("diretorio_teste")
+    adicionar_opcoes_modelo(reconhecimento, 50)
+    reconhecimento.add_argument("--metodo", choices=("exato", "aleatorio", "auto"),
+                                default="exato")
+    reconhecimento.add_argument("--indice", choices=("exato", "kdtree", "ivf", "auto"))
+    reconhecimento.add_argument("--limite-residuo", type=float,
+                                help="Rejeita a imagem se estiver mais distante que isso do "
+                                     "espaço das faces.")
+    reconhecimento.add_argument("--exibir", action="store_true")
+    reconhecimento.set_defaults(funcao=reconhecer)
+
+    lote = subparsers.add_parser(
+        "reconhecer-lote", help="Reconhece um diretório de teste com uma pasta por pessoa.")
+    lote.add_argument("diretorio_base")
+    lote.add_argument("diretorio_teste")
+    adicionar_opcoes_modelo(lote, 50)
+    lote.add_argument("--metodo", choices=("exato", "aleatorio", "auto"), default="exato")
+    lote.add_argument("--tamanho-bloco", type=int, default=256)
+    lote.add_argument("--codificacao", choices=("float32", "float16", "int8", "pq"),
+                      default="float32")
+    lote.add_argument("--prototipos", type=int,
+                      help="Busca primeiro em até N protótipos por pessoa.")
+    lote.add_argument("--candidatos", type=int, default=3,
+                      help="Protótipos cujas imagens são comparadas por consulta.")
+    lote.add_argument("--limite-residuo", type=float,
+                      help="Rejeita imagens mais distantes que isso do espaço das faces.")
+    lote.add_argument("--fragmentos", type=int,
+                      help="Divide a galeria em N fragmentos buscados por processos.")
+    lote.add_argument("--processos", type=int,
+                      help="Processos da galeria fragmentada (padrão: número de CPUs).")
+    lote.add_argument("--relatorio", help="Caminho do relatório JSON com as previsões.")
+    lote.set_defaults(funcao=reconhecer_lote)
+
+    video = subparsers.add_parser(
+        "reconhecer-video", help="Reconhece os quadros de um arquivo de vídeo.")
+    video.add_argument("diretorio_base")
+    video.add_argument("video")
+    adicionar_opcoes_modelo(video, 50)
+    video.add_argument("--trabalhadores", type=int, default=2)
+    video.add_argument("--tamanho-lote", type=int, default=8)
+    video.add_argument("--capacidade-fila", type=int, default=16)
+    video.add_argument("--politica", choices=("descartar", "bloquear"), default="descartar")
+    video.add_argument("--pular-quadros", type=int, default=1,
+                       help="Processa um a cada N quadros.")
+    video.add_argument("--tempo-real", action="store_true",
+                       help="Entrega os quadros no ritmo do vídeo, como uma câmera.")
+    video.add_argument("--detectar-rostos", action="store_true")
+    video.add_argument("--limite-quadros", type=int)
+    video.add_argument("--relatorio", help="Caminho do relatório JSON com todos os quadros.")
+    video.set_defaults(funcao=reconhecer_video)
+
+    aproximacao = subparsers.add_parser(
+        "aproximar", help="Aproxima uma imagem com vários números de autofaces.")
+    aproximacao.add_argument("diretorio_imagens")
+    aproximacao.add_argument("imagem")
+    aproximacao.add_argument("--autofaces", type=int, nargs="+", default=[5, 10, 25, 50])
+    aproximacao.add_argument("--limite", type=int)
+    aproximacao.add_argument("--diretorio-cache")
+    aproximacao.add_argument("--cinza", action="store_true")
+    aproximacao.add_argument("--resolucao", type=int, nargs=2, metavar=("ALTURA", "LARGURA"))
+    aproximacao.add_argument("--saida", help="Diretório onde as aproximações são salvas.")
+    aproximacao.add_argument("--exibir", action="store_true")
+    aproximacao.add_argument("--curva", action="store_true",
+                             help="Com --exibir, também exibe a curva de erro.")
+    aproximacao.set_defaults(funcao=aproximar)
+
+    classificacao = subparsers.add_parser(
+        "classificar", help="Projeta as imagens de cada pessoa no espaço das autofaces.")
+    classificacao.add_argument("diretorios", nargs="+")
+    classificacao.add_argument("--num-autofaces", type=int, default=3)
+    classificacao.add_argument("--diretorio-cache")
+    classificacao.add_argument("--cinza", action="store_true")
+    classificacao.add_argument("--resolucao", type=int, nargs=2, metavar=("ALTURA", "LARGURA"))
+    classificacao.add_argument("--saida", help="Caminho do JSON com todas as projeções.")
+    classificacao.add_argument("--exibir", action="store_true")
+    classificacao.set_defaults(funcao=classificar)
+
+    avaliacao = subparsers.add_parser(
+        "avaliar",
+        help="Mede a acurácia por validação cruzada para vários números de autofaces.")
+    avaliacao.add_argument("diretorio_base")
+    avaliacao.add_argument("--autofaces", type=int, nargs="+", default=[5, 10, 25, 50])
+    avaliacao.add_argument("--dobras", type=int, default=5)
+    avaliacao.add_argument("--deixar-um-de-fora", action="store_true")
+    avaliacao.add_argument("--processos", type=int)
+    avaliacao.add_argument("--semente", type=int, default=0)
+    avaliacao.add_argument("--cinza", action="store_true")
+    avaliacao.add_argument("--resolucao", type=int, nargs=2, metavar=("ALTURA", "LARGURA"))
+    avaliacao.add_argument("--relatorio", help="Caminho do relatório JSON com cada imagem.")
+    avaliacao.set_defaults(funcao=avaliar)
+
+    return parser
+
+
+def main(argv=None):
+    """
+    Executa um subcomando e imprime o resultado em JSON, com o tempo de importação e o
+    tempo total do processo.
+
+    Args:
+        argv (list, opcional): Argumentos da linha de comando. Se None, usa `sys.argv`.
+            Padrão é None.
+
+    Returns:
+        dict: Resultado do subcomando.
+    """
+
+    argumentos = criar_parser().parse_args(argv)
+    resultado = argumentos.funcao(argumentos)
+    resultado["tempos"] = dict(_TEMPOS, total_s=time.perf_counter() - INICIO)
+    print(json.dumps(resultado, ensure_ascii=False, indent=2, default=str))
+    return resultado
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,18 @@
+import time
 import cv2
-from auxiliares import ler_imagens, calcular_autofaces
+import numpy as np
+from auxiliares import listar_imagens
+from modelo import obter_modelo
+from projecao import matriz_de_autofaces
 
+# Atualizações no máximo a cada 1/60 s; entre elas, os eventos dos sliders são agrupados
+INTERVALO_MINIMO_S = 1 / 60
+ESPERA_EVENTOS_MS = 15
+TECLA_ESC = 27
 
-def executar_construcao(diretorio_imagens, num_autofaces=15, limite=400):
+
+def executar_construcao(diretorio_imagens, num_autofaces=15, limite=400, diretorio_cache=None,
+                        cinza=False, resolucao=None):
     """
     Exibe a interface para manipulação interativa das autofaces e construção de novas imagens.
 
@@ -10,42 +20,71 @@ def executar_construcao(diretorio_imagens, num_autofaces=15, limite=400):
         diretorio_imagens (str): Caminho do diretório contendo as imagens da base.
         num_autofaces (int, opcional): Número de autofaces a serem utilizadas. Padrão é 15.
         limite (int, opcional): Limite máximo de imagens a serem carregadas. Padrão é 400.
+        diretorio_cache (str, opcional): Diretório do cache de modelos treinados. Se None,
+            o modelo é treinado a cada execução. Padrão é None.
+        cinza (bool, opcional): Se True, trabalha com as imagens em escala de cinza.
+            Padrão é False.
+        resolucao (tuple, opcional): Resolução (altura, largura) para a qual as imagens são
+            redimensionadas na leitura. Padrão é None.
 
     Funcionalidade:
         - Calcula a face média e as autofaces da base de dados.
         - Cria sliders para ajustar os pesos das autofaces.
-        - Atualiza e exibe uma nova imagem reconstruída com base nos pesos ajustados pelos sliders.
+        - Atualiza e exibe uma nova imagem reconstruída com base nos pesos ajustados pelos sliders,
+          com um único produto de matrizes e no máximo 60 atualizações por segundo.
         - A interface usa OpenCV para exibir duas janelas:
             1. "Resultado": Mostra a imagem reconstruída.
             2. "Autofaces e Pesos": Contém os sliders para ajustar os pesos das autofaces.
+        - A interface fecha ao fechar uma das janelas ou ao pressionar Esc.
     """
 
-    imagens = ler_imagens(diretorio_imagens, limite=limite)
-    face_media, autofaces = calcular_autofaces(imagens, num_autofaces)
+    arquivos = listar_imagens(diretorio_imagens, limite=limite)
+    modelo = obter_modelo(arquivos, num_autofaces=num_autofaces,
+                          diretorio_cache=diretorio_cache, cinza=cinza, resolucao=resolucao)
 
-    cv2.namedWindow("Resultado", cv2.WINDOW_GUI_NORMAL)
-    cv2.namedWindow("Autofaces e Pesos", cv2.WINDOW_GUI_NORMAL)
+    # Base pré-calculada: a reconstrução é um único produto pesos × autofaces
+    face_media = np.ascontiguousarray(modelo["face_media"], dtype=np.float32).reshape(-1)
+    matriz_autofaces = matriz_de_autofaces(modelo["autofaces"])
+    formato = tuple(modelo["formato"])
+    num_autofaces = len(matriz_autofaces)
 
-    valores_slider = [127] * num_autofaces
+    pesos = np.zeros(num_autofaces, dtype=np.float32)
+    nova_face = np.empty_like(face_media)
+    estado = {"pendente": True, "ultima_atualizacao": 0.0}
 
-    def atualizar_nova_face(*args):
+    def ajustar_peso(i, valor):
+        """
+        Registra o novo peso de um slider. A imagem não é recalculada aqui: vários eventos
+        seguidos são agrupados em uma única atualização no laço principal.
+        """
+        pesos[i] = valor - 127
+        estado["pendente"] = True
+
+    def atualizar_nova_face():
         """
         Atualiza a imagem reconstruída com base nos pesos ajustados pelos sliders.
         """
-        nova_face = face_media.copy()
-        for i, autoface in enumerate(autofaces):
-            peso = cv2.getTrackbarPos(f"Peso {i}", "Autofaces e Pesos") - 127
-            nova_face += autoface * peso
-        # Atualiza a janela de resultados
-        resultado_atualizado = cv2.resize(nova_face, (0, 0), fx=2, fy=2)
+        np.dot(pesos, matriz_autofaces, out=nova_face)
+        np.add(nova_face, face_media, out=nova_face)
+        resultado_atualizado = cv2.resize(nova_face.reshape(formato), (0, 0), fx=2, fy=2)
         cv2.imshow("Resultado", resultado_atualizado)
 
+    cv2.namedWindow("Resultado", cv2.WINDOW_GUI_NORMAL)
+    cv2.namedWindow("Autofaces e Pesos", cv2.WINDOW_GUI_NORMAL)
+
     for i in range(num_autofaces):
-        cv2.createTrackbar(
-            f"Peso {i}", "Autofaces e Pesos", 127, 255, atualizar_nova_face)
+        cv2.createTrackbar(f"Peso {i}", "Autofaces e Pesos", 127, 255,
+                           lambda valor, i=i: ajustar_peso(i, valor))
 
+    # waitKey bloqueia processando os eventos da interface, sem ocupar a CPU quando ociosa
     while cv2.getWindowProperty("Resultado", cv2.WND_PROP_VISIBLE) >= 1 and \
             cv2.getWindowProperty("Autofaces e Pesos", cv2.WND_PROP_VISIBLE) >= 1:
-        cv2.waitKey(1)
+        if estado["pendente"] and \
+                time.monotonic() - estado["ultima_atualizacao"] >= INTERVALO_MINIMO_S:
+            estado["pendente"] = False
+            estado["ultima_atualizacao"] = time.monotonic()
+            atualizar_nova_face()
+        if cv2.waitKey(ESPERA_EVENTOS_MS) == TECLA_ESC:
+            break
 
     cv2.destroyAllWindows()
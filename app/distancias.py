@@ -0,0 +1,183 @@
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from instrumentacao import instrumentar
+
+TAMANHO_BLOCO_CONSULTAS = 512
+TAMANHO_BLOCO_GALERIA = 8192
+TAMANHO_GRUPO_SELECAO = 16
+
+
+def calcular_normas(vetores):
+    """
+    Calcula a norma quadrada de cada linha de uma matriz de vetores.
+
+    Args:
+        vetores (numpy.array): Matriz N×K de vetores.
+
+    Returns:
+        numpy.array: Vetor com as N normas quadradas.
+    """
+
+    vetores = np.asarray(vetores, dtype=np.float32)
+    return np.einsum("ij,ij->i", vetores, vetores)
+
+
+@instrumentar("busca")
+def buscar_k_vizinhos(consultas, galeria, k=1, normas_galeria=None,
+                      bloco_consultas=TAMANHO_BLOCO_CONSULTAS,
+                      bloco_galeria=TAMANHO_BLOCO_GALERIA, num_threads=None):
+    """
+    Busca exata dos k vizinhos mais próximos (distância euclidiana) de muitas consultas.
+
+    A ordenação usa ||g||²/2 - q·gᵀ, que tem a mesma ordem que a distância quadrada
+    ||q||² + ||g||² - 2·q·gᵀ e custa uma única passada sobre o produto de matrizes; a
+    distância de verdade só é reconstituída para os k vencedores. O cálculo percorre
+    blocos de consultas × blocos da galeria, de modo que a memória temporária fica
+    limitada a `bloco_consultas` × `bloco_galeria` valores; em cada bloco os k melhores
+    são selecionados por `selecionar_k_menores` e combinados com os melhores dos blocos
+    anteriores. Os blocos de consultas são distribuídos entre threads
+    (o numpy libera o GIL durante o produto de matrizes).
+
+    Args:
+        consultas (numpy.array): Matriz Q×K de vetores de consulta.
+        galeria (numpy.array): Matriz N×K de vetores da galeria.
+        k (int, opcional): Número de vizinhos por consulta. Padrão é 1.
+        normas_galeria (numpy.array, opcional): Normas quadradas da galeria, como as de
+            `calcular_normas`. Se None, são calculadas. Padrão é None.
+        bloco_consultas (int, opcional): Consultas por bloco. Padrão é 512.
+        bloco_galeria (int, opcional): Vetores da galeria por bloco. Padrão é 8192.
+        num_threads (int, opcional): Número de threads. Se None, usa o número de CPUs.
+            Padrão é None.
+
+    Returns:
+        tuple: Matriz Q×k de índices na galeria e matriz Q×k de distâncias, em ordem
+        crescente de distância por linha.
+    """
+
+    consultas = np.asarray(consultas, dtype=np.float32)
+    galeria = np.asarray(galeria, dtype=np.float32)
+    if normas_galeria is None:
+        normas_galeria = calcular_normas(galeria)
+
+    k = min(k, len(galeria))
+    num_consultas = len(consultas)
+    indices = np.empty((num_consultas, k), dtype=np.int64)
+    distancias = np.empty((num_consultas, k), dtype=np.float32)
+
+    meias_normas = np.asarray(normas_galeria, dtype=np.float32) / 2
+
+    def processar(inicio):
+        fim = min(inicio + bloco_consultas, num_consultas)
+        melhores_indices, melhores_valores = _buscar_bloco(
+            consultas[inicio:fim], galeria, meias_normas, k, bloco_galeria)
+        indices[inicio:fim] = melhores_indices
+        melhores_quadrados = 2 * melhores_valores
+        melhores_quadrados += calcular_normas(consultas[inicio:fim])[:, None]
+        distancias[inicio:fim] = np.sqrt(np.maximum(melhores_quadrados, 0.0))
+
+    inicios = range(0, num_consultas, bloco_consultas)
+    num_threads = min(num_threads or os.cpu_count() or 1, len(inicios) or 1)
+
+    if num_threads == 1:
+        for inicio in inicios:
+            processar(inicio)
+    else:
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            list(executor.map(processar, inicios))
+
+    return indices, distancias
+
+
+def combinar_k_melhores(indices, quadrados, k):
+    """
+    Mantém, em cada linha, os k candidatos de menor distância, em ordem crescente.
+
+    Args:
+        indices (numpy.array): Matriz Q×C de índices candidatos.
+        quadrados (numpy.array): Matriz Q×C de distâncias (ou distâncias quadradas).
+        k (int): Número de candidatos mantidos por linha.
+
+    Returns:
+        tuple: Matrizes Q×k de índices e de distâncias, ordenadas por linha.
+    """
+
+    if quadrados.shape[1] > k:
+        selecionados = np.argpartition(quadrados, k - 1, axis=1)[:, :k]
+        indices = np.take_along_axis(indices, selecionados, axis=1)
+        quadrados = np.take_along_axis(quadrados, selecionados, axis=1)
+
+    ordem = np.argsort(quadrados, axis=1, kind="stable")
+    return np.take_along_axis(indices, ordem, axis=1), np.take_along_axis(quadrados, ordem, axis=1)
+
+
+def selecionar_k_menores(valores, k, tamanho_grupo=TAMANHO_GRUPO_SELECAO):
+    """
+    Seleciona, em cada coluna, as linhas dos k menores valores (sem ordená-las).
+
+    Em vez de particionar a coluna inteira, as linhas são divididas em grupos consecutivos
+    de `tamanho_grupo` e apenas o mínimo de cada grupo é particionado: os k menores valores
+    de uma coluna sempre estão nos k grupos de menores mínimos, então basta particionar
+    esses k·`tamanho_grupo` candidatos. Com uma coluna por consulta e linhas contíguas, o
+    mínimo por grupo é uma redução vetorizada sobre o eixo do meio, bem mais barata que
+    particionar a matriz inteira.
+
+    Args:
+        valores (numpy.array): Matriz C×Q de valores (uma coluna por consulta).
+        k (int): Número de linhas selecionadas por coluna.
+        tamanho_grupo (int, opcional): Número de linhas por grupo. Padrão é 16.
+
+    Returns:
+        numpy.array: Matriz Q×min(k, C) com os índices de linha selecionados para cada coluna.
+    """
+
+    num_linhas, num_colunas = valores.shape
+    colunas = np.arange(num_colunas)[:, None]
+
+    if k >= num_linhas:
+        return np.broadcast_to(np.arange(num_linhas), (num_colunas, num_linhas))
+
+    num_grupos = num_linhas // tamanho_grupo
+    if num_grupos <= k:
+        return np.argpartition(valores.T, k - 1, axis=1)[:, :k]
+
+    util = num_grupos * tamanho_grupo
+    minimos = valores[:util].reshape(num_grupos, tamanho_grupo, num_colunas).min(axis=1)
+    grupos = _k_menores_por_linha(minimos.T, k)
+
+    linhas = (grupos[:, :, None] * tamanho_grupo + np.arange(tamanho_grupo)).reshape(
+        num_colunas, -1)
+    if util < num_linhas:
+        linhas = np.hstack((linhas, np.broadcast_to(
+            np.arange(util, num_linhas), (num_colunas, num_linhas - util))))
+
+    selecionados = _k_menores_por_linha(valores[linhas, colunas], k)
+
+    return np.take_along_axis(linhas, selecionados, axis=1)
+
+
+def _k_menores_por_linha(valores, k):
+    if k == 1:
+        return np.argmin(valores, axis=1)[:, None]
+    return np.argpartition(valores, k - 1, axis=1)[:, :k]
+
+
+def _buscar_bloco(consultas, galeria, meias_normas, k, bloco_galeria):
+    melhores_indices = np.empty((len(consultas), 0), dtype=np.int64)
+    melhores_valores = np.empty((len(consultas), 0), dtype=np.float32)
+    colunas = np.arange(len(consultas))[:, None]
+
+    for inicio in range(0, len(galeria), bloco_galeria):
+        fim = min(inicio + bloco_galeria, len(galeria))
+        # Galeria nas linhas e consultas nas colunas, para a seleção por grupos de linhas
+        valores = np.dot(galeria[inicio:fim], consultas.T)
+        np.subtract(meias_normas[inicio:fim, None], valores, out=valores)
+
+        candidatos = selecionar_k_menores(valores, k)
+
+        melhores_indices, melhores_valores = combinar_k_melhores(
+            np.hstack((melhores_indices, candidatos + inicio)),
+            np.hstack((melhores_valores, valores[candidatos, colunas])),
+            k)
+
+    return melhores_indices, melhores_valores
@@ -0,0 +1,314 @@
+import os
+import json
+import hashlib
+import numpy as np
+from auxiliares import carregar_arquivos
+from armazenamento import salvar_arrays, carregar_arrays
+
+EXTENSAO_PACOTE = ".pacote"
+TAMANHO_BLOCO_CONVERSAO = 4096
+
+
+def caminho_do_pacote(arquivos, diretorio, cinza=False, resolucao=None):
+    """
+    Define o caminho do pacote de uma base dentro de um diretório de cache.
+
+    O nome depende da pasta comum às pastas dos arquivos e das opções de leitura, e não da lista de
+    arquivos: assim, acrescentar ou remover imagens da base atualiza o mesmo pacote, e
+    subconjuntos da mesma pasta (galeria e teste, por exemplo) compartilham o pacote, cada
+    um selecionando as suas linhas com `selecionar_linhas`.
+
+    Args:
+        arquivos (list): Lista de caminhos das imagens da base.
+        diretorio (str): Diretório onde os pacotes são guardados.
+        cinza (bool, opcional): Se True, as imagens são guardadas em escala de cinza.
+            Padrão é False.
+        resolucao (tuple, opcional): Resolução (altura, largura) das imagens guardadas.
+            Padrão é None.
+
+    Returns:
+        str: Caminho do arquivo do pacote.
+    """
+
+    if len(arquivos) == 0:
+        raise ValueError("Não há arquivos para definir o pacote da base.")
+    # A pasta comum às pastas dos arquivos: com um arquivo só, a pasta dele, e não o arquivo
+    raiz = os.path.commonpath([os.path.dirname(os.path.abspath(arquivo)) for arquivo in arquivos])
+    chave = json.dumps({
+        "raiz": raiz,
+        "cinza": cinza,
+        "resolucao": list(resolucao) if resolucao is not None else None,
+    }, sort_keys=True)
+    resumo = hashlib.sha256(chave.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(diretorio, f"base_{resumo}{EXTENSAO_PACOTE}")
+
+
+def abrir_pacote(caminho, mmap=True):
+    """
+    Abre um pacote salvo por `empacotar_base`.
+
+    Args:
+        caminho (str): Caminho do arquivo do pacote.
+        mmap (bool, opcional): Se True, as imagens são mapeadas em memória em vez de lidas
+            por completo. Padrão é True.
+
+    Returns:
+        dict: Pacote com as imagens uint8 ("imagens") e o manifesto: "arquivos" (caminhos
+        absolutos), "rotulos", "mtimes" (ns), "tamanhos" (bytes), "formato", "cinza" e
+        "resolucao".
+    """
+
+    pacote = carregar_arrays(caminho, mmap=mmap)
+    pacote["formato"] = tuple(pacote["formato"])
+    return pacote
+
+
+def empacotar_base(arquivos, caminho, rotulos=None, cinza=False, resolucao=None,
+                   num_threads=None, tamanho_lote=1000):
+    """
+    Decodifica as imagens da base uma única vez e as guarda como um único array uint8,
+    acompanhado de um manifesto com o caminho, o rótulo, a data de modificação e o
+    tamanho de cada arquivo.
+
+    Se o pacote já existir com as mesmas opções de leitura, só são decodificados os
+    arquivos novos ou modificados (data de modificação ou tamanho diferentes); as linhas
+    dos arquivos inalterados são copiadas do pacote anterior. Arquivos do pacote que não
+    estão na lista continuam nele enquanto existirem sem modificação, para que listas
+    diferentes da mesma pasta não descartem as linhas umas das outras; só as linhas de
+    arquivos apagados ou modificados fora da lista são descartadas. Se nada mudou, o
+    pacote existente é apenas reaberto. As linhas da lista vêm primeiro, na ordem dada.
+
+    Args:
+        arquivos (list): Lista de caminhos das imagens da base.
+        caminho (str): Caminho do arquivo do pacote.
+        rotulos (list, opcional): Rótulos correspondentes a cada arquivo. Padrão é None.
+        cinza (bool, opcional): Se True, decodifica em escala de cinza. Padrão é False.
+        resolucao (tuple, opcional): Resolução (altura, largura) das imagens guardadas.
+            Padrão é None.
+        num_threads (int, opcional): Número de threads de decodificação. Padrão é None.
+        tamanho_lote (int, opcional): Número de arquivos decodificados por vez. Padrão é 1000.
+
+    Returns:
+        dict: Pacote aberto com `abrir_pacote`.
+    """
+
+    rotulos = list(rotulos) if rotulos is not None else [""] * len(arquivos)
+    absolutos = [os.path.abspath(arquivo) for arquivo in arquivos]
+    resolucao = list(resolucao) if resolucao is not None else None
+
+    mtimes = np.full(len(arquivos), -1, dtype=np.int64)
+    tamanhos = np.full(len(arquivos), -1, dtype=np.int64)
+    for i, arquivo in enumerate(absolutos):
+        try:
+            estado = os.stat(arquivo)
+        except OSError:
+            continue
+        mtimes[i], tamanhos[i] = estado.st_mtime_ns, estado.st_size
+
+    anterior = None
+    if os.path.exists(caminho):
+        anterior = abrir_pacote(caminho)
+        if anterior["cinza"] != cinza or anterior["resolucao"] != resolucao:
+            anterior = None
+
+    linhas_anteriores = {}
+    if anterior is not None:
+        for linha, arquivo in enumerate(anterior["arquivos"]):
+            linhas_anteriores[arquivo] = (
+                linha, int(anterior["mtimes"][linha]), int(anterior["tamanhos"][linha]))
+
+    # Para cada arquivo, a linha do pacote anterior que ainda está atualizada (ou None)
+    reaproveitadas = []
+    for i, arquivo in enumerate(absolutos):
+        registro = linhas_anteriores.get(arquivo)
+        atualizada = registro is not None and registro[1:] == (mtimes[i], tamanhos[i])
+        reaproveitadas.append(registro[0] if atualizada else None)
+
+    pendentes = [i for i, linha in enumerate(reaproveitadas) if linha is None and mtimes[i] >= 0]
+
+    # Linhas de arquivos fora da lista que continuam válidas: (linha, arquivo, mtime, tamanho)
+    pedidos = set(absolutos)
+    mantidas = []
+    descartadas = False
+    for arquivo, (linha, mtime, tamanho) in linhas_anteriores.items():
+        if arquivo in pedidos:
+            continue
+        try:
+            estado = os.stat(arquivo)
+        except OSError:
+            descartadas = True
+            continue
+        if (estado.st_mtime_ns, estado.st_size) != (mtime, tamanho):
+            descartadas = True
+            continue
+        mantidas.append((linha, arquivo, mtime, tamanho))
+
+    if (anterior is not None and not pendentes and not descartadas
+            and all(linha is not None or absolutos[i] not in linhas_anteriores
+                    for i, linha in enumerate(reaproveitadas))
+            and all(anterior["rotulos"][linha] == rotulos[i]
+                    for i, linha in enumerate(reaproveitadas) if linha is not None)):
+        return anterior
+
+    # Decodifica apenas os arquivos novos ou modificados
+    decodificadas = {}
+    formato = anterior["formato"] if anterior is not None else None
+    for inicio in range(0, len(pendentes), tamanho_lote):
+        bloco = pendentes[inicio:inicio + tamanho_lote]
+        imagens, validos = carregar_arquivos(
+            [absolutos[i] for i in bloco], num_threads=num_threads, cinza=cinza,
+            resolucao=resolucao, normalizar=False)
+        if len(imagens) == 0:
+            continue
+        if formato is None:
+            formato = imagens.shape[1:]
+        elif imagens.shape[1:] != tuple(formato):
+            raise ValueError(
+                f"As novas imagens têm formato {imagens.shape[1:]}, diferente do formato do "
+                f"pacote {tuple(formato)}. Use `resolucao` para uniformizar a base.")
+        for posicao, imagem in zip(validos, imagens):
+            decodificadas[bloco[posicao]] = imagem
+
+    presentes = [i for i, linha in enumerate(reaproveitadas)
+                 if linha is not None or i in decodificadas]
+    if formato is None:
+        raise ValueError("Nenhuma imagem válida encontrada para empacotar.")
+
+    imagens = np.empty((len(presentes) + len(mantidas),) + tuple(formato), dtype=np.uint8)
+    for destino, i in enumerate(presentes):
+        linha = reaproveitadas[i]
+        imagens[destino] = anterior["imagens"][linha] if linha is not None else decodificadas[i]
+    for destino, (linha, _, _, _) in enumerate(mantidas, start=len(presentes)):
+        imagens[destino] = anterior["imagens"][linha]
+
+    salvar_arrays({
+        "imagens": imagens,
+        "mtimes": np.concatenate(
+            [mtimes[presentes], np.array([m[2] for m in mantidas], dtype=np.int64)]),
+        "tamanhos": np.concatenate(
+            [tamanhos[presentes], np.array([m[3] for m in mantidas], dtype=np.int64)]),
+        "arquivos": [absolutos[i] for i in presentes] + [m[1] for m in mantidas],
+        "rotulos": [rotulos[i] for i in presentes] + [anterior["rotulos"][m[0]] for m in mantidas],
+        "formato": list(formato),
+        "cinza": cinza,
+        "resolucao": resolucao,
+    }, caminho)
+
+    return abrir_pacote(caminho)
+
+
+def obter_pacote(arquivos, diretorio, rotulos=None, cinza=False, resolucao=None,
+                 num_threads=None):
+    """
+    Obtém o pacote atualizado da base, criando-o ou atualizando-o se necessário.
+
+    Args:
+        arquivos (list): Lista de caminhos das imagens da base.
+        diretorio (str): Diretório onde os pacotes são guardados.
+        rotulos (list, opcional): Rótulos correspondentes a cada arquivo. Padrão é None.
+        cinza (bool, opcional): Se True, usa imagens em escala de cinza. Padrão é False.
+        resolucao (tuple, opcional): Resolução (altura, largura) das imagens. Padrão é None.
+        num_threads (int, opcional): Número de threads de decodificação. Padrão é None.
+
+    Returns:
+        dict: Pacote aberto com `abrir_pacote`.
+    """
+
+    caminho = caminho_do_pacote(arquivos, diretorio, cinza, resolucao)
+    return empacotar_base(arquivos, caminho, rotulos, cinza, resolucao, num_threads)
+
+
+def selecionar_linhas(pacote, arquivos):
+    """
+    Localiza no pacote as linhas correspondentes a uma lista de arquivos.
+
+    Args:
+        pacote (dict): Pacote aberto com `abrir_pacote`.
+        arquivos (list): Lista de caminhos das imagens.
+
+    Returns:
+        tuple: Array com as linhas do pacote e lista com os índices, em `arquivos`, dos
+        arquivos presentes no pacote.
+    """
+
+    linhas_por_arquivo = {arquivo: linha for linha, arquivo in enumerate(pacote["arquivos"])}
+    linhas = []
+    validos = []
+    for i, arquivo in enumerate(arquivos):
+        linha = linhas_por_arquivo.get(os.path.abspath(arquivo))
+        if linha is not None:
+            linhas.append(linha)
+            validos.append(i)
+    return np.asarray(linhas, dtype=np.int64), validos
+
+
+def converter_linhas(pacote, linhas):
+    """
+    Converte linhas do pacote para imagens normalizadas (float32 entre 0 e 1), em blocos,
+    sem criar uma cópia uint8 intermediária de todas as linhas.
+
+    Args:
+        pacote (dict): Pacote aberto com `abrir_pacote`.
+        linhas (numpy.array): Linhas do pacote a converter.
+
+    Returns:
+        numpy.array: Array (N, altura, largura[, canais]) float32.
+    """
+
+    imagens = np.empty((len(linhas),) + pacote["formato"], dtype=np.float32)
+    contiguas = len(linhas) > 0 and np.array_equal(
+        linhas, np.arange(linhas[0], linhas[0] + len(linhas)))
+
+    for inicio in range(0, len(linhas), TAMANHO_BLOCO_CONVERSAO):
+        fim = min(inicio + TAMANHO_BLOCO_CONVERSAO, len(linhas))
+        # Linhas consecutivas são lidas como uma fatia do mapa, sem indexação avançada
+        bloco = (pacote["imagens"][linhas[inicio]:linhas[inicio] + fim - inicio] if contiguas
+                 else pacote["imagens"][linhas[inicio:fim]])
+        np.divide(bloco, np.float32(255.0), out=imagens[inicio:fim], dtype=np.float32)
+
+    return imagens
+
+
+def carregar_base(arquivos, diretorio, rotulos=None, cinza=False, resolucao=None,
+                  num_threads=None):
+    """
+    Carrega as imagens de uma lista de arquivos a partir do pacote da base, com o mesmo
+    retorno de `auxiliares.carregar_arquivos`. Apenas os arquivos novos ou modificados
+    desde a última execução são decodificados.
+
+    Args:
+        arquivos (list): Lista de caminhos das imagens da base.
+        diretorio (str): Diretório onde os pacotes são guardados.
+        rotulos (list, opcional): Rótulos correspondentes a cada arquivo. Padrão é None.
+        cinza (bool, opcional): Se True, usa imagens em escala de cinza. Padrão é False.
+        resolucao (tuple, opcional): Resolução (altura, largura) das imagens. Padrão é None.
+        num_threads (int, opcional): Número de threads de decodificação. Padrão é None.
+
+    Returns:
+        tuple: Array com as imagens normalizadas (float32 entre 0 e 1) e lista com os
+        índices, em `arquivos`, das imagens carregadas com sucesso.
+    """
+
+    pacote = obter_pacote(arquivos, diretorio, rotulos, cinza, resolucao, num_threads)
+    linhas, validos = selecionar_linhas(pacote, arquivos)
+    return converter_linhas(pacote, linhas), validos
+
+
+def gerar_lotes_do_pacote(pacote, linhas, tamanho_lote=1000):
+    """
+    Percorre linhas do pacote em lotes de imagens normalizadas, mantendo em memória apenas
+    um lote convertido por vez.
+
+    Args:
+        pacote (dict): Pacote aberto com `abrir_pacote`.
+        linhas (numpy.array): Linhas do pacote a percorrer.
+        tamanho_lote (int, opcional): Número de linhas por lote. Padrão é 1000.
+
+    Yields:
+        tuple: Array float32 com as imagens do lote e lista com as posições, em `linhas`,
+        das imagens do lote.
+    """
+
+    for inicio in range(0, len(linhas), tamanho_lote):
+        fim = min(inicio + tamanho_lote, len(linhas))
+        yield converter_linhas(pacote, linhas[inicio:fim]), list(range(inicio, fim))
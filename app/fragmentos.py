@@ -0,0 +1,114 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+from distancias import buscar_k_vizinhos, calcular_normas, combinar_k_melhores
+
+# Galeria e normas do bloco de memória compartilhada, anexados uma vez por processo
+_COMPARTILHADO = {}
+
+
+class GaleriaFragmentada:
+    """
+    Galeria de vetores de pesos dividida em fragmentos buscados em paralelo por um pool de
+    processos.
+
+    Os vetores e suas normas são copiados uma única vez para um bloco de memória
+    compartilhada, que cada processo anexa ao iniciar: nenhum processo recebe a galeria por
+    pickle, e a memória ocupada não cresce com o número de processos. Cada fragmento é uma
+    faixa contígua de linhas; uma busca envia o lote de consultas a todos os fragmentos,
+    cada processo devolve os k melhores do seu fragmento (com `distancias.buscar_k_vizinhos`)
+    e o coordenador combina os resultados. Assim a busca usa todos os núcleos, e não só as
+    threads do BLAS de um interpretador.
+
+    Com mais fragmentos que processos, os fragmentos ficam menores que a cache e são
+    distribuídos entre os processos à medida que eles ficam livres.
+    """
+
+    def __init__(self, vetores_de_pesos, num_fragmentos=None, num_processos=None):
+        vetores_de_pesos = np.asarray(vetores_de_pesos, dtype=np.float32)
+        num_vetores, dimensao = vetores_de_pesos.shape
+        self.num_processos = max(1, num_processos or os.cpu_count() or 1)
+        num_fragmentos = min(num_fragmentos or self.num_processos, num_vetores)
+        self.limites = np.linspace(0, num_vetores, num_fragmentos + 1).astype(np.int64)
+        self.tamanho = num_vetores
+        self.dimensao = dimensao
+
+        self.memoria = shared_memory.SharedMemory(
+            create=True, size=num_vetores * (dimensao + 1) * np.dtype(np.float32).itemsize)
+        galeria, normas = _visoes(self.memoria, num_vetores, dimensao)
+        galeria[:] = vetores_de_pesos
+        normas[:] = calcular_normas(galeria)
+
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.num_processos, initializer=_iniciar_processo,
+            initargs=(self.memoria.name, num_vetores, dimensao))
+
+    @property
+    def num_fragmentos(self):
+        return len(self.limites) - 1
+
+    def buscar(self, consultas, k=1):
+        """
+        Busca os k vizinhos mais próximos de muitas consultas em todos os fragmentos.
+
+        Args:
+            consultas (numpy.array): Matriz Q×K de vetores de consulta (ou um único vetor).
+            k (int, opcional): Número de vizinhos por consulta. Padrão é 1.
+
+        Returns:
+            tuple: Matriz Q×k de índices na galeria e matriz Q×k de distâncias, em ordem
+            crescente de distância por linha.
+        """
+
+        consultas = np.ascontiguousarray(consultas, dtype=np.float32).reshape(-1, self.dimensao)
+        k = min(k, self.tamanho)
+        futuros = [self.executor.submit(_buscar_fragmento, inicio, fim, consultas, k)
+                   for inicio, fim in zip(self.limites[:-1], self.limites[1:])]
+
+        indices = np.empty((len(consultas), 0), dtype=np.int64)
+        distancias = np.empty((len(consultas), 0), dtype=np.float32)
+        for futuro in futuros:
+            indices_fragmento, distancias_fragmento = futuro.result()
+            indices, distancias = combinar_k_melhores(
+                np.hstack((indices, indices_fragmento)),
+                np.hstack((distancias, distancias_fragmento)), k)
+
+        return indices, distancias
+
+    def fechar(self):
+        """
+        Encerra os processos e libera a memória compartilhada.
+        """
+
+        self.executor.shutdown()
+        self.memoria.close()
+        self.memoria.unlink()
+
+    def __len__(self):
+        return self.tamanho
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
+
+
+def _visoes(memoria, num_vetores, dimensao):
+    dados = np.ndarray((num_vetores * (dimensao + 1),), dtype=np.float32, buffer=memoria.buf)
+    fim_galeria = num_vetores * dimensao
+    return dados[:fim_galeria].reshape(num_vetores, dimensao), dados[fim_galeria:]
+
+
+def _iniciar_processo(nome, num_vetores, dimensao):
+    memoria = shared_memory.SharedMemory(name=nome)
+    _COMPARTILHADO["memoria"] = memoria
+    _COMPARTILHADO["galeria"], _COMPARTILHADO["normas"] = _visoes(memoria, num_vetores, dimensao)
+
+
+def _buscar_fragmento(inicio, fim, consultas, k):
+    indices, distancias = buscar_k_vizinhos(
+        consultas, _COMPARTILHADO["galeria"][inicio:fim], k=min(k, fim - inicio),
+        normas_galeria=_COMPARTILHADO["normas"][inicio:fim], num_threads=1)
+    return indices + inicio, distancias
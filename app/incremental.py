@@ -0,0 +1,222 @@
+import numpy as np
+from auxiliares import carregar_arquivos, escolher_num_autofaces
+from projecao import projetar_lote
+from empacotamento import obter_pacote, selecionar_linhas, gerar_lotes_do_pacote
+
+
+def gerar_lotes(arquivos, tamanho_lote=1000, num_threads=None, cinza=False, resolucao=None):
+    """
+    Lê as imagens de uma lista de arquivos em lotes, mantendo em memória apenas um lote por vez.
+
+    Args:
+        arquivos (list): Lista de caminhos das imagens.
+        tamanho_lote (int, opcional): Número de arquivos lidos por lote. Padrão é 1000.
+        num_threads (int, opcional): Número de threads de decodificação. Padrão é None.
+        cinza (bool, opcional): Se True, decodifica em escala de cinza. Padrão é False.
+        resolucao (tuple, opcional): Resolução alvo (altura, largura). Padrão é None.
+
+    Yields:
+        tuple: Array (b, altura, largura, canais) com as imagens do lote e lista com os
+        índices, em `arquivos`, das imagens carregadas com sucesso.
+    """
+
+    for inicio in range(0, len(arquivos), tamanho_lote):
+        imagens, validos = carregar_arquivos(
+            arquivos[inicio:inicio + tamanho_lote], num_threads=num_threads, cinza=cinza,
+            resolucao=resolucao)
+        if len(imagens) > 0:
+            yield imagens, [inicio + i for i in validos]
+
+
+def gerar_lotes_de_matriz(matriz, tamanho_lote=1000):
+    """
+    Percorre uma matriz de dados (por exemplo, um `numpy.memmap`) em lotes de linhas.
+
+    Args:
+        matriz (numpy.array): Matriz N×D (ou N×altura×largura×canais) de imagens.
+        tamanho_lote (int, opcional): Número de linhas por lote. Padrão é 1000.
+
+    Yields:
+        numpy.array: Lote de linhas da matriz.
+    """
+
+    for inicio in range(0, len(matriz), tamanho_lote):
+        yield matriz[inicio:inicio + tamanho_lote]
+
+
+def iniciar_decomposicao():
+    """
+    Cria o estado vazio de uma decomposição incremental.
+
+    Returns:
+        dict: Estado com o número de amostras, a média, os valores singulares, os
+        componentes (um por linha) e a energia total (soma dos quadrados dos dados
+        centralizados, igual à soma de todos os autovalores) acumulados até o momento.
+    """
+
+    return {"n": 0, "media": None, "valores_singulares": None, "componentes": None,
+            "energia_total": 0.0}
+
+
+def atualizar_decomposicao(estado, lote, num_componentes):
+    """
+    Incorpora um lote de imagens à decomposição incremental (PCA incremental de Ross et al.).
+
+    A decomposição anterior é resumida pelos seus componentes escalados pelos valores
+    singulares; esse resumo é empilhado com o lote centralizado e com um termo de correção
+    da média, e a SVD dessa matriz pequena ((r + b + 1)×D) fornece a nova decomposição.
+    O resultado é exato enquanto o posto dos dados não ultrapassar `num_componentes`.
+
+    Args:
+        estado (dict): Estado criado por `iniciar_decomposicao`, atualizado no lugar.
+        lote (numpy.array): Lote de imagens, com uma imagem por linha (ou no formato de imagem).
+        num_componentes (int): Número de componentes mantidos após a atualização.
+
+    Returns:
+        dict: O próprio estado atualizado.
+    """
+
+    lote = np.asarray(lote, dtype=np.float64).reshape(len(lote), -1)
+    n_lote = len(lote)
+    if n_lote == 0:
+        return estado
+
+    media_lote = lote.mean(axis=0)
+    n_anterior = estado["n"]
+    n_total = n_anterior + n_lote
+    centralizado = lote - media_lote
+    # A energia total é atualizada à parte porque a truncagem descarta parte dela
+    energia_lote = float(np.einsum("ij,ij->", centralizado, centralizado))
+
+    if n_anterior == 0:
+        matriz = centralizado
+        nova_media = media_lote
+    else:
+        media_anterior = estado["media"]
+        correcao = np.sqrt(n_anterior * n_lote / n_total) * (media_anterior - media_lote)
+        energia_lote += float(np.dot(correcao, correcao))
+        matriz = np.vstack([
+            estado["valores_singulares"][:, None] * estado["componentes"],
+            centralizado,
+            correcao,
+        ])
+        nova_media = media_anterior + (media_lote - media_anterior) * (n_lote / n_total)
+
+    _, valores_singulares, componentes = np.linalg.svd(matriz, full_matrices=False)
+
+    estado["n"] = n_total
+    estado["media"] = nova_media
+    estado["valores_singulares"] = valores_singulares[:num_componentes]
+    estado["componentes"] = componentes[:num_componentes]
+    estado["energia_total"] = estado.get("energia_total", 0.0) + energia_lote
+
+    return estado
+
+
+def calcular_autofaces_incremental(lotes, num_autofaces=15, componentes_extras=10,
+                                   variancia_explicada=None):
+    """
+    Calcula a face média e as autofaces consumindo as imagens em lotes, com memória
+    limitada pelo tamanho do lote e não pelo tamanho da base.
+
+    Args:
+        lotes (iterable): Iterável de lotes de imagens, como os gerados por `gerar_lotes`
+            (pares imagens/índices) ou por `gerar_lotes_de_matriz`.
+        num_autofaces (int, opcional): Número de autofaces a serem calculadas. Padrão é 15.
+        componentes_extras (int, opcional): Componentes mantidos além de `num_autofaces`
+            entre os lotes, para reduzir o erro de truncamento. Padrão é 10.
+        variancia_explicada (float, opcional): Se informada, mantém apenas as autofaces
+            necessárias para explicar essa fração da variância total, até o máximo de
+            `num_autofaces`. Padrão é None.
+
+    Returns:
+        tuple: Face média (numpy.array), array com as autofaces (no formato das imagens),
+        autovalores (numpy.array) em ordem decrescente, número de imagens processadas e
+        variância total.
+    """
+
+    estado = iniciar_decomposicao()
+    formato = None
+
+    for lote in lotes:
+        if isinstance(lote, tuple):
+            lote = lote[0]
+        if formato is None:
+            formato = lote.shape[1:]
+        atualizar_decomposicao(estado, lote, num_autofaces + componentes_extras)
+
+    if estado["n"] == 0:
+        raise ValueError("Nenhuma imagem recebida para o treinamento incremental.")
+
+    face_media = estado["media"].astype(np.float32).reshape(formato)
+    autovalores = (estado["valores_singulares"] ** 2).astype(np.float32)
+    if variancia_explicada is not None:
+        num_autofaces = escolher_num_autofaces(
+            autovalores, estado["energia_total"], variancia_explicada, num_autofaces)
+    autofaces = estado["componentes"][:num_autofaces].astype(np.float32)
+
+    return (face_media, autofaces.reshape((-1,) + tuple(formato)), autovalores, estado["n"],
+            estado["energia_total"])
+
+
+def treinar_modelo_incremental(arquivos, rotulos=None, num_autofaces=15, tamanho_lote=1000,
+                               cinza=False, resolucao=None, diretorio_pacotes=None,
+                               variancia_explicada=None):
+    """
+    Treina um modelo de autofaces em duas passadas por lotes: a primeira acumula a
+    decomposição incremental e a segunda projeta a galeria na base obtida.
+
+    Args:
+        arquivos (list): Lista de caminhos das imagens da base.
+        rotulos (list, opcional): Rótulos correspondentes a cada arquivo. Padrão é None.
+        num_autofaces (int, opcional): Número de autofaces a serem calculadas. Padrão é 15.
+        tamanho_lote (int, opcional): Número de arquivos lidos por lote. Padrão é 1000.
+        cinza (bool, opcional): Se True, decodifica em escala de cinza. Padrão é False.
+        resolucao (tuple, opcional): Resolução alvo (altura, largura). Padrão é None.
+        diretorio_pacotes (str, opcional): Se informado, as imagens são lidas do pacote da
+            base nesse diretório (ver `empacotamento`), e não decodificadas. Padrão é None.
+        variancia_explicada (float, opcional): Fração da variância total que as autofaces
+            devem explicar; `num_autofaces` passa a ser o máximo. Padrão é None.
+
+    Returns:
+        dict: Modelo no mesmo formato do retornado por `modelo.treinar_modelo`.
+    """
+
+    if diretorio_pacotes is not None:
+        pacote = obter_pacote(arquivos, diretorio_pacotes, rotulos, cinza, resolucao)
+        linhas, presentes = selecionar_linhas(pacote, arquivos)
+
+        def lotes():
+            for imagens, posicoes in gerar_lotes_do_pacote(pacote, linhas, tamanho_lote):
+                yield imagens, [presentes[posicao] for posicao in posicoes]
+    else:
+        def lotes():
+            return gerar_lotes(arquivos, tamanho_lote, cinza=cinza, resolucao=resolucao)
+
+    face_media, autofaces, autovalores, _, variancia_total = calcular_autofaces_incremental(
+        lotes(), num_autofaces, variancia_explicada=variancia_explicada)
+
+    formato = face_media.shape
+    face_media = face_media.flatten()
+    matriz_autofaces = autofaces.reshape(len(autofaces), -1)
+
+    validos = []
+    vetores_de_pesos = []
+    for imagens, indices in lotes():
+        vetores_de_pesos.append(projetar_lote(imagens, face_media, matriz_autofaces))
+        validos.extend(indices)
+
+    return {
+        "face_media": face_media,
+        "autofaces": np.ascontiguousarray(matriz_autofaces),
+        "autovalores": autovalores,
+        "variancia_total": variancia_total,
+        "vetores_de_pesos": np.vstack(vetores_de_pesos),
+        "rotulos": [rotulos[i] for i in validos] if rotulos is not None else [""] * len(validos),
+        "arquivos": [arquivos[i] for i in validos],
+        "formato": tuple(formato),
+        "parametros": {"num_autofaces": num_autofaces, "tamanho_lote": tamanho_lote,
+                       "cinza": cinza,
+                       "resolucao": list(resolucao) if resolucao is not None else None,
+                       "variancia_explicada": variancia_explicada},
+    }
@@ -0,0 +1,342 @@
+import os
+import json
+import hashlib
+import numpy as np
+from armazenamento import salvar_arrays, carregar_arrays
+
+TIPOS_INDICE = ("exato", "kdtree", "ivf", "auto")
+EXTENSAO_INDICE = ".indice"
+TAMANHO_BLOCO_KMEANS = 8192
+
+
+def construir_indice(vetores, tipo="auto", tamanho_folha=256, num_listas=None,
+                     iteracoes_kmeans=10, semente=0):
+    """
+    Constrói um índice de busca de vizinhos sobre os vetores de pesos da galeria.
+
+    Tipos disponíveis:
+        - "exato": busca por força bruta, sempre exata.
+        - "kdtree": árvore k-d com folhas de até `tamanho_folha` vetores, exata e eficiente
+          para galerias grandes com poucas autofaces (até umas 16 dimensões).
+        - "ivf": arquivo invertido com quantizador grosso (k-means); aproximado, com a
+          revocação controlada pelo número de listas sondadas na busca.
+        - "auto": "exato" para galerias pequenas, "kdtree" para poucas dimensões e "ivf"
+          nos demais casos.
+
+    Args:
+        vetores (numpy.array): Matriz N×K de vetores de pesos.
+        tipo (str, opcional): Tipo do índice. Padrão é "auto".
+        tamanho_folha (int, opcional): Número máximo de vetores por folha da árvore k-d.
+            Folhas grandes diminuem o custo de percorrer a árvore em Python. Padrão é 256.
+        num_listas (int, opcional): Número de listas (centróides) do índice IVF. Se None,
+            usa cerca de 4·√N. Padrão é None.
+        iteracoes_kmeans (int, opcional): Iterações do k-means do índice IVF. Padrão é 10.
+        semente (int, opcional): Semente do gerador aleatório. Padrão é 0.
+
+    Returns:
+        dict: Índice, com os vetores reordenados e as estruturas de busca.
+    """
+
+    if tipo not in TIPOS_INDICE:
+        raise ValueError(f"Tipo de índice desconhecido: {tipo}. Use um de {TIPOS_INDICE}.")
+
+    vetores = np.ascontiguousarray(vetores, dtype=np.float32)
+    num_vetores, dimensao = vetores.shape
+
+    if tipo == "auto":
+        if num_vetores <= 50000:
+            tipo = "exato"
+        elif dimensao <= 16:
+            tipo = "kdtree"
+        else:
+            tipo = "ivf"
+
+    if tipo == "exato":
+        return {
+            "tipo": tipo,
+            "pontos": vetores,
+            "ordem": np.arange(num_vetores, dtype=np.int64),
+            "normas": np.einsum("ij,ij->i", vetores, vetores),
+        }
+
+    if tipo == "kdtree":
+        return _construir_kdtree(vetores, tamanho_folha)
+
+    return _construir_ivf(vetores, num_listas, iteracoes_kmeans, semente)
+
+
+def buscar_indice(indice, consulta, k=1, num_sondas=8):
+    """
+    Busca os k vetores mais próximos (distância euclidiana) de um vetor de consulta.
+
+    Args:
+        indice (dict): Índice criado por `construir_indice`.
+        consulta (numpy.array): Vetor de pesos da consulta.
+        k (int, opcional): Número de vizinhos retornados. Padrão é 1.
+        num_sondas (int, opcional): Número de listas sondadas no índice IVF; mais sondas
+            aumentam a revocação e a latência. Ignorado nos demais tipos. Padrão é 8.
+
+    Returns:
+        tuple: Índices dos vizinhos na galeria original e suas distâncias, em ordem
+        crescente de distância.
+    """
+
+    consulta = np.asarray(consulta, dtype=np.float32).reshape(-1)
+    k = min(k, len(indice["ordem"]))
+
+    if indice["tipo"] == "exato":
+        distancias = indice["normas"] - 2 * np.dot(indice["pontos"], consulta)
+        distancias += np.dot(consulta, consulta)
+        posicoes, quadrados = _menores(np.arange(len(distancias)), distancias, k)
+    elif indice["tipo"] == "kdtree":
+        posicoes, quadrados = _buscar_kdtree(indice, consulta, k)
+    else:
+        posicoes, quadrados = _buscar_ivf(indice, consulta, k, num_sondas)
+
+    return indice["ordem"][posicoes], np.sqrt(np.maximum(quadrados, 0.0))
+
+
+def salvar_indice(indice, caminho):
+    """
+    Salva o índice no mesmo formato binário dos modelos, para reabri-lo mapeado em memória.
+
+    Args:
+        indice (dict): Índice criado por `construir_indice`.
+        caminho (str): Caminho do arquivo de saída.
+    """
+
+    salvar_arrays(indice, caminho)
+
+
+def carregar_indice(caminho, mmap=True):
+    """
+    Carrega um índice salvo por `salvar_indice`.
+
+    Args:
+        caminho (str): Caminho do arquivo do índice.
+        mmap (bool, opcional): Se True, os arrays são mapeados em memória. Padrão é True.
+
+    Returns:
+        dict: Índice de busca.
+    """
+
+    return carregar_arrays(caminho, mmap=mmap)
+
+
+def obter_indice(modelo, tipo="auto", diretorio_cache=None, **parametros):
+    """
+    Obtém o índice dos vetores de pesos do modelo, guardando-o ao lado do modelo no cache.
+
+    Args:
+        modelo (dict): Modelo de autofaces.
+        tipo (str, opcional): Tipo do índice. Padrão é "auto".
+        diretorio_cache (str, opcional): Diretório do cache de modelos. O índice só é
+            persistido quando o modelo também veio do cache. Padrão é None.
+        **parametros: Parâmetros adicionais de `construir_indice`.
+
+    Returns:
+        dict: Índice de busca.
+    """
+
+    impressao_digital = modelo.get("impressao_digital")
+    if diretorio_cache is None or impressao_digital is None:
+        return construir_indice(modelo["vetores_de_pesos"], tipo, **parametros)
+
+    configuracao = json.dumps({"tipo": tipo, **parametros}, sort_keys=True)
+    sufixo = hashlib.sha256(configuracao.encode("utf-8")).hexdigest()[:12]
+    caminho = os.path.join(diretorio_cache, f"{impressao_digital}_{sufixo}{EXTENSAO_INDICE}")
+
+    if os.path.exists(caminho):
+        return carregar_indice(caminho)
+
+    indice = construir_indice(modelo["vetores_de_pesos"], tipo, **parametros)
+    salvar_indice(indice, caminho)
+
+    return carregar_indice(caminho)
+
+
+def _menores(posicoes, distancias, k):
+    if len(distancias) > k:
+        selecionados = np.argpartition(distancias, k - 1)[:k]
+        posicoes, distancias = posicoes[selecionados], distancias[selecionados]
+    ordem = np.argsort(distancias, kind="stable")
+    return posicoes[ordem], distancias[ordem]
+
+
+def _construir_kdtree(vetores, tamanho_folha):
+    ordem = np.arange(len(vetores), dtype=np.int64)
+    dimensoes, limiares, esquerdas, direitas, inicios, fins = [], [], [], [], [], []
+
+    def novo_no(inicio, fim):
+        dimensoes.append(-1)
+        limiares.append(0.0)
+        esquerdas.append(-1)
+        direitas.append(-1)
+        inicios.append(inicio)
+        fins.append(fim)
+        return len(inicios) - 1
+
+    pilha = [novo_no(0, len(vetores))]
+    while pilha:
+        no = pilha.pop()
+        inicio, fim = inicios[no], fins[no]
+        if fim - inicio <= tamanho_folha:
+            continue
+
+        pontos = vetores[ordem[inicio:fim]]
+        amplitudes = pontos.max(axis=0) - pontos.min(axis=0)
+        dimensao = int(np.argmax(amplitudes))
+        if amplitudes[dimensao] == 0:
+            continue
+
+        meio = (fim - inicio) // 2
+        particao = np.argpartition(pontos[:, dimensao], meio)
+        ordem[inicio:fim] = ordem[inicio:fim][particao]
+
+        dimensoes[no] = dimensao
+        limiares[no] = float(vetores[ordem[inicio + meio], dimensao])
+        esquerdas[no] = novo_no(inicio, inicio + meio)
+        direitas[no] = novo_no(inicio + meio, fim)
+        pilha.extend([esquerdas[no], direitas[no]])
+
+    return {
+        "tipo": "kdtree",
+        "pontos": np.ascontiguousarray(vetores[ordem]),
+        "ordem": ordem,
+        "dimensoes": np.array(dimensoes, dtype=np.int32),
+        "limiares": np.array(limiares, dtype=np.float32),
+        "esquerdas": np.array(esquerdas, dtype=np.int32),
+        "direitas": np.array(direitas, dtype=np.int32),
+        "inicios": np.array(inicios, dtype=np.int64),
+        "fins": np.array(fins, dtype=np.int64),
+    }
+
+
+def _buscar_kdtree(indice, consulta, k):
+    pontos = indice["pontos"]
+    dimensoes, limiares = indice["dimensoes"], indice["limiares"]
+    esquerdas, direitas = indice["esquerdas"], indice["direitas"]
+    inicios, fins = indice["inicios"], indice["fins"]
+
+    melhores_posicoes = np.empty(0, dtype=np.int64)
+    melhores_distancias = np.empty(0, dtype=np.float32)
+    pior = np.inf
+
+    # Busca em profundidade, podando nós cujo limite inferior supera o k-ésimo melhor
+    pilha = [(0, 0.0)]
+    while pilha:
+        no, limite_inferior = pilha.pop()
+        if limite_inferior > pior:
+            continue
+
+        if esquerdas[no] < 0:
+            inicio, fim = inicios[no], fins[no]
+            diferencas = pontos[inicio:fim] - consulta
+            distancias = np.einsum("ij,ij->i", diferencas, diferencas)
+            melhores_posicoes, melhores_distancias = _menores(
+                np.concatenate((melhores_posicoes, np.arange(inicio, fim))),
+                np.concatenate((melhores_distancias, distancias)), k)
+            if len(melhores_distancias) == k:
+                pior = melhores_distancias[-1]
+            continue
+
+        diferenca = float(consulta[dimensoes[no]] - limiares[no])
+        perto, longe = (esquerdas[no], direitas[no]) if diferenca < 0 else \
+            (direitas[no], esquerdas[no])
+        pilha.append((longe, max(limite_inferior, diferenca * diferenca)))
+        pilha.append((perto, limite_inferior))
+
+    return melhores_posicoes, melhores_distancias
+
+
+def _construir_ivf(vetores, num_listas, iteracoes_kmeans, semente):
+    num_vetores = len(vetores)
+    if num_listas is None:
+        num_listas = int(4 * np.sqrt(num_vetores))
+    num_listas = max(1, min(num_listas, num_vetores))
+
+    centroides = treinar_kmeans(vetores, num_listas, iteracoes_kmeans, semente)
+
+    atribuicoes = atribuir_centroides(vetores, centroides)
+    ordem = np.argsort(atribuicoes, kind="stable").astype(np.int64)
+    inicios = np.zeros(num_listas + 1, dtype=np.int64)
+    np.cumsum(np.bincount(atribuicoes, minlength=num_listas), out=inicios[1:])
+
+    return {
+        "tipo": "ivf",
+        "pontos": np.ascontiguousarray(vetores[ordem]),
+        "ordem": ordem,
+        "centroides": centroides,
+        "inicios": inicios,
+    }
+
+
+def treinar_kmeans(vetores, num_centroides, iteracoes=10, semente=0, amostra_por_centroide=64):
+    """
+    Treina centróides por k-means (algoritmo de Lloyd) sobre uma amostra dos vetores.
+
+    Args:
+        vetores (numpy.array): Matriz N×K de vetores.
+        num_centroides (int): Número de centróides (no máximo N).
+        iteracoes (int, opcional): Número de iterações. Padrão é 10.
+        semente (int, opcional): Semente do gerador aleatório. Padrão é 0.
+        amostra_por_centroide (int, opcional): Tamanho da amostra de treino, em vetores por
+            centróide. Padrão é 64.
+
+    Returns:
+        numpy.array: Matriz num_centroides×K de centróides.
+    """
+
+    num_vetores = len(vetores)
+    gerador = np.random.default_rng(semente)
+    tamanho_amostra = min(num_vetores, amostra_por_centroide * num_centroides)
+    amostra = vetores[gerador.choice(num_vetores, tamanho_amostra, replace=False)]
+    centroides = amostra[gerador.choice(tamanho_amostra, num_centroides, replace=False)].copy()
+
+    for _ in range(iteracoes):
+        atribuicoes = atribuir_centroides(amostra, centroides)
+        contagens = np.bincount(atribuicoes, minlength=num_centroides)
+        somas = np.zeros_like(centroides)
+        np.add.at(somas, atribuicoes, amostra)
+        vazias = contagens == 0
+        centroides[~vazias] = somas[~vazias] / contagens[~vazias, None]
+        # Centróides vazios recebem pontos aleatórios da amostra
+        centroides[vazias] = amostra[gerador.choice(tamanho_amostra, int(vazias.sum()))]
+
+    return centroides
+
+
+def atribuir_centroides(vetores, centroides):
+    """
+    Atribui cada vetor ao centróide mais próximo, em blocos para limitar a memória.
+
+    Args:
+        vetores (numpy.array): Matriz N×K de vetores.
+        centroides (numpy.array): Matriz C×K de centróides.
+
+    Returns:
+        numpy.array: Índice do centróide mais próximo de cada vetor.
+    """
+
+    normas_centroides = np.einsum("ij,ij->i", centroides, centroides)
+    atribuicoes = np.empty(len(vetores), dtype=np.int64)
+    for inicio in range(0, len(vetores), TAMANHO_BLOCO_KMEANS):
+        bloco = vetores[inicio:inicio + TAMANHO_BLOCO_KMEANS]
+        distancias = normas_centroides - 2 * np.dot(bloco, centroides.T)
+        atribuicoes[inicio:inicio + len(bloco)] = np.argmin(distancias, axis=1)
+    return atribuicoes
+
+
+def _buscar_ivf(indice, consulta, k, num_sondas):
+    centroides, inicios, pontos = indice["centroides"], indice["inicios"], indice["pontos"]
+
+    distancias_centroides = np.einsum(
+        "ij,ij->i", centroides - consulta, centroides - consulta)
+    num_sondas = min(num_sondas, len(centroides))
+    listas = np.argpartition(distancias_centroides, num_sondas - 1)[:num_sondas]
+
+    posicoes = np.concatenate([np.arange(inicios[lista], inicios[lista + 1]) for lista in listas])
+    diferencas = pontos[posicoes] - consulta
+    distancias = np.einsum("ij,ij->i", diferencas, diferencas)
+
+    return _menores(posicoes, distancias, min(k, len(posicoes)))
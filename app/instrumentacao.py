@@ -0,0 +1,316 @@
+import os
+import json
+import time
+import threading
+import tracemalloc
+from functools import wraps
+from contextlib import contextmanager
+import numpy as np
+
+
+_ESTADO = {"ativo": False, "memoria": False, "etapas": {}, "metricas": None, "prometheus": None}
+_TRAVA = threading.Lock()
+_LOCAL = threading.local()
+
+
+def ativar_instrumentacao(memoria=True):
+    """
+    Liga a coleta de métricas por etapa. Enquanto desligada, as etapas instrumentadas
+    custam apenas uma verificação de flag.
+
+    Args:
+        memoria (bool, opcional): Se True, também mede o pico de memória de cada etapa com
+            `tracemalloc`, o que deixa as alocações um pouco mais lentas. Padrão é True.
+    """
+
+    _ESTADO["memoria"] = memoria
+    if memoria and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _ESTADO["ativo"] = True
+
+
+def desativar_instrumentacao():
+    """
+    Desliga a coleta de métricas, mantendo o que já foi acumulado.
+    """
+
+    _ESTADO["ativo"] = False
+    if _ESTADO["memoria"] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _ESTADO["memoria"] = False
+
+
+def instrumentacao_ativa():
+    """
+    Returns:
+        bool: True se a coleta de métricas estiver ligada.
+    """
+
+    return _ESTADO["ativo"]
+
+
+def carregar_prometheus():
+    """
+    Importa o `prometheus_client` na primeira chamada, para que quem não exporta métricas
+    não pague o custo da importação.
+
+    Returns:
+        module: O módulo `prometheus_client`, ou None se ele não estiver instalado.
+    """
+
+    if _ESTADO["prometheus"] is None:
+        try:
+            import prometheus_client
+        except ImportError:
+            prometheus_client = False
+        _ESTADO["prometheus"] = prometheus_client
+    return _ESTADO["prometheus"] or None
+
+
+def reiniciar_instrumentacao():
+    """
+    Descarta as métricas acumuladas no relatório (as métricas do Prometheus são cumulativas
+    e não são zeradas).
+    """
+
+    with _TRAVA:
+        _ESTADO["etapas"] = {}
+
+
+def tamanho_em_bytes(*valores):
+    """
+    Soma o tamanho, em bytes, dos arrays numpy (ou listas de arrays) recebidos.
+
+    Args:
+        *valores: Valores quaisquer; os que não são arrays são ignorados.
+
+    Returns:
+        int: Total de bytes.
+    """
+
+    total = 0
+    for valor in valores:
+        if isinstance(valor, np.ndarray):
+            total += valor.nbytes
+        elif isinstance(valor, (list, tuple)):
+            total += sum(item.nbytes for item in valor if isinstance(item, np.ndarray))
+    return total
+
+
+@contextmanager
+def medir_etapa(nome, bytes_entrada=0):
+    """
+    Mede o tempo de parede, o número de chamadas e o pico de memória de um trecho de código.
+
+    Etapas podem ser aninhadas: o pico de memória de uma etapa interna também conta para a
+    externa. O dicionário devolvido pode receber o tamanho da saída em "bytes_saida".
+
+    Args:
+        nome (str): Nome da etapa no relatório.
+        bytes_entrada (int, opcional): Tamanho dos dados de entrada, em bytes. Padrão é 0.
+
+    Yields:
+        dict: Registro da chamada, em que o trecho medido pode preencher "bytes_saida".
+    """
+
+    registro = {"bytes_entrada": bytes_entrada, "bytes_saida": 0, "pico": 0}
+    if not _ESTADO["ativo"]:
+        yield registro
+        return
+
+    memoria = _ESTADO["memoria"] and tracemalloc.is_tracing()
+    pilha = getattr(_LOCAL, "pilha", None)
+    if pilha is None:
+        pilha = _LOCAL.pilha = []
+
+    if memoria:
+        atual, pico = tracemalloc.get_traced_memory()
+        if pilha:
+            pilha[-1]["pico"] = max(pilha[-1]["pico"], pico - pilha[-1]["base"])
+        tracemalloc.reset_peak()
+        registro["base"] = atual
+    pilha.append(registro)
+
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        duracao = time.perf_counter() - inicio
+        pilha.pop()
+        if memoria:
+            _, pico = tracemalloc.get_traced_memory()
+            registro["pico"] = max(registro["pico"], pico - registro["base"])
+            if pilha:
+                pilha[-1]["pico"] = max(pilha[-1]["pico"],
+                                        registro["pico"] + registro["base"] - pilha[-1]["base"])
+        _registrar(nome, duracao, registro)
+
+
+def instrumentar(nome):
+    """
+    Decorador que mede cada chamada da função como a etapa `nome`, registrando como
+    entrada e saída o tamanho dos arrays recebidos e retornados.
+
+    Args:
+        nome (str): Nome da etapa no relatório.
+
+    Returns:
+        callable: Decorador.
+    """
+
+    def decorador(funcao):
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            if not _ESTADO["ativo"]:
+                return funcao(*args, **kwargs)
+            with medir_etapa(nome, tamanho_em_bytes(*args, *kwargs.values())) as registro:
+                resultado = funcao(*args, **kwargs)
+                registro["bytes_saida"] = tamanho_em_bytes(
+                    *(resultado if isinstance(resultado, tuple) else (resultado,)))
+            return resultado
+        return envolvida
+    return decorador
+
+
+def _registrar(nome, duracao, registro):
+    with _TRAVA:
+        etapa = _ESTADO["etapas"].setdefault(nome, {
+            "chamadas": 0,
+            "tempo_total_s": 0.0,
+            "tempo_max_s": 0.0,
+            "bytes_entrada": 0,
+            "bytes_saida": 0,
+            "pico_memoria_bytes": 0,
+        })
+        etapa["chamadas"] += 1
+        etapa["tempo_total_s"] += duracao
+        etapa["tempo_max_s"] = max(etapa["tempo_max_s"], duracao)
+        etapa["bytes_entrada"] += registro["bytes_entrada"]
+        etapa["bytes_saida"] += registro["bytes_saida"]
+        etapa["pico_memoria_bytes"] = max(etapa["pico_memoria_bytes"], registro["pico"])
+
+    metricas = _ESTADO["metricas"]
+    if metricas is not None:
+        metricas["tempo"].labels(nome).observe(duracao)
+        metricas["bytes"].labels(nome).inc(registro["bytes_entrada"] + registro["bytes_saida"])
+        if registro["pico"]:
+            metricas["memoria"].labels(nome).set(registro["pico"])
+
+
+def gerar_relatorio():
+    """
+    Monta o relatório das etapas medidas desde o último `reiniciar_instrumentacao`.
+
+    Returns:
+        dict: Para cada etapa, número de chamadas, tempo total, médio e máximo (s), bytes
+        de entrada e saída acumulados e maior pico de memória (MB), além da fração do tempo
+        total instrumentado.
+    """
+
+    with _TRAVA:
+        etapas = {nome: dict(valores) for nome, valores in _ESTADO["etapas"].items()}
+
+    tempo_total = sum(etapa["tempo_total_s"] for etapa in etapas.values()) or 1.0
+    relatorio = {}
+    for nome, etapa in sorted(etapas.items(), key=lambda item: -item[1]["tempo_total_s"]):
+        relatorio[nome] = {
+            "chamadas": etapa["chamadas"],
+            "tempo_total_s": etapa["tempo_total_s"],
+            "tempo_medio_s": etapa["tempo_total_s"] / etapa["chamadas"],
+            "tempo_max_s": etapa["tempo_max_s"],
+            "fracao_do_tempo": etapa["tempo_total_s"] / tempo_total,
+            "bytes_entrada": etapa["bytes_entrada"],
+            "bytes_saida": etapa["bytes_saida"],
+            "pico_memoria_mb": etapa["pico_memoria_bytes"] / 2 ** 20,
+        }
+    return relatorio
+
+
+def salvar_relatorio(caminho):
+    """
+    Salva o relatório das etapas em JSON.
+
+    Como as etapas aninhadas também contam no tempo das externas, a fração do tempo é
+    relativa à soma de todas as etapas, e não ao tempo de parede da execução.
+
+    Args:
+        caminho (str): Caminho do arquivo de saída.
+
+    Returns:
+        dict: O relatório salvo.
+    """
+
+    relatorio = gerar_relatorio()
+    with open(caminho, "w", encoding="utf-8") as arquivo:
+        json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+    return relatorio
+
+
+def exibir_relatorio(relatorio=None):
+    """
+    Imprime o relatório das etapas como uma tabela, da etapa mais lenta para a mais rápida.
+
+    Args:
+        relatorio (dict, opcional): Relatório de `gerar_relatorio`. Se None, é gerado.
+            Padrão é None.
+    """
+
+    relatorio = gerar_relatorio() if relatorio is None else relatorio
+    print(f"{'etapa':<24} {'chamadas':>9} {'total (s)':>10} {'médio (ms)':>11} "
+          f"{'fração':>7} {'pico (MB)':>10}")
+    for nome, etapa in relatorio.items():
+        print(f"{nome:<24} {etapa['chamadas']:>9} {etapa['tempo_total_s']:>10.3f} "
+              f"{1000 * etapa['tempo_medio_s']:>11.3f} {etapa['fracao_do_tempo']:>7.1%} "
+              f"{etapa['pico_memoria_mb']:>10.1f}")
+
+
+def exportar_prometheus(registro=None):
+    """
+    Passa a publicar as etapas medidas como métricas do `prometheus_client`: um histograma
+    de duração, um contador de bytes processados e o último pico de memória, todos com o
+    rótulo "etapa".
+
+    Args:
+        registro (prometheus_client.CollectorRegistry, opcional): Registro onde as métricas
+            são criadas. Se None, usa o registro global. Padrão é None.
+
+    Returns:
+        dict: As métricas criadas.
+    """
+
+    prometheus_client = carregar_prometheus()
+    if prometheus_client is None:
+        raise ImportError("O pacote prometheus_client é necessário para exportar métricas.")
+
+    if _ESTADO["metricas"] is None:
+        registro = registro or prometheus_client.REGISTRY
+        _ESTADO["metricas"] = {
+            "tempo": prometheus_client.Histogram(
+                "autofaces_etapa_segundos", "Duração de cada etapa do pipeline.",
+                ["etapa"], registry=registro),
+            "bytes": prometheus_client.Counter(
+                "autofaces_etapa_bytes", "Bytes de entrada e saída processados por etapa.",
+                ["etapa"], registry=registro),
+            "memoria": prometheus_client.Gauge(
+                "autofaces_etapa_pico_memoria_bytes", "Pico de memória da última chamada.",
+                ["etapa"], registry=registro),
+        }
+    return _ESTADO["metricas"]
+
+
+def gerar_metricas_prometheus():
+    """
+    Serializa as métricas do registro global no formato de texto do Prometheus.
+
+    Returns:
+        tuple: Conteúdo (bytes) e tipo de conteúdo HTTP.
+    """
+
+    prometheus_client = carregar_prometheus()
+    if prometheus_client is None:
+        raise ImportError("O pacote prometheus_client é necessário para exportar métricas.")
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
+
+
+if os.environ.get("AUTOFACES_INSTRUMENTACAO"):
+    ativar_instrumentacao(memoria=os.environ["AUTOFACES_INSTRUMENTACAO"] != "tempo")
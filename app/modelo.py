@@ -0,0 +1,213 @@
+import os
+import json
+import hashlib
+import numpy as np
+from auxiliares import carregar_arquivos, calcular_autofaces
+from incremental import treinar_modelo_incremental
+from projecao import matriz_de_autofaces, projetar_lote
+from armazenamento import salvar_arrays, carregar_arrays
+from empacotamento import carregar_base
+
+EXTENSAO_MODELO = ".modelo"
+
+
+def treinar_modelo(arquivos, rotulos=None, num_autofaces=15, metodo="exato", cinza=False,
+                   resolucao=None, diretorio_pacotes=None, variancia_explicada=None):
+    """
+    Treina um modelo de autofaces a partir de uma lista de arquivos de imagem.
+
+    Args:
+        arquivos (list): Lista de caminhos das imagens da base.
+        rotulos (list, opcional): Rótulos correspondentes a cada arquivo. Padrão é None.
+        num_autofaces (int, opcional): Número de autofaces a serem calculadas. Padrão é 15.
+        metodo (str, opcional): Método de decomposição ("exato", "aleatorio" ou "auto"),
+            repassado a `calcular_autofaces`. Padrão é "exato".
+        cinza (bool, opcional): Se True, treina com as imagens em escala de cinza.
+            Padrão é False.
+        resolucao (tuple, opcional): Resolução (altura, largura) para a qual as imagens são
+            redimensionadas na leitura. Padrão é None.
+        diretorio_pacotes (str, opcional): Se informado, as imagens são lidas do pacote da
+            base nesse diretório (ver `empacotamento`), e não decodificadas. Padrão é None.
+        variancia_explicada (float, opcional): Se informada, o número de autofaces é o menor
+            que explica essa fração da variância total, até o máximo de `num_autofaces`.
+            Padrão é None.
+
+    Returns:
+        dict: Modelo com a face média, as autofaces (uma por linha), os autovalores, a
+        variância total, os vetores de pesos da galeria, os rótulos, os arquivos e o
+        formato das imagens.
+    """
+
+    if diretorio_pacotes is not None:
+        imagens, validos = carregar_base(arquivos, diretorio_pacotes, rotulos, cinza, resolucao)
+    else:
+        imagens, validos = carregar_arquivos(arquivos, cinza=cinza, resolucao=resolucao)
+    if len(imagens) == 0:
+        raise ValueError("Nenhuma imagem válida encontrada para o treinamento.")
+
+    arquivos = [arquivos[i] for i in validos]
+    rotulos = [rotulos[i] for i in validos] if rotulos is not None else [""] * len(arquivos)
+
+    formato = tuple(imagens[0].shape)
+    # As imagens não são centralizadas no lugar (cada bloco é centralizado num buffer, sem
+    # copiar a base): os pesos da galeria saem da mesma projeção usada nas consultas
+    face_media, autofaces, autovalores, variancia_total = calcular_autofaces(
+        imagens, num_autofaces, retornar_autovalores=True, metodo=metodo,
+        variancia_explicada=variancia_explicada, retornar_variancia_total=True)
+
+    matriz_autofaces = matriz_de_autofaces(autofaces)
+
+    vetores_de_pesos = projetar_lote(imagens, face_media, matriz_autofaces)
+
+    return {
+        "face_media": face_media.flatten().astype(np.float32),
+        "autofaces": matriz_autofaces,
+        "autovalores": np.asarray(autovalores, dtype=np.float32),
+        "variancia_total": variancia_total,
+        "vetores_de_pesos": vetores_de_pesos,
+        "rotulos": list(rotulos),
+        "arquivos": list(arquivos),
+        "formato": formato,
+        "parametros": {"num_autofaces": num_autofaces, "metodo": metodo, "cinza": cinza,
+                       "resolucao": list(resolucao) if resolucao is not None else None,
+                       "variancia_explicada": variancia_explicada},
+    }
+
+
+def desempacotar_modelo(modelo):
+    """
+    Converte a face média e as autofaces do modelo para o formato de imagem.
+
+    Args:
+        modelo (dict): Modelo de autofaces.
+
+    Returns:
+        tuple: Face média (numpy.array) no formato das imagens e array com as autofaces,
+        cada uma também no formato das imagens.
+    """
+
+    formato = tuple(modelo["formato"])
+    face_media = modelo["face_media"].reshape(formato)
+    autofaces = modelo["autofaces"].reshape((-1,) + formato)
+    return face_media, autofaces
+
+
+def salvar_modelo(modelo, caminho):
+    """
+    Salva o modelo em um único arquivo binário que pode ser reaberto mapeado em memória.
+
+    Args:
+        modelo (dict): Modelo de autofaces.
+        caminho (str): Caminho do arquivo de saída.
+    """
+
+    salvar_arrays(modelo, caminho)
+
+
+def carregar_modelo(caminho, mmap=True):
+    """
+    Carrega um modelo salvo por `salvar_modelo`.
+
+    Args:
+        caminho (str): Caminho do arquivo do modelo.
+        mmap (bool, opcional): Se True, os arrays são mapeados em memória (somente leitura)
+            em vez de lidos por completo. Padrão é True.
+
+    Returns:
+        dict: Modelo de autofaces.
+    """
+
+    modelo = carregar_arrays(caminho, mmap=mmap)
+    modelo["formato"] = tuple(modelo["formato"])
+    return modelo
+
+
+def calcular_impressao_digital(arquivos, parametros):
+    """
+    Calcula uma impressão digital da base a partir da lista de arquivos, das datas de
+    modificação, dos tamanhos e dos parâmetros de treinamento.
+
+    Args:
+        arquivos (list): Lista de caminhos das imagens da base.
+        parametros (dict): Parâmetros que influenciam o treinamento.
+
+    Returns:
+        str: Hash hexadecimal (SHA-256) que identifica a base e os parâmetros.
+    """
+
+    resumo = hashlib.sha256()
+    resumo.update(json.dumps(parametros, sort_keys=True).encode("utf-8"))
+
+    for arquivo in arquivos:
+        estado = os.stat(arquivo)
+        resumo.update(
+            f"{os.path.abspath(arquivo)}\0{estado.st_mtime_ns}\0{estado.st_size}\n".encode("utf-8"))
+
+    return resumo.hexdigest()
+
+
+def obter_modelo(arquivos, rotulos=None, num_autofaces=15, diretorio_cache=None,
+                 tamanho_lote=None, metodo="exato", cinza=False, resolucao=None,
+                 empacotar=False, variancia_explicada=None):
+    """
+    Obtém o modelo de autofaces da base, reaproveitando o cache em disco quando a base
+    e os parâmetros não mudaram desde o último treinamento.
+
+    Args:
+        arquivos (list): Lista de caminhos das imagens da base.
+        rotulos (list, opcional): Rótulos correspondentes a cada arquivo. Padrão é None.
+        num_autofaces (int, opcional): Número de autofaces a serem calculadas. Padrão é 15.
+        diretorio_cache (str, opcional): Diretório onde os modelos treinados são guardados.
+            Se None, o modelo é sempre treinado e não é salvo. Padrão é None.
+        tamanho_lote (int, opcional): Se informado, treina no modo incremental, lendo a
+            base em lotes desse tamanho para limitar o uso de memória. Padrão é None.
+        metodo (str, opcional): Método de decomposição do treinamento em memória
+            ("exato", "aleatorio" ou "auto"). Padrão é "exato".
+        cinza (bool, opcional): Se True, decodifica as imagens em escala de cinza.
+            Padrão é False.
+        resolucao (tuple, opcional): Resolução (altura, largura) das imagens na leitura.
+            Padrão é None.
+        empacotar (bool, opcional): Se True e houver `diretorio_cache`, as imagens são
+            guardadas decodificadas num pacote uint8 no cache, atualizado a cada execução
+            apenas com os arquivos novos ou modificados. Padrão é False.
+        variancia_explicada (float, opcional): Fração da variância total que as autofaces
+            devem explicar; `num_autofaces` passa a ser o máximo. Padrão é None.
+
+    Returns:
+        dict: Modelo de autofaces. O formato de entrada fica em "formato"; use
+        `auxiliares.opcoes_de_leitura(modelo["formato"])` para ler novas imagens nele.
+    """
+
+    diretorio_pacotes = diretorio_cache if empacotar else None
+
+    def treinar():
+        if tamanho_lote is not None:
+            return treinar_modelo_incremental(arquivos, rotulos, num_autofaces, tamanho_lote,
+                                              cinza, resolucao, diretorio_pacotes,
+                                              variancia_explicada)
+        return treinar_modelo(arquivos, rotulos, num_autofaces, metodo, cinza, resolucao,
+                              diretorio_pacotes, variancia_explicada)
+
+    if diretorio_cache is None:
+        return treinar()
+
+    parametros = {
+        "num_autofaces": num_autofaces,
+        "tamanho_lote": tamanho_lote,
+        "metodo": metodo if tamanho_lote is None else None,
+        "rotulos": list(rotulos) if rotulos is not None else None,
+        "cinza": cinza,
+        "resolucao": list(resolucao) if resolucao is not None else None,
+        "variancia_explicada": variancia_explicada,
+    }
+    impressao_digital = calcular_impressao_digital(arquivos, parametros)
+    caminho = os.path.join(diretorio_cache, impressao_digital + EXTENSAO_MODELO)
+
+    if os.path.exists(caminho):
+        return carregar_modelo(caminho)
+
+    modelo = treinar()
+    modelo["impressao_digital"] = impressao_digital
+    salvar_modelo(modelo, caminho)
+
+    return carregar_modelo(caminho)
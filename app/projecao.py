@@ -0,0 +1,128 @@
+import numpy as np
+from instrumentacao import instrumentar
+
+TAMANHO_BLOCO_PADRAO = 4096
+
+
+def matriz_de_autofaces(autofaces, dtype=np.float32):
+    """
+    Organiza as autofaces como uma matriz contígua K×D, uma autoface por linha.
+
+    Se as autofaces já estiverem em um array contíguo do tipo pedido (como as do modelo),
+    a matriz é apenas uma visão, sem cópia.
+
+    Args:
+        autofaces (list): Lista ou array de autofaces.
+        dtype (numpy.dtype, opcional): Tipo dos elementos. Padrão é float32.
+
+    Returns:
+        numpy.array: Matriz K×D de autofaces.
+    """
+
+    matriz = np.asarray(autofaces, dtype=dtype)
+    return np.ascontiguousarray(matriz.reshape(len(matriz), -1))
+
+
+@instrumentar("projecao")
+def projetar_lote(imagens, face_media, autofaces, tamanho_bloco=TAMANHO_BLOCO_PADRAO,
+                  dtype=np.float32, retornar_residuos=False):
+    """
+    Projeta um conjunto de imagens no espaço das autofaces em blocos.
+
+    Cada bloco de imagens é centralizado em um buffer reutilizado e projetado com um único
+    produto de matrizes, então o uso de memória extra fica limitado a `tamanho_bloco` × D,
+    qualquer que seja o número de imagens.
+
+    Com `retornar_residuos`, calcula também a distância de cada imagem ao espaço das faces,
+    isto é, o erro da sua reconstrução. Como as autofaces são ortonormais, o quadrado desse
+    erro é ||x - m||² - ||w||², e a norma do bloco centralizado já está no buffer: o custo
+    extra é uma passada sobre o bloco, sem reconstruir as imagens.
+
+    Args:
+        imagens (list): Lista de imagens ou array (N, ...) com uma imagem por linha.
+        face_media (numpy.array): Face média da base.
+        autofaces (list): Lista ou matriz de autofaces.
+        tamanho_bloco (int, opcional): Número de imagens projetadas por vez. Padrão é 4096.
+        dtype (numpy.dtype, opcional): Tipo usado nos cálculos e no resultado. Padrão é float32.
+        retornar_residuos (bool, opcional): Se True, retorna também a distância de cada
+            imagem ao espaço das faces. Padrão é False.
+
+    Returns:
+        numpy.array: Matriz N×K de pesos, uma linha por imagem, e, com `retornar_residuos`,
+        o vetor com as N distâncias ao espaço das faces.
+    """
+
+    matriz = matriz_de_autofaces(autofaces, dtype=dtype)
+    media = np.asarray(face_media, dtype=dtype).reshape(-1)
+
+    num_imagens = len(imagens)
+    pesos = np.empty((num_imagens, len(matriz)), dtype=dtype)
+    buffer = np.empty((min(tamanho_bloco, num_imagens), matriz.shape[1]), dtype=dtype)
+    em_array = isinstance(imagens, np.ndarray)
+    if retornar_residuos:
+        residuos = np.empty(num_imagens, dtype=dtype)
+
+    for inicio in range(0, num_imagens, tamanho_bloco):
+        fim = min(inicio + tamanho_bloco, num_imagens)
+        bloco = buffer[:fim - inicio]
+
+        if em_array:
+            np.subtract(imagens[inicio:fim].reshape(fim - inicio, -1), media, out=bloco)
+        else:
+            for linha, imagem in zip(bloco, imagens[inicio:fim]):
+                np.subtract(np.reshape(imagem, -1), media, out=linha)
+
+        np.dot(bloco, matriz.T, out=pesos[inicio:fim])
+        if retornar_residuos:
+            np.einsum("ij,ij->i", bloco, bloco, out=residuos[inicio:fim])
+            residuos[inicio:fim] -= np.einsum("ij,ij->i", pesos[inicio:fim], pesos[inicio:fim])
+
+    if retornar_residuos:
+        return pesos, np.sqrt(np.maximum(residuos, 0.0))
+    return pesos
+
+
+def estimar_limite_residuo(imagens, face_media, autofaces, percentil=99.0):
+    """
+    Estima um limite de distância ao espaço das faces a partir de imagens de faces:
+    imagens de consulta com distância acima do limite podem ser rejeitadas como não-faces
+    antes da busca na galeria. As imagens da própria base são reconstruídas melhor que
+    faces novas, então, com elas, convém usar um percentil alto ou uma margem.
+
+    Args:
+        imagens (list): Lista de imagens ou array (N, ...) de faces.
+        face_media (numpy.array): Face média da base.
+        autofaces (list): Lista ou matriz de autofaces.
+        percentil (float, opcional): Percentil das distâncias usado como limite.
+            Padrão é 99.0.
+
+    Returns:
+        float: Limite de distância ao espaço das faces.
+    """
+
+    _, residuos = projetar_lote(imagens, face_media, autofaces, retornar_residuos=True)
+    return float(np.percentile(residuos, percentil))
+
+
+@instrumentar("reconstrucao")
+def reconstruir_lote(pesos, face_media, autofaces, dtype=np.float32):
+    """
+    Reconstrói imagens a partir dos seus pesos no espaço das autofaces.
+
+    Args:
+        pesos (numpy.array): Matriz N×K de pesos (ou um único vetor de K pesos).
+        face_media (numpy.array): Face média da base.
+        autofaces (list): Lista ou matriz de autofaces.
+        dtype (numpy.dtype, opcional): Tipo usado nos cálculos. Padrão é float32.
+
+    Returns:
+        numpy.array: Imagens reconstruídas, no formato da face média.
+    """
+
+    matriz = matriz_de_autofaces(autofaces, dtype=dtype)
+    pesos = np.asarray(pesos, dtype=dtype)
+
+    reconstrucoes = np.dot(pesos, matriz)
+    reconstrucoes += np.asarray(face_media, dtype=dtype).reshape(-1)
+
+    return reconstrucoes.reshape(pesos.shape[:-1] + np.shape(face_media))
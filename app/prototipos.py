@@ -0,0 +1,139 @@
+import numpy as np
+from indice import treinar_kmeans, atribuir_centroides
+from distancias import buscar_k_vizinhos
+
+TIPOS_PROTOTIPO = ("centroide", "medoide")
+
+
+def construir_prototipos(vetores, rotulos, num_prototipos=1, tipo="centroide", iteracoes_kmeans=10,
+                         semente=0):
+    """
+    Constrói uma galeria compacta com poucos protótipos por pessoa sobre os vetores de
+    pesos da galeria completa.
+
+    As imagens de cada rótulo são agrupadas por k-means em até `num_prototipos` grupos
+    (com um só, o protótipo é a média da pessoa). O protótipo de cada grupo é o centróide
+    ou, com o tipo "medoide", a imagem do grupo mais próxima dele. Cada protótipo guarda
+    as imagens do seu grupo, contíguas como as listas do índice IVF, e o raio do grupo (a
+    maior distância de uma imagem ao protótipo), usado na busca para descartar grupos que
+    não podem conter o vizinho mais próximo.
+
+    Args:
+        vetores (numpy.array): Matriz N×K de vetores de pesos.
+        rotulos (list): Rótulo de cada vetor.
+        num_prototipos (int, opcional): Número máximo de protótipos por rótulo. Padrão é 1.
+        tipo (str, opcional): "centroide" ou "medoide". Padrão é "centroide".
+        iteracoes_kmeans (int, opcional): Iterações do k-means. Padrão é 10.
+        semente (int, opcional): Semente do gerador aleatório. Padrão é 0.
+
+    Returns:
+        dict: Galeria de protótipos, com os protótipos, seus raios e as imagens de cada um.
+    """
+
+    if tipo not in TIPOS_PROTOTIPO:
+        raise ValueError(f"Tipo de protótipo desconhecido: {tipo}. Use um de {TIPOS_PROTOTIPO}.")
+
+    vetores = np.ascontiguousarray(vetores, dtype=np.float32)
+    _, codigos = np.unique(np.asarray(rotulos), return_inverse=True)
+
+    prototipos = []
+    atribuicoes = np.empty(len(vetores), dtype=np.int64)
+    for codigo in range(codigos.max() + 1):
+        membros = np.flatnonzero(codigos == codigo)
+        grupo = vetores[membros]
+
+        num_grupos = min(num_prototipos, len(membros))
+        if num_grupos == 1:
+            centroides = grupo.mean(axis=0, keepdims=True)
+        else:
+            centroides = treinar_kmeans(grupo, num_grupos, iteracoes_kmeans, semente + codigo)
+            # Grupos que ficaram vazios não têm raio e são descartados
+            centroides = centroides[np.bincount(
+                atribuir_centroides(grupo, centroides), minlength=num_grupos) > 0]
+        atribuicao = atribuir_centroides(grupo, centroides)
+
+        if tipo == "medoide":
+            for posicao in range(len(centroides)):
+                candidatos = grupo[atribuicao == posicao]
+                diferencas = candidatos - centroides[posicao]
+                centroides[posicao] = candidatos[np.argmin(
+                    np.einsum("ij,ij->i", diferencas, diferencas))]
+
+        atribuicoes[membros] = atribuicao + len(prototipos)
+        prototipos.extend(centroides)
+
+    prototipos = np.array(prototipos, dtype=np.float32)
+    ordem = np.argsort(atribuicoes, kind="stable").astype(np.int64)
+    inicios = np.zeros(len(prototipos) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(atribuicoes, minlength=len(prototipos)), out=inicios[1:])
+
+    pontos = np.ascontiguousarray(vetores[ordem])
+    diferencas = pontos - prototipos[atribuicoes[ordem]]
+    raios = np.zeros(len(prototipos), dtype=np.float32)
+    np.maximum.at(raios, atribuicoes[ordem], np.sqrt(np.einsum("ij,ij->i", diferencas, diferencas)))
+
+    return {
+        "prototipos": prototipos,
+        "raios": raios,
+        "pontos": pontos,
+        "ordem": ordem,
+        "inicios": inicios,
+    }
+
+
+def buscar_prototipos(galeria, consultas, num_candidatos=3, retornar_comparacoes=False):
+    """
+    Busca o vizinho mais próximo de cada consulta comparando-a primeiro só com os
+    protótipos e depois com as imagens dos protótipos mais próximos.
+
+    Os `num_candidatos` protótipos mais próximos são encontrados pela busca exata de
+    `distancias.buscar_k_vizinhos`. Pela desigualdade triangular, toda imagem de um
+    protótipo p está a uma distância entre d(q, p) - raio(p) e d(q, p) + raio(p) da
+    consulta; os candidatos cuja distância mínima passa da menor distância máxima entre
+    eles são descartados sem comparar suas imagens. O custo por consulta deixa de ser
+    proporcional ao tamanho da galeria e passa a ser o número de protótipos mais as imagens
+    de poucos deles. O resultado é aproximado: o vizinho verdadeiro pode estar num protótipo
+    fora dos candidatos.
+
+    Args:
+        galeria (dict): Galeria criada por `construir_prototipos`.
+        consultas (numpy.array): Matriz Q×K de vetores de consulta (ou um único vetor).
+        num_candidatos (int, opcional): Protótipos cujas imagens podem ser comparadas.
+            Padrão é 3.
+        retornar_comparacoes (bool, opcional): Se True, retorna também o número total de
+            imagens comparadas. Padrão é False.
+
+    Returns:
+        tuple: Vetor com o índice do vizinho mais próximo de cada consulta na galeria
+        original e vetor com as distâncias (e, com `retornar_comparacoes`, o número de
+        imagens comparadas).
+    """
+
+    prototipos, raios = galeria["prototipos"], galeria["raios"]
+    pontos, ordem, inicios = galeria["pontos"], galeria["ordem"], galeria["inicios"]
+    consultas = np.asarray(consultas, dtype=np.float32).reshape(-1, prototipos.shape[1])
+
+    candidatos, distancias_candidatos = buscar_k_vizinhos(
+        consultas, prototipos, k=min(num_candidatos, len(prototipos)))
+    minimas = distancias_candidatos - raios[candidatos]
+    maximas = (distancias_candidatos + raios[candidatos]).min(axis=1)
+
+    indices = np.empty(len(consultas), dtype=np.int64)
+    distancias = np.empty(len(consultas), dtype=np.float32)
+    comparacoes = 0
+    for linha, consulta in enumerate(consultas):
+        # Folga relativa para os arredondamentos em float32
+        escolhidos = candidatos[linha][minimas[linha] <= maximas[linha] * (1 + 1e-5)]
+        posicoes = np.concatenate(
+            [np.arange(inicios[prototipo], inicios[prototipo + 1]) for prototipo in escolhidos])
+        diferencas = pontos[posicoes] - consulta
+        quadrados = np.einsum("ij,ij->i", diferencas, diferencas)
+
+        melhor = np.argmin(quadrados)
+        indices[linha] = ordem[posicoes[melhor]]
+        distancias[linha] = np.sqrt(quadrados[melhor])
+        comparacoes += len(posicoes)
+
+    if retornar_comparacoes:
+        return indices, distancias, comparacoes
+    return indices, distancias
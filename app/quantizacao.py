@@ -0,0 +1,249 @@
+import time
+import numpy as np
+from indice import treinar_kmeans, atribuir_centroides
+from distancias import (buscar_k_vizinhos, calcular_normas, combinar_k_melhores,
+                        selecionar_k_menores)
+
+CODIFICACOES_GALERIA = ("float32", "float16", "int8", "pq")
+TAMANHO_BLOCO_DECODIFICACAO = 65536
+TAMANHO_BLOCO_ADC = 16384
+CENTROIDES_PQ = 256
+
+
+def quantizar_galeria(vetores, codificacao="float16", num_subespacos=None, iteracoes_kmeans=10,
+                      semente=0):
+    """
+    Codifica os vetores de pesos da galeria numa representação compacta.
+
+    Codificações disponíveis:
+        - "float32": sem compressão (4 bytes por dimensão).
+        - "float16": meia precisão (2 bytes por dimensão).
+        - "int8": cada dimensão é escalada pelo seu próprio intervalo e arredondada para
+          int8 (1 byte por dimensão, mais a escala e o centro de cada dimensão).
+        - "pq": quantização por produto. O vetor é dividido em `num_subespacos` partes e
+          cada parte é substituída pelo índice (1 byte) do mais próximo de 256 centróides
+          treinados por k-means naquele subespaço. A busca usa distância assimétrica: a
+          consulta não é quantizada.
+
+    Args:
+        vetores (numpy.array): Matriz N×K de vetores de pesos.
+        codificacao (str, opcional): Codificação. Padrão é "float16".
+        num_subespacos (int, opcional): Número de subespaços da quantização por produto.
+            Se None, usa um subespaço para cada 4 dimensões. Padrão é None.
+        iteracoes_kmeans (int, opcional): Iterações do k-means da quantização por produto.
+            Padrão é 10.
+        semente (int, opcional): Semente do gerador aleatório. Padrão é 0.
+
+    Returns:
+        dict: Galeria quantizada, com a codificação, a dimensão e os códigos.
+    """
+
+    if codificacao not in CODIFICACOES_GALERIA:
+        raise ValueError(
+            f"Codificação desconhecida: {codificacao}. Use uma de {CODIFICACOES_GALERIA}.")
+
+    vetores = np.ascontiguousarray(vetores, dtype=np.float32)
+    galeria = {"codificacao": codificacao, "dimensao": int(vetores.shape[1])}
+
+    if codificacao in ("float32", "float16"):
+        galeria["codigos"] = vetores.astype(codificacao)
+    elif codificacao == "int8":
+        minimos, maximos = vetores.min(axis=0), vetores.max(axis=0)
+        centro = (maximos + minimos) / 2
+        escala = np.maximum((maximos - minimos) / 254, np.finfo(np.float32).tiny)
+        galeria["codigos"] = np.clip(np.rint((vetores - centro) / escala), -127, 127).astype(np.int8)
+        galeria["escala"] = escala.astype(np.float32)
+        galeria["centro"] = centro.astype(np.float32)
+    else:
+        galeria.update(_treinar_pq(vetores, num_subespacos, iteracoes_kmeans, semente))
+
+    return galeria
+
+
+def decodificar_galeria(galeria, inicio=0, fim=None):
+    """
+    Reconstrói, em float32, uma faixa de vetores de uma galeria quantizada.
+
+    Args:
+        galeria (dict): Galeria criada por `quantizar_galeria`.
+        inicio (int, opcional): Primeira linha. Padrão é 0.
+        fim (int, opcional): Linha final (exclusiva). Se None, vai até o fim. Padrão é None.
+
+    Returns:
+        numpy.array: Matriz de vetores aproximados.
+    """
+
+    codigos = galeria["codigos"][inicio:fim]
+    codificacao = galeria["codificacao"]
+
+    if codificacao in ("float32", "float16"):
+        return codigos.astype(np.float32)
+    if codificacao == "int8":
+        vetores = codigos.astype(np.float32)
+        vetores *= galeria["escala"]
+        vetores += galeria["centro"]
+        return vetores
+
+    centroides = galeria["centroides"]
+    vetores = np.concatenate(
+        [centroides[m][codigos[:, m]] for m in range(len(centroides))], axis=1)
+    return vetores[:, :galeria["dimensao"]]
+
+
+def buscar_galeria_quantizada(galeria, consultas, k=1, bloco_galeria=None):
+    """
+    Busca os k vizinhos mais próximos de muitas consultas numa galeria quantizada.
+
+    Nas codificações escalares, cada bloco da galeria é decodificado para float32 e
+    comparado por `distancias.buscar_k_vizinhos`, de modo que só um bloco fica em float32
+    na memória. Na quantização por produto, cada consulta gera uma tabela com a distância
+    de cada um dos seus subvetores a cada centróide, e a distância a um vetor da galeria é
+    a soma de uma entrada da tabela por subespaço (distância assimétrica).
+
+    Args:
+        galeria (dict): Galeria criada por `quantizar_galeria`.
+        consultas (numpy.array): Matriz Q×K de vetores de consulta (ou um único vetor).
+        k (int, opcional): Número de vizinhos por consulta. Padrão é 1.
+        bloco_galeria (int, opcional): Vetores da galeria processados por vez. Padrão é None.
+
+    Returns:
+        tuple: Matriz Q×k de índices na galeria e matriz Q×k de distâncias (aproximadas),
+        em ordem crescente de distância por linha.
+    """
+
+    consultas = np.asarray(consultas, dtype=np.float32).reshape(-1, galeria["dimensao"])
+    num_vetores = len(galeria["codigos"])
+    k = min(k, num_vetores)
+
+    if galeria["codificacao"] == "pq":
+        return _buscar_pq(galeria, consultas, k, bloco_galeria or TAMANHO_BLOCO_ADC)
+
+    bloco_galeria = bloco_galeria or TAMANHO_BLOCO_DECODIFICACAO
+    indices = np.empty((len(consultas), 0), dtype=np.int64)
+    distancias = np.empty((len(consultas), 0), dtype=np.float32)
+
+    for inicio in range(0, num_vetores, bloco_galeria):
+        vetores = decodificar_galeria(galeria, inicio, inicio + bloco_galeria)
+        indices_bloco, distancias_bloco = buscar_k_vizinhos(consultas, vetores, k=k)
+        indices, distancias = combinar_k_melhores(
+            np.hstack((indices, indices_bloco + inicio)),
+            np.hstack((distancias, distancias_bloco)), k)
+
+    return indices, distancias
+
+
+def memoria_galeria(galeria):
+    """
+    Calcula a memória ocupada pelos arrays de uma galeria quantizada.
+
+    Args:
+        galeria (dict): Galeria criada por `quantizar_galeria`.
+
+    Returns:
+        int: Tamanho total em bytes (códigos e tabelas auxiliares).
+    """
+
+    return sum(valor.nbytes for valor in galeria.values() if isinstance(valor, np.ndarray))
+
+
+def medir_revocacao(vetores, consultas, k=10, codificacoes=CODIFICACOES_GALERIA, **parametros):
+    """
+    Mede a revocação e a memória de cada codificação da galeria em relação à busca exata
+    em float32.
+
+    A revocação@k é a fração dos k vizinhos verdadeiros de cada consulta que aparecem
+    entre os k vizinhos retornados pela galeria quantizada.
+
+    Args:
+        vetores (numpy.array): Matriz N×K de vetores de pesos da galeria.
+        consultas (numpy.array): Matriz Q×K de vetores de consulta.
+        k (int, opcional): Número de vizinhos comparados. Padrão é 10.
+        codificacoes (tuple, opcional): Codificações avaliadas. Padrão é todas.
+        **parametros: Parâmetros adicionais de `quantizar_galeria`.
+
+    Returns:
+        list: Um dicionário por codificação, com bytes por vetor, memória total (MB),
+        revocação@k, revocação@1 e tempos de codificação e de busca.
+    """
+
+    verdadeiros, _ = buscar_k_vizinhos(consultas, vetores, k=k)
+
+    resultados = []
+    for codificacao in codificacoes:
+        inicio = time.perf_counter()
+        galeria = quantizar_galeria(vetores, codificacao, **parametros)
+        tempo_codificacao = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        encontrados, _ = buscar_galeria_quantizada(galeria, consultas, k=k)
+        tempo_busca = time.perf_counter() - inicio
+
+        acertos = [len(np.intersect1d(a, b)) for a, b in zip(verdadeiros, encontrados)]
+        memoria = memoria_galeria(galeria)
+        resultados.append({
+            "codificacao": codificacao,
+            "bytes_por_vetor": memoria / len(vetores),
+            "memoria_mb": memoria / 2 ** 20,
+            f"revocacao@{k}": float(np.mean(acertos)) / k,
+            "revocacao@1": float(np.mean(verdadeiros[:, 0] == encontrados[:, 0])),
+            "tempo_codificacao_s": tempo_codificacao,
+            "tempo_busca_s": tempo_busca,
+        })
+
+    return resultados
+
+
+def _treinar_pq(vetores, num_subespacos, iteracoes_kmeans, semente):
+    dimensao = vetores.shape[1]
+    num_subespacos = num_subespacos or max(1, dimensao // 4)
+    num_subespacos = min(num_subespacos, dimensao)
+
+    # Dimensões completadas com zeros para que todos os subespaços tenham o mesmo tamanho
+    tamanho_subespaco = -(-dimensao // num_subespacos)
+    completos = np.zeros((len(vetores), tamanho_subespaco * num_subespacos), dtype=np.float32)
+    completos[:, :dimensao] = vetores
+    num_centroides = min(CENTROIDES_PQ, len(vetores))
+
+    centroides = np.empty((num_subespacos, num_centroides, tamanho_subespaco), dtype=np.float32)
+    codigos = np.empty((len(vetores), num_subespacos), dtype=np.uint8)
+    for m in range(num_subespacos):
+        subvetores = np.ascontiguousarray(
+            completos[:, m * tamanho_subespaco:(m + 1) * tamanho_subespaco])
+        centroides[m] = treinar_kmeans(subvetores, num_centroides, iteracoes_kmeans, semente + m)
+        codigos[:, m] = atribuir_centroides(subvetores, centroides[m])
+
+    return {"codigos": codigos, "centroides": centroides}
+
+
+def _buscar_pq(galeria, consultas, k, bloco_galeria):
+    codigos, centroides = galeria["codigos"], galeria["centroides"]
+    num_subespacos, num_centroides, tamanho_subespaco = centroides.shape
+
+    completas = np.zeros((len(consultas), num_subespacos * tamanho_subespaco), dtype=np.float32)
+    completas[:, :galeria["dimensao"]] = consultas
+    subconsultas = completas.reshape(len(consultas), num_subespacos, tamanho_subespaco)
+
+    # Tabelas de distâncias: uma linha por centróide e uma coluna por consulta em cada
+    # subespaço, para que a soma por vetor da galeria seja uma seleção de linhas
+    tabelas = np.empty((num_subespacos, num_centroides, len(consultas)), dtype=np.float32)
+    for m in range(num_subespacos):
+        tabelas[m] = calcular_normas(centroides[m])[:, None] - 2 * np.dot(
+            centroides[m], subconsultas[:, m].T)
+    normas_consultas = calcular_normas(completas)
+
+    indices = np.empty((len(consultas), 0), dtype=np.int64)
+    valores = np.empty((len(consultas), 0), dtype=np.float32)
+    colunas = np.arange(len(consultas))[:, None]
+
+    for inicio in range(0, len(codigos), bloco_galeria):
+        bloco = np.asarray(codigos[inicio:inicio + bloco_galeria])
+        distancias = tabelas[0][bloco[:, 0]]
+        for m in range(1, num_subespacos):
+            distancias += tabelas[m][bloco[:, m]]
+
+        candidatos = selecionar_k_menores(distancias, k)
+        indices, valores = combinar_k_melhores(
+            np.hstack((indices, candidatos + inicio)),
+            np.hstack((valores, distancias[candidatos, colunas])), k)
+
+    return indices, np.sqrt(np.maximum(valores + normas_consultas[:, None], 0.0))
@@ -1,34 +1,66 @@
 import os
+import json
+import time
 import numpy as np
-import cv2
-from auxiliares import ler_imagens, centralizar_imagem, calcular_autofaces, exibir_imagens
-
-
-def carregar_bases_de_dados(diretorios):
+from auxiliares import ler_imagens, carregar_arquivos, exibir_imagens, opcoes_de_leitura
+from modelo import obter_modelo, desempacotar_modelo
+from projecao import projetar_lote
+from indice import obter_indice, buscar_indice
+from distancias import buscar_k_vizinhos
+from quantizacao import quantizar_galeria, buscar_galeria_quantizada
+from prototipos import construir_prototipos, buscar_prototipos
+from fragmentos import GaleriaFragmentada
+from instrumentacao import instrumentar, instrumentacao_ativa, gerar_relatorio
+
+
+def listar_bases_de_dados(diretorios, rotulo_por_pasta=False):
     """
-    Carrega todas as imagens em múltiplos diretórios, incluindo subpastas.
+    Lista os caminhos de todas as imagens em múltiplos diretórios, incluindo subpastas.
 
     Args:
         diretorios (list): Lista de caminhos para os diretórios contendo as imagens.
+        rotulo_por_pasta (bool, opcional): Se True, o rótulo de cada imagem é o nome da pasta
+            que a contém (uma pasta por pessoa), em vez do índice do diretório. Padrão é False.
 
     Returns:
-        tuple: Uma lista de imagens normalizadas (float32 entre 0 e 1) e uma lista de rótulos.
+        tuple: Uma lista de caminhos de imagens e uma lista de rótulos.
     """
 
-    imagens = []
+    arquivos = []
     rotulos = []
 
     for idx, diretorio in enumerate(diretorios):
         for root, _, files in os.walk(diretorio):
             for file in files:
                 if file.endswith((".jpg", ".png")):  # Extensões suportadas
-                    caminho_imagem = os.path.join(root, file)
-                    imagem = cv2.imread(caminho_imagem)
-                    if imagem is not None:
-                        imagens.append(np.float32(imagem) / 255.0)
+                    arquivos.append(os.path.join(root, file))
+                    if rotulo_por_pasta:
+                        rotulos.append(os.path.basename(os.path.normpath(root)))
+                    else:
                         rotulos.append(f"Imagem {idx + 1}")
 
-    if not imagens:
+    return arquivos, rotulos
+
+
+def carregar_bases_de_dados(diretorios, cinza=False, resolucao=None):
+    """
+    Carrega todas as imagens em múltiplos diretórios, incluindo subpastas.
+
+    Args:
+        diretorios (list): Lista de caminhos para os diretórios contendo as imagens.
+        cinza (bool, opcional): Se True, decodifica em escala de cinza. Padrão é False.
+        resolucao (tuple, opcional): Resolução alvo (altura, largura). Padrão é None.
+
+    Returns:
+        tuple: Um array (N, altura, largura, canais), ou (N, altura, largura) em escala de
+        cinza, de imagens normalizadas (float32 entre 0 e 1) e uma lista de rótulos.
+    """
+
+    arquivos, rotulos = listar_bases_de_dados(diretorios)
+    imagens, validos = carregar_arquivos(arquivos, cinza=cinza, resolucao=resolucao)
+    rotulos = [rotulos[i] for i in validos]
+
+    if len(imagens) == 0:
         raise ValueError(
             f"Nenhuma imagem válida encontrada nos diretórios: {diretorios}"
         )
@@ -49,36 +81,57 @@ def calcular_vetores_de_pesos(imagens, face_media, autofaces):
         numpy.array: Matriz de vetores de pesos, onde cada linha é o vetor de pesos de uma imagem.
     """
 
-    matriz_autofaces = np.array([af.flatten()
-                                for af in autofaces])  # Matriz das autofaces
-    vetores_de_pesos = []
-
-    for imagem in imagens:
-        imagem_centralizada = centralizar_imagem(imagem, face_media)
-        pesos = np.dot(matriz_autofaces, imagem_centralizada)
-        vetores_de_pesos.append(pesos)
+    return projetar_lote(imagens, face_media, autofaces)
 
-    return np.array(vetores_de_pesos)
 
-
-def reconhecer_pessoa(imagem_teste, face_media, autofaces, vetores_de_pesos_base, rotulos_base):
+@instrumentar("reconhecimento")
+def reconhecer_pessoa(imagem_teste, face_media, autofaces, vetores_de_pesos_base, rotulos_base,
+                      indice=None, num_sondas=8, prototipos=None, num_candidatos=3,
+                      limite_residuo=None):
     """
     Reconhece a pessoa na imagem de teste, comparando o vetor de pesos com a base.
 
+    Com `limite_residuo`, a distância da imagem ao espaço das faces é calculada junto com a
+    projeção, e imagens mais distantes que o limite são rejeitadas antes de qualquer busca.
+
     Args:
         imagem_teste (numpy.array): Imagem a ser reconhecida.
         face_media (numpy.array): Face média da base.
         autofaces (list): Lista de autofaces (autovetores).
         vetores_de_pesos_base (numpy.array): Matriz de vetores de pesos da base.
         rotulos_base (list): Lista de rótulos correspondentes às imagens da base.
+        indice (dict, opcional): Índice de busca sobre `vetores_de_pesos_base`, criado por
+            `indice.construir_indice`. Se None, compara com toda a base. Padrão é None.
+        num_sondas (int, opcional): Listas sondadas quando o índice é do tipo IVF. Padrão é 8.
+        prototipos (dict, opcional): Galeria de protótipos criada por
+            `prototipos.construir_prototipos`, buscada no lugar da base. Padrão é None.
+        num_candidatos (int, opcional): Protótipos candidatos refinados na base quando
+            `prototipos` é informado. Padrão é 3.
+        limite_residuo (float, opcional): Distância máxima ao espaço das faces (ver
+            `projecao.estimar_limite_residuo`). Se None, nenhuma imagem é rejeitada.
+            Padrão é None.
 
     Returns:
-        tuple: Índice do vetor reconhecido, rótulo correspondente e a menor distância.
+        tuple: Índice do vetor reconhecido, rótulo correspondente e a menor distância, ou
+        (None, None, inf) se a imagem for rejeitada.
     """
 
-    imagem_teste_centralizada = centralizar_imagem(imagem_teste, face_media)
-    vetor_pesos_teste = np.dot([af.flatten()
-                               for af in autofaces], imagem_teste_centralizada)
+    if limite_residuo is not None:
+        pesos, residuos = projetar_lote([imagem_teste], face_media, autofaces,
+                                        retornar_residuos=True)
+        if residuos[0] > limite_residuo:
+            return None, None, np.inf
+        vetor_pesos_teste = pesos[0]
+    else:
+        vetor_pesos_teste = projetar_lote([imagem_teste], face_media, autofaces)[0]
+
+    if prototipos is not None:
+        indices, distancias = buscar_prototipos(prototipos, vetor_pesos_teste, num_candidatos)
+        return indices[0], rotulos_base[indices[0]], distancias[0]
+
+    if indice is not None:
+        indices, distancias = buscar_indice(indice, vetor_pesos_teste, 1, num_sondas)
+        return indices[0], rotulos_base[indices[0]], distancias[0]
 
     distancias = np.linalg.norm(
         vetores_de_pesos_base - vetor_pesos_teste, axis=1)
@@ -87,44 +140,184 @@ def reconhecer_pessoa(imagem_teste, face_media, autofaces, vetores_de_pesos_base
     return indice_reconhecido, rotulos_base[indice_reconhecido], distancias[indice_reconhecido]
 
 
-def executar_reconhecimento(diretorio_base, diretorio_teste, num_autofaces=50, limite_base=10000):
+@instrumentar("reconhecimento_lote")
+def reconhecer_lote(imagens_teste, face_media, autofaces, vetores_de_pesos_base, rotulos_base,
+                    tamanho_bloco=1024, prototipos=None, num_candidatos=3, limite_residuo=None):
+    """
+    Reconhece várias imagens de uma vez, projetando todas e comparando-as com a base
+    pelo mecanismo de busca em blocos de `distancias.buscar_k_vizinhos`.
+
+    Com `limite_residuo`, as imagens distantes do espaço das faces são rejeitadas e só as
+    demais seguem para a busca; com `prototipos`, a busca é feita na galeria de protótipos.
+
+    Args:
+        imagens_teste (list): Lista ou array de imagens a serem reconhecidas.
+        face_media (numpy.array): Face média da base.
+        autofaces (list): Lista de autofaces (autovetores).
+        vetores_de_pesos_base (numpy.array): Matriz de vetores de pesos da base, galeria
+            compacta criada por `quantizacao.quantizar_galeria` ou galeria dividida entre
+            processos (`fragmentos.GaleriaFragmentada`).
+        rotulos_base (list): Lista de rótulos correspondentes às imagens da base.
+        tamanho_bloco (int, opcional): Número de consultas comparadas por vez. Padrão é 1024.
+        prototipos (dict, opcional): Galeria de protótipos criada por
+            `prototipos.construir_prototipos`, buscada no lugar da base. Padrão é None.
+        num_candidatos (int, opcional): Protótipos candidatos refinados na base quando
+            `prototipos` é informado. Padrão é 3.
+        limite_residuo (float, opcional): Distância máxima ao espaço das faces. Se None,
+            nenhuma imagem é rejeitada. Padrão é None.
+
+    Returns:
+        tuple: Array com os índices reconhecidos, lista com os rótulos correspondentes e
+        array com as menores distâncias. Imagens rejeitadas têm índice -1, rótulo None e
+        distância infinita.
+    """
+
+    aceitas = slice(None)
+    if limite_residuo is not None:
+        pesos_teste, residuos = projetar_lote(imagens_teste, face_media, autofaces,
+                                              retornar_residuos=True)
+        aceitas = residuos <= limite_residuo
+        pesos_teste = pesos_teste[aceitas]
+    else:
+        pesos_teste = projetar_lote(imagens_teste, face_media, autofaces)
+
+    indices = np.full(len(imagens_teste), -1, dtype=np.int64)
+    distancias = np.full(len(imagens_teste), np.inf, dtype=np.float32)
+    if len(pesos_teste) > 0:
+        if prototipos is not None:
+            indices[aceitas], distancias[aceitas] = buscar_prototipos(
+                prototipos, pesos_teste, num_candidatos)
+        elif isinstance(vetores_de_pesos_base, dict):
+            encontrados, menores = buscar_galeria_quantizada(
+                vetores_de_pesos_base, pesos_teste, k=1)
+            indices[aceitas], distancias[aceitas] = encontrados[:, 0], menores[:, 0]
+        elif isinstance(vetores_de_pesos_base, GaleriaFragmentada):
+            encontrados, menores = vetores_de_pesos_base.buscar(pesos_teste, k=1)
+            indices[aceitas], distancias[aceitas] = encontrados[:, 0], menores[:, 0]
+        else:
+            encontrados, menores = buscar_k_vizinhos(
+                pesos_teste, vetores_de_pesos_base, k=1, bloco_consultas=tamanho_bloco)
+            indices[aceitas], distancias[aceitas] = encontrados[:, 0], menores[:, 0]
+
+    return indices, [rotulos_base[i] if i >= 0 else None for i in indices], distancias
+
+
+def buscar_pessoas(imagem_teste, face_media, autofaces, indice, rotulos_base, k=5, num_sondas=8):
     """
-    Realiza reconhecimento facial comparando a imagem de teste com uma base de até 10.000 imagens.
+    Busca as k imagens da base mais próximas da imagem de teste usando um índice.
+
+    Args:
+        imagem_teste (numpy.array): Imagem a ser reconhecida.
+        face_media (numpy.array): Face média da base.
+        autofaces (list): Lista de autofaces (autovetores).
+        indice (dict): Índice de busca sobre os vetores de pesos da base.
+        rotulos_base (list): Lista de rótulos correspondentes às imagens da base.
+        k (int, opcional): Número de resultados. Padrão é 5.
+        num_sondas (int, opcional): Listas sondadas quando o índice é do tipo IVF. Padrão é 8.
+
+    Returns:
+        list: Tuplas (índice, rótulo, distância) em ordem crescente de distância.
+    """
+
+    vetor_pesos_teste = projetar_lote([imagem_teste], face_media, autofaces)[0]
+    indices, distancias = buscar_indice(indice, vetor_pesos_teste, k, num_sondas)
+
+    return [(i, rotulos_base[i], d) for i, d in zip(indices, distancias)]
+
+
+def executar_reconhecimento(diretorio_base, diretorio_teste, num_autofaces=50, limite_base=10000,
+                            diretorio_cache=None, tamanho_lote=None, metodo="exato",
+                            tipo_indice=None, cinza=False, resolucao=None, empacotar=False,
+                            variancia_explicada=None, limite_residuo=None, exibir=True):
+    """
+    Realiza reconhecimento facial comparando a imagem de teste com uma base de até 10.000 imagens,
+    ou com a base completa no modo incremental.
 
     Args:
         diretorio_base (str): Diretório contendo a base de imagens.
         diretorio_teste (str): Diretório contendo a imagem de teste.
         num_autofaces (int): Número de autofaces a serem utilizadas.
-        limite_base (int, opcional): Limite máximo de imagens na base. Padrão é 10.000.
+        limite_base (int, opcional): Limite máximo de imagens na base no modo em memória.
+            Padrão é 10.000.
+        diretorio_cache (str, opcional): Diretório do cache de modelos treinados. Se None,
+            o modelo é treinado a cada execução. Padrão é None.
+        tamanho_lote (int, opcional): Se informado, treina no modo incremental, lendo a base
+            em lotes desse tamanho; nesse modo `limite_base` não é aplicado. Padrão é None.
+        metodo (str, opcional): Método de decomposição ("exato", "aleatorio" ou "auto").
+            Padrão é "exato".
+        tipo_indice (str, opcional): Tipo do índice de busca ("exato", "kdtree", "ivf" ou
+            "auto"), persistido ao lado do modelo no cache. Se None, compara com toda a
+            base por força bruta. Padrão é None.
+        cinza (bool, opcional): Se True, trabalha com as imagens em escala de cinza, com um
+            terço da memória e do custo de treino e projeção. Padrão é False.
+        resolucao (tuple, opcional): Resolução (altura, largura) para a qual as imagens são
+            redimensionadas na leitura. Padrão é None.
+        empacotar (bool, opcional): Se True, guarda a base decodificada num pacote no
+            `diretorio_cache`, que as execuções seguintes abrem mapeado em memória.
+            Padrão é False.
+        variancia_explicada (float, opcional): Se informada, usa o menor número de autofaces
+            que explica essa fração da variância da base, até o máximo de `num_autofaces`.
+            Padrão é None.
+        limite_residuo (float, opcional): Distância máxima da imagem de teste ao espaço das
+            faces; acima dela, a imagem é rejeitada sem busca na base. Padrão é None.
+        exibir (bool, opcional): Se False, nada é exibido e o Matplotlib não é importado.
+            Padrão é True.
 
     Exibe:
         A imagem de teste e a imagem reconhecida lado a lado usando Matplotlib.
+
+    Returns:
+        dict: Rótulo reconhecido, arquivo da imagem reconhecida e distância, todos None se
+        a imagem for rejeitada.
     """
 
-    imagens_base, rotulos_base = carregar_bases_de_dados([diretorio_base])
-    if len(imagens_base) > limite_base:
-        imagens_base = imagens_base[:limite_base]
+    arquivos_base, rotulos_base = listar_bases_de_dados([diretorio_base])
+    if not arquivos_base:
+        raise ValueError(
+            f"Nenhuma imagem válida encontrada nos diretórios: {[diretorio_base]}")
+    if tamanho_lote is None and limite_base is not None and len(arquivos_base) > limite_base:
+        arquivos_base = arquivos_base[:limite_base]
         rotulos_base = rotulos_base[:limite_base]
         print(f"Base limitada a {limite_base} imagens para evitar sobrecarga.")
 
-    face_media, autofaces = calcular_autofaces(imagens_base, num_autofaces)
-
-    vetores_de_pesos_base = calcular_vetores_de_pesos(
-        imagens_base, face_media, autofaces)
-
-    imagens_teste = ler_imagens(diretorio_teste, limite=1)
-    if not imagens_teste:
+    modelo = obter_modelo(arquivos_base, rotulos_base, num_autofaces,
+                          diretorio_cache=diretorio_cache, tamanho_lote=tamanho_lote,
+                          metodo=metodo, cinza=cinza, resolucao=resolucao, empacotar=empacotar,
+                          variancia_explicada=variancia_explicada)
+    face_media, autofaces = desempacotar_modelo(modelo)
+    vetores_de_pesos_base = modelo["vetores_de_pesos"]
+    rotulos_base = modelo["rotulos"]
+    opcoes = opcoes_de_leitura(modelo["formato"])
+
+    imagens_teste = ler_imagens(diretorio_teste, limite=1, **opcoes)
+    if len(imagens_teste) == 0:
         raise ValueError(
             "Nenhuma imagem válida encontrada no diretório de teste.")
     imagem_teste = imagens_teste[0]
 
+    indice = None
+    if tipo_indice is not None:
+        indice = obter_indice(modelo, tipo_indice, diretorio_cache=diretorio_cache)
+
     indice_reconhecido, rotulo_reconhecido, distancia = reconhecer_pessoa(
-        imagem_teste, face_media, autofaces, vetores_de_pesos_base, rotulos_base
+        imagem_teste, face_media, autofaces, vetores_de_pesos_base, rotulos_base, indice=indice,
+        limite_residuo=limite_residuo
     )
 
-    imagem_reconhecida = imagens_base[indice_reconhecido]
+    if indice_reconhecido is None:
+        print("Imagem de teste rejeitada: distante demais do espaço das faces.")
+        return {"rotulo": None, "arquivo_reconhecido": None, "distancia": None}
+
+    arquivo_reconhecido = modelo["arquivos"][indice_reconhecido]
+    if exibir:
+        imagem_reconhecida = ler_imagens(arquivo_reconhecido, **opcoes)[0]
+        exibir_resultado_reconhecimento(imagem_teste, imagem_reconhecida)
 
-    exibir_resultado_reconhecimento(imagem_teste, imagem_reconhecida)
+    return {
+        "rotulo": rotulo_reconhecido,
+        "arquivo_reconhecido": arquivo_reconhecido,
+        "distancia": float(distancia),
+    }
 
 
 def exibir_resultado_reconhecimento(imagem_teste, imagem_reconhecida):
@@ -145,3 +338,171 @@ def exibir_resultado_reconhecimento(imagem_teste, imagem_reconhecida):
         titulo_grid="Resultados de Reconhecimento",
         titulos_imagens=titulos_imagens
     )
+
+
+def executar_reconhecimento_lote(diretorio_base, diretorio_teste, num_autofaces=50,
+                                 diretorio_cache=None, tamanho_lote=None, metodo="exato",
+                                 tamanho_bloco=256, caminho_relatorio=None, cinza=False,
+                                 resolucao=None, empacotar=False, codificacao_galeria="float32",
+                                 variancia_explicada=None, num_prototipos=None, num_candidatos=3,
+                                 limite_residuo=None, num_fragmentos=None, num_processos=None):
+    """
+    Reconhece todas as imagens de um diretório de teste sem interface gráfica e mede a
+    acurácia, a latência e a vazão.
+
+    As imagens da base e de teste devem estar organizadas em uma pasta por pessoa; o nome
+    da pasta é usado como rótulo verdadeiro. As consultas são processadas em blocos de
+    `tamanho_bloco` imagens, e a latência de cada imagem é o tempo de leitura, projeção e
+    busca do bloco ao qual pertence.
+
+    Args:
+        diretorio_base (str): Diretório contendo a base de imagens, uma pasta por pessoa.
+        diretorio_teste (str): Diretório contendo as imagens de teste, uma pasta por pessoa.
+        num_autofaces (int, opcional): Número de autofaces a serem utilizadas. Padrão é 50.
+        diretorio_cache (str, opcional): Diretório do cache de modelos treinados. Padrão é None.
+        tamanho_lote (int, opcional): Se informado, treina no modo incremental. Padrão é None.
+        metodo (str, opcional): Método de decomposição. Padrão é "exato".
+        tamanho_bloco (int, opcional): Número de imagens de teste por bloco. Padrão é 256.
+        caminho_relatorio (str, opcional): Se informado, salva o relatório em JSON nesse
+            caminho. Padrão é None.
+        cinza (bool, opcional): Se True, trabalha com as imagens em escala de cinza, com um
+            terço da memória e do custo de treino e projeção. Padrão é False.
+        resolucao (tuple, opcional): Resolução (altura, largura) para a qual as imagens são
+            redimensionadas na leitura. Padrão é None.
+        empacotar (bool, opcional): Se True, guarda a base decodificada num pacote no
+            `diretorio_cache`, que as execuções seguintes abrem mapeado em memória.
+            Padrão é False.
+        codificacao_galeria (str, opcional): Codificação dos vetores de pesos da galeria
+            ("float32", "float16", "int8" ou "pq"; ver `quantizacao.quantizar_galeria`).
+            Padrão é "float32".
+        variancia_explicada (float, opcional): Se informada, usa o menor número de autofaces
+            que explica essa fração da variância da base, até o máximo de `num_autofaces`.
+            Padrão é None.
+        num_prototipos (int, opcional): Se informado, busca primeiro numa galeria com até
+            esse número de protótipos por pessoa (ver `prototipos.construir_prototipos`),
+            refinando só as imagens dos `num_candidatos` protótipos mais próximos. Não pode
+            ser combinado com `codificacao_galeria`. Padrão é None.
+        num_candidatos (int, opcional): Protótipos candidatos refinados por consulta.
+            Padrão é 3.
+        limite_residuo (float, opcional): Distância máxima ao espaço das faces; imagens mais
+            distantes são rejeitadas antes da busca e contam como erro. Padrão é None.
+        num_fragmentos (int, opcional): Se informado, divide a galeria nesse número de
+            fragmentos, buscados em paralelo por processos que a compartilham em memória
+            (ver `fragmentos.GaleriaFragmentada`). Não pode ser combinado com
+            `num_prototipos` nem com `codificacao_galeria`. Padrão é None.
+        num_processos (int, opcional): Número de processos da galeria fragmentada. Se None,
+            usa o número de CPUs. Padrão é None.
+
+    Returns:
+        dict: Relatório com as previsões por imagem, a acurácia, os percentis de latência
+        (em milissegundos) e a vazão em imagens por segundo. Com a instrumentação ativa
+        (`instrumentacao.ativar_instrumentacao`), inclui também as métricas por etapa.
+    """
+
+    arquivos_base, rotulos_base = listar_bases_de_dados([diretorio_base], rotulo_por_pasta=True)
+    if not arquivos_base:
+        raise ValueError(
+            f"Nenhuma imagem válida encontrada nos diretórios: {[diretorio_base]}")
+
+    inicio_treino = time.perf_counter()
+    modelo = obter_modelo(arquivos_base, rotulos_base, num_autofaces,
+                          diretorio_cache=diretorio_cache, tamanho_lote=tamanho_lote,
+                          metodo=metodo, cinza=cinza, resolucao=resolucao, empacotar=empacotar,
+                          variancia_explicada=variancia_explicada)
+    tempo_treino = time.perf_counter() - inicio_treino
+    face_media, autofaces = desempacotar_modelo(modelo)
+    opcoes = opcoes_de_leitura(modelo["formato"])
+
+    galeria = modelo["vetores_de_pesos"]
+    prototipos = None
+    if num_fragmentos is not None:
+        if num_prototipos is not None or codificacao_galeria != "float32":
+            raise ValueError("A galeria fragmentada não pode ser combinada com protótipos "
+                             "nem com a quantização.")
+        galeria = GaleriaFragmentada(galeria, num_fragmentos, num_processos)
+    elif num_prototipos is not None:
+        if codificacao_galeria != "float32":
+            raise ValueError(
+                "A galeria de protótipos não pode ser combinada com a quantização.")
+        prototipos = construir_prototipos(galeria, modelo["rotulos"], num_prototipos)
+    elif codificacao_galeria != "float32":
+        galeria = quantizar_galeria(galeria, codificacao_galeria)
+
+    arquivos_teste, rotulos_teste = listar_bases_de_dados(
+        [diretorio_teste], rotulo_por_pasta=True)
+
+    previsoes = []
+    latencias = []
+    inicio_consultas = time.perf_counter()
+
+    try:
+        for inicio in range(0, len(arquivos_teste), tamanho_bloco):
+            inicio_bloco = time.perf_counter()
+            arquivos_bloco = arquivos_teste[inicio:inicio + tamanho_bloco]
+            imagens, validos = carregar_arquivos(arquivos_bloco, **opcoes)
+            if len(imagens) == 0:
+                continue
+
+            indices, rotulos_previstos, distancias = reconhecer_lote(
+                imagens, face_media, autofaces, galeria, modelo["rotulos"], prototipos=prototipos,
+                num_candidatos=num_candidatos, limite_residuo=limite_residuo)
+            latencia = time.perf_counter() - inicio_bloco
+
+            for posicao, indice, rotulo, distancia in zip(validos, indices, rotulos_previstos,
+                                                          distancias):
+                previsoes.append({
+                    "arquivo": arquivos_bloco[posicao],
+                    "rotulo_verdadeiro": rotulos_teste[inicio + posicao],
+                    "rotulo_previsto": rotulo,
+                    "arquivo_reconhecido": modelo["arquivos"][indice] if indice >= 0 else None,
+                    "distancia": float(distancia) if indice >= 0 else None,
+                })
+                latencias.append(latencia)
+    finally:
+        if isinstance(galeria, GaleriaFragmentada):
+            galeria.fechar()
+
+    tempo_consultas = time.perf_counter() - inicio_consultas
+
+    if not previsoes:
+        raise ValueError("Nenhuma imagem válida encontrada no diretório de teste.")
+
+    acertos = sum(p["rotulo_verdadeiro"] == p["rotulo_previsto"] for p in previsoes)
+    latencias_ms = np.array(latencias) * 1000.0
+
+    relatorio = {
+        "num_imagens_base": len(modelo["arquivos"]),
+        "num_imagens_teste": len(previsoes),
+        "num_autofaces": int(len(autofaces)),
+        "variancia_explicada": (float(np.sum(modelo["autovalores"][:len(autofaces)]) /
+                                modelo["variancia_total"]) if "variancia_total" in modelo else None),
+        "codificacao_galeria": codificacao_galeria,
+        "num_prototipos": len(prototipos["prototipos"]) if prototipos is not None else None,
+        "num_fragmentos": (galeria.num_fragmentos if isinstance(galeria, GaleriaFragmentada)
+                           else None),
+        "rejeitadas": sum(p["rotulo_previsto"] is None for p in previsoes),
+        "acuracia": acertos / len(previsoes),
+        "tempo_treino_s": tempo_treino,
+        "tempo_consultas_s": tempo_consultas,
+        "imagens_por_segundo": len(previsoes) / max(tempo_consultas, 1e-9),
+        "latencia_ms": {
+            "p50": float(np.percentile(latencias_ms, 50)),
+            "p90": float(np.percentile(latencias_ms, 90)),
+            "p99": float(np.percentile(latencias_ms, 99)),
+            "max": float(latencias_ms.max()),
+        },
+        "previsoes": previsoes,
+    }
+    if instrumentacao_ativa():
+        relatorio["etapas"] = gerar_relatorio()
+
+    print(f"Acurácia: {relatorio['acuracia']:.2%} em {len(previsoes)} imagens "
+          f"({relatorio['imagens_por_segundo']:.1f} imagens/s, "
+          f"latência p50 {relatorio['latencia_ms']['p50']:.1f} ms, "
+          f"p99 {relatorio['latencia_ms']['p99']:.1f} ms).")
+
+    if caminho_relatorio is not None:
+        with open(caminho_relatorio, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+
+    return relatorio
@@ -0,0 +1,522 @@
+import os
+import json
+import stat
+import time
+import queue
+import base64
+import hashlib
+import argparse
+import threading
+import socketserver
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+import numpy as np
+from modelo import obter_modelo
+from armazenamento import salvar_arrays, carregar_arrays
+from projecao import matriz_de_autofaces, projetar_lote
+from distancias import buscar_k_vizinhos, calcular_normas
+from reconhecimento import listar_bases_de_dados
+from instrumentacao import (ativar_instrumentacao, exportar_prometheus, gerar_metricas_prometheus,
+                            gerar_relatorio, carregar_prometheus)
+
+
+class Galeria:
+    """
+    Vetores de pesos, rótulos e arquivos da galeria, com cadastro de novas imagens.
+
+    Os vetores ficam em um buffer com capacidade dobrada quando cheio, para que cada
+    cadastro custe O(K) amortizado em vez de copiar a galeria inteira.
+
+    Sem `caminho_cadastros`, os cadastros só existem em memória e se perdem quando o serviço
+    é reiniciado. Com ele, as imagens cadastradas (vetores de pesos, rótulos e arquivos)
+    são regravadas nesse arquivo a cada cadastro e recarregadas ao iniciar, desde que o
+    `identificador` do modelo seja o mesmo: pesos calculados com outra base de autofaces
+    não são comparáveis e são ignorados.
+    """
+
+    def __init__(self, vetores_de_pesos, rotulos, arquivos, caminho_cadastros=None,
+                 identificador=None):
+        vetores_de_pesos = np.asarray(vetores_de_pesos, dtype=np.float32)
+        self._vetores = np.array(vetores_de_pesos, copy=True)
+        self._normas = calcular_normas(self._vetores)
+        self.tamanho = len(vetores_de_pesos)
+        self.rotulos = list(rotulos)
+        self.arquivos = list(arquivos)
+        self.trava = threading.Lock()
+        self.tamanho_original = self.tamanho
+        self.caminho_cadastros = caminho_cadastros
+        self.identificador = identificador
+
+        if caminho_cadastros is not None and os.path.exists(caminho_cadastros):
+            cadastros = carregar_arrays(caminho_cadastros, mmap=False)
+            if cadastros.get("identificador") != identificador:
+                print(f"Cadastros em {caminho_cadastros} são de outro modelo e foram ignorados.")
+            elif len(cadastros["rotulos"]) > 0:
+                self._adicionar(cadastros["vetores_de_pesos"], cadastros["rotulos"],
+                                cadastros["arquivos"])
+
+    @property
+    def vetores(self):
+        return self._vetores[:self.tamanho]
+
+    @property
+    def normas(self):
+        return self._normas[:self.tamanho]
+
+    def adicionar(self, vetores, rotulos, arquivos):
+        """
+        Adiciona vetores de pesos à galeria. Se o arquivo de cadastros não puder ser
+        gravado, a galeria volta ao estado anterior e o erro é propagado.
+
+        Args:
+            vetores (numpy.array): Matriz M×K de novos vetores de pesos.
+            rotulos (list): Rótulos dos novos vetores.
+            arquivos (list): Origem de cada novo vetor (caminho ou descrição).
+
+        Returns:
+            list: Índices atribuídos aos novos vetores.
+        """
+
+        with self.trava:
+            tamanho = self.tamanho
+            indices = self._adicionar(vetores, rotulos, arquivos)
+            if self.caminho_cadastros is not None:
+                try:
+                    self._salvar_cadastros()
+                except BaseException:
+                    # Desfaz o cadastro em memória: quem recebe o erro pode repeti-lo
+                    self.tamanho = tamanho
+                    del self.rotulos[tamanho:], self.arquivos[tamanho:]
+                    raise
+
+        return indices
+
+    def _adicionar(self, vetores, rotulos, arquivos):
+        necessario = self.tamanho + len(vetores)
+        if necessario > len(self._vetores):
+            capacidade = max(necessario, 2 * len(self._vetores), 16)
+            novos = np.empty((capacidade, self._vetores.shape[1]), dtype=np.float32)
+            novos[:self.tamanho] = self.vetores
+            novas_normas = np.empty(capacidade, dtype=np.float32)
+            novas_normas[:self.tamanho] = self.normas
+            self._vetores, self._normas = novos, novas_normas
+
+        self._vetores[self.tamanho:necessario] = vetores
+        self._normas[self.tamanho:necessario] = calcular_normas(vetores)
+        self.rotulos.extend(rotulos)
+        self.arquivos.extend(arquivos)
+        indices = list(range(self.tamanho, necessario))
+        self.tamanho = necessario
+        return indices
+
+    def _salvar_cadastros(self):
+        # Regrava todos os cadastros: são poucos perto da galeria, e o arquivo é trocado de
+        # uma vez por `salvar_arrays`
+        salvar_arrays({
+            "identificador": self.identificador,
+            "vetores_de_pesos": np.array(self.vetores[self.tamanho_original:]),
+            "rotulos": self.rotulos[self.tamanho_original:],
+            "arquivos": self.arquivos[self.tamanho_original:],
+        }, self.caminho_cadastros)
+
+
+class AgrupadorDeLotes:
+    """
+    Agrupa pedidos concorrentes de reconhecimento e cadastro em micro-lotes.
+
+    Uma thread dedicada espera o primeiro pedido e continua recolhendo pedidos até
+    completar `tamanho_max_lote` ou até passar `espera_max_ms` desde o primeiro; o lote
+    inteiro é então projetado com um único produto de matrizes e comparado com a galeria
+    em uma única busca. Cada pedido recebe um `Future` com o seu resultado.
+
+    Os pedidos são validados ao serem enfileirados, e, se mesmo assim o lote falhar, os
+    pedidos ainda pendentes são refeitos um a um: um pedido inválido só falha o seu Future.
+    """
+
+    def __init__(self, face_media, autofaces, galeria, tamanho_max_lote=32, espera_max_ms=5.0):
+        self.face_media = np.asarray(face_media, dtype=np.float32).reshape(-1)
+        self.autofaces = matriz_de_autofaces(autofaces)
+        self.galeria = galeria
+        self.tamanho_max_lote = tamanho_max_lote
+        self.espera_max = espera_max_ms / 1000.0
+        self.fila = queue.Queue()
+        self.estatisticas = {"pedidos": 0, "lotes": 0}
+        self._thread = threading.Thread(target=self._executar, daemon=True)
+        self._thread.start()
+
+    def reconhecer(self, imagem, k=1):
+        """
+        Enfileira uma imagem para reconhecimento.
+
+        Args:
+            imagem (numpy.array): Imagem no formato do modelo.
+            k (int, opcional): Número de resultados. Padrão é 1.
+
+        Returns:
+            Future: Resultado com a lista de tuplas (índice, distância).
+        """
+
+        if isinstance(k, bool) or not isinstance(k, (int, np.integer)) or k < 1:
+            raise ValueError(f"O número de resultados deve ser um inteiro positivo, não {k!r}.")
+        return self._enfileirar(("reconhecer", self._validar_imagem(imagem), int(k)))
+
+    def cadastrar(self, imagem, rotulo, arquivo=""):
+        """
+        Enfileira uma imagem para cadastro na galeria.
+
+        Args:
+            imagem (numpy.array): Imagem no formato do modelo.
+            rotulo (str): Rótulo da pessoa.
+            arquivo (str, opcional): Origem da imagem. Padrão é "".
+
+        Returns:
+            Future: Resultado com o índice atribuído na galeria.
+        """
+
+        return self._enfileirar(("cadastrar", self._validar_imagem(imagem), (rotulo, arquivo)))
+
+    def _validar_imagem(self, imagem):
+        imagem = np.asarray(imagem, dtype=np.float32)
+        if imagem.size != self.face_media.size:
+            raise ValueError(f"A imagem tem {imagem.size} valores, mas o modelo espera "
+                             f"{self.face_media.size}.")
+        return imagem
+
+    def _enfileirar(self, pedido):
+        futuro = Future()
+        self.fila.put((pedido, futuro))
+        return futuro
+
+    def _recolher_lote(self):
+        lote = [self.fila.get()]
+        limite = time.perf_counter() + self.espera_max
+        while len(lote) < self.tamanho_max_lote:
+            restante = limite - time.perf_counter()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self.fila.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _executar(self):
+        while True:
+            lote = self._recolher_lote()
+            try:
+                self._processar(lote)
+            except Exception:
+                # Refaz os pedidos pendentes um a um, para que só o culpado falhe
+                for pedido in lote:
+                    if pedido[1].done():
+                        continue
+                    try:
+                        self._processar([pedido])
+                    except Exception as erro:
+                        pedido[1].set_exception(erro)
+
+    def _processar(self, lote):
+        imagens = np.stack([pedido[1].reshape(-1) for pedido, _ in lote])
+        pesos = projetar_lote(imagens, self.face_media, self.autofaces)
+
+        consultas = [i for i, (pedido, _) in enumerate(lote) if pedido[0] == "reconhecer"]
+        if consultas and self.galeria.tamanho > 0:
+            k_max = max(lote[i][0][2] for i in consultas)
+            indices, distancias = buscar_k_vizinhos(
+                pesos[consultas], self.galeria.vetores, k=k_max,
+                normas_galeria=self.galeria.normas, num_threads=1)
+            for linha, i in enumerate(consultas):
+                k = lote[i][0][2]
+                lote[i][1].set_result(list(zip(indices[linha, :k], distancias[linha, :k])))
+        else:
+            for i in consultas:
+                lote[i][1].set_result([])
+
+        cadastros = [i for i, (pedido, _) in enumerate(lote) if pedido[0] == "cadastrar"]
+        if cadastros:
+            novos = self.galeria.adicionar(
+                pesos[cadastros],
+                [lote[i][0][2][0] for i in cadastros],
+                [lote[i][0][2][1] for i in cadastros])
+            for i, indice in zip(cadastros, novos):
+                lote[i][1].set_result(indice)
+
+        self.estatisticas["pedidos"] += len(lote)
+        self.estatisticas["lotes"] += 1
+
+
+def decodificar_imagem(dados, formato):
+    """
+    Decodifica uma imagem (bytes de JPG/PNG) para o formato de entrada do modelo.
+
+    Args:
+        dados (bytes): Conteúdo do arquivo de imagem.
+        formato (tuple): Formato (altura, largura, canais) esperado pelo modelo.
+
+    Returns:
+        numpy.array: Imagem normalizada (float32 entre 0 e 1).
+    """
+
+    modo = cv2.IMREAD_GRAYSCALE if len(formato) == 2 else cv2.IMREAD_COLOR
+    # O OpenCV rejeita um buffer vazio com cv2.error em vez de retornar None
+    imagem = cv2.imdecode(np.frombuffer(dados, dtype=np.uint8), modo) if dados else None
+    if imagem is None:
+        raise ValueError("Os dados enviados não são uma imagem válida.")
+    if imagem.shape[:2] != tuple(formato[:2]):
+        imagem = cv2.resize(imagem, (formato[1], formato[0]), interpolation=cv2.INTER_AREA)
+    return np.float32(imagem) / 255.0
+
+
+def criar_manipulador(agrupador, formato, tempo_limite=30.0, diretorio_imagens=None):
+    """
+    Cria a classe de manipulador HTTP da API de reconhecimento.
+
+    Rotas:
+        - GET /saude: estado do serviço.
+        - GET /metricas: métricas por etapa no formato do Prometheus (ou em JSON, se o
+          `prometheus_client` não estiver instalado).
+        - POST /reconhecer: {"imagem": base64} ou {"caminho": str}, e opcionalmente "k".
+        - POST /cadastrar: {"imagem": base64} ou {"caminho": str}, e "rotulo". Os cadastros
+          só sobrevivem a um reinício se a galeria tiver um arquivo de cadastros (ver
+          `Galeria`).
+
+    Pedidos malformados recebem o status 400, pedidos que não terminam em `tempo_limite`
+    recebem 504 e qualquer outra falha recebe 500, sempre com o erro em JSON.
+
+    O campo "caminho" só é aceito com `diretorio_imagens`, e é resolvido dentro dele:
+    caminhos que saem do diretório (absolutos, com "..", ou por links simbólicos) são
+    recusados, para que a API não leia arquivos arbitrários do servidor.
+
+    Args:
+        agrupador (AgrupadorDeLotes): Agrupador que processa os pedidos.
+        formato (tuple): Formato de entrada do modelo.
+        tempo_limite (float, opcional): Tempo máximo de espera por um resultado, em
+            segundos. Padrão é 30.
+        diretorio_imagens (str, opcional): Diretório do servidor de onde imagens podem ser
+            lidas pelo campo "caminho". Se None, o campo é recusado. Padrão é None.
+
+    Returns:
+        type: Subclasse de `BaseHTTPRequestHandler`.
+    """
+
+    galeria = agrupador.galeria
+    raiz = os.path.realpath(diretorio_imagens) if diretorio_imagens is not None else None
+
+    class Manipulador(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def address_string(self):
+            # Em sockets Unix o endereço do cliente é vazio
+            return self.client_address[0] if self.client_address else "unix"
+
+        def log_message(self, formato_log, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == "/metricas":
+                if carregar_prometheus() is None:
+                    return self._responder(200, gerar_relatorio())
+                dados, tipo = gerar_metricas_prometheus()
+                self.send_response(200)
+                self.send_header("Content-Type", tipo)
+                self.send_header("Content-Length", str(len(dados)))
+                self.end_headers()
+                self.wfile.write(dados)
+                return
+            if self.path != "/saude":
+                return self._responder(404, {"erro": "Rota não encontrada."})
+            self._responder(200, {
+                "status": "ok",
+                "tamanho_galeria": galeria.tamanho,
+                **agrupador.estatisticas,
+            })
+
+        def do_POST(self):
+            try:
+                tamanho = int(self.headers.get("Content-Length", 0))
+                corpo = json.loads(self.rfile.read(tamanho) or b"{}")
+                if not isinstance(corpo, dict):
+                    raise ValueError("O corpo do pedido deve ser um objeto JSON.")
+                imagem = self._ler_imagem(corpo)
+
+                if self.path == "/reconhecer":
+                    k = corpo.get("k", 1)
+                    if not isinstance(k, int) or isinstance(k, bool):
+                        raise ValueError("O campo 'k' deve ser um inteiro.")
+                    resultados = agrupador.reconhecer(imagem, k).result(tempo_limite)
+                    self._responder(200, {"resultados": [{
+                        "indice": int(indice),
+                        "rotulo": galeria.rotulos[indice],
+                        "arquivo": galeria.arquivos[indice],
+                        "distancia": float(distancia),
+                    } for indice, distancia in resultados]})
+                elif self.path == "/cadastrar":
+                    if "rotulo" not in corpo:
+                        raise ValueError("O campo 'rotulo' é obrigatório no cadastro.")
+                    arquivo = self._resolver_caminho(corpo["caminho"]) if "caminho" in corpo else ""
+                    indice = agrupador.cadastrar(
+                        imagem, str(corpo["rotulo"]), arquivo).result(tempo_limite)
+                    self._responder(200, {"indice": indice})
+                else:
+                    self._responder(404, {"erro": "Rota não encontrada."})
+            except TimeoutError:
+                # Vem antes de OSError, da qual é subclasse: a demora é do servidor
+                self._responder(504, {"erro": "O pedido não foi processado a tempo."})
+            except (ValueError, KeyError, OSError) as erro:
+                self._responder(400, {"erro": str(erro)})
+            except Exception as erro:
+                self._responder(500, {"erro": f"Erro interno: {erro}"})
+
+        def _ler_imagem(self, corpo):
+            if "imagem" in corpo:
+                if not isinstance(corpo["imagem"], str):
+                    raise ValueError("O campo 'imagem' deve ser uma string em base64.")
+                return decodificar_imagem(base64.b64decode(corpo["imagem"]), formato)
+            if "caminho" in corpo:
+                with open(self._resolver_caminho(corpo["caminho"]), "rb") as arquivo:
+                    return decodificar_imagem(arquivo.read(), formato)
+            raise ValueError("Envie a imagem em 'imagem' (base64) ou em 'caminho'.")
+
+        def _resolver_caminho(self, caminho):
+            if raiz is None:
+                raise ValueError("A leitura por 'caminho' está desativada neste serviço; "
+                                 "envie a imagem em 'imagem' (base64).")
+            resolvido = os.path.realpath(os.path.join(raiz, str(caminho)))
+            if os.path.commonpath([raiz, resolvido]) != raiz:
+                raise ValueError("O caminho está fora do diretório de imagens do serviço.")
+            return resolvido
+
+        def _responder(self, status, conteudo):
+            dados = json.dumps(conteudo, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(dados)))
+            self.end_headers()
+            self.wfile.write(dados)
+
+    return Manipulador
+
+
+class ServidorUnix(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def executar_servico(diretorio_base, num_autofaces=50, diretorio_cache=None, host="127.0.0.1",
+                     porta=8000, socket_unix=None, tamanho_max_lote=32, espera_max_ms=5.0,
+                     tamanho_lote=None, metodo="exato", metricas=False, cinza=False,
+                     resolucao=None, empacotar=False, variancia_explicada=None,
+                     diretorio_imagens=None, caminho_cadastros=None):
+    """
+    Carrega o modelo e a galeria uma única vez e atende pedidos de reconhecimento e
+    cadastro por HTTP local (ou por um socket Unix) até ser interrompido.
+
+    Args:
+        diretorio_base (str): Diretório contendo a base de imagens, uma pasta por pessoa.
+        num_autofaces (int, opcional): Número de autofaces a serem utilizadas. Padrão é 50.
+        diretorio_cache (str, opcional): Diretório do cache de modelos treinados. Padrão é None.
+        host (str, opcional): Endereço de escuta HTTP. Padrão é "127.0.0.1".
+        porta (int, opcional): Porta HTTP. Padrão é 8000.
+        socket_unix (str, opcional): Se informado, escuta nesse socket Unix em vez de TCP.
+            Padrão é None.
+        tamanho_max_lote (int, opcional): Número máximo de pedidos por micro-lote. Padrão é 32.
+        espera_max_ms (float, opcional): Tempo máximo, em milissegundos, que o primeiro pedido
+            de um micro-lote espera por outros. Padrão é 5.
+        tamanho_lote (int, opcional): Se informado, treina no modo incremental. Padrão é None.
+        metodo (str, opcional): Método de decomposição. Padrão é "exato".
+        metricas (bool, opcional): Se True, mede o tempo de cada etapa e o publica em
+            GET /metricas. Padrão é False.
+        cinza (bool, opcional): Se True, o modelo trabalha em escala de cinza; as imagens
+            recebidas são convertidas na decodificação. Padrão é False.
+        resolucao (tuple, opcional): Resolução (altura, largura) do modelo. Padrão é None.
+        empacotar (bool, opcional): Se True, guarda a base decodificada num pacote no
+            `diretorio_cache`, que as execuções seguintes abrem mapeado em memória.
+            Padrão é False.
+        variancia_explicada (float, opcional): Se informada, usa o menor número de autofaces
+            que explica essa fração da variância da base, até o máximo de `num_autofaces`.
+            Padrão é None.
+        diretorio_imagens (str, opcional): Diretório de onde os pedidos podem ler imagens
+            pelo campo "caminho". Se None, o campo é recusado. Padrão é None.
+        caminho_cadastros (str, opcional): Arquivo onde os cadastros feitos pela API são
+            guardados e de onde são recarregados ao iniciar. Se None, os cadastros se perdem
+            quando o serviço termina. Padrão é None.
+    """
+
+    if metricas:
+        # Sem tracemalloc: o custo por alocação não compensa num serviço de longa duração
+        ativar_instrumentacao(memoria=False)
+        if carregar_prometheus() is not None:
+            exportar_prometheus()
+
+    arquivos, rotulos = listar_bases_de_dados([diretorio_base], rotulo_por_pasta=True)
+    if not arquivos:
+        raise ValueError(f"Nenhuma imagem válida encontrada nos diretórios: {[diretorio_base]}")
+
+    modelo = obter_modelo(arquivos, rotulos, num_autofaces, diretorio_cache=diretorio_cache,
+                          tamanho_lote=tamanho_lote, metodo=metodo, cinza=cinza,
+                          resolucao=resolucao, empacotar=empacotar,
+                          variancia_explicada=variancia_explicada)
+
+    # Os cadastros guardados só valem para a mesma face média e as mesmas autofaces
+    identificador = hashlib.sha256(
+        np.ascontiguousarray(modelo["face_media"]).tobytes() +
+        np.ascontiguousarray(modelo["autofaces"]).tobytes()).hexdigest()
+    galeria = Galeria(modelo["vetores_de_pesos"], modelo["rotulos"], modelo["arquivos"],
+                      caminho_cadastros=caminho_cadastros, identificador=identificador)
+    agrupador = AgrupadorDeLotes(modelo["face_media"], modelo["autofaces"], galeria,
+                                 tamanho_max_lote=tamanho_max_lote, espera_max_ms=espera_max_ms)
+    manipulador = criar_manipulador(agrupador, tuple(modelo["formato"]),
+                                    diretorio_imagens=diretorio_imagens)
+
+    if socket_unix is not None:
+        # Só um socket deixado por uma execução anterior é removido, nunca outro arquivo
+        if os.path.lexists(socket_unix):
+            if not stat.S_ISSOCK(os.lstat(socket_unix).st_mode):
+                raise ValueError(f"{socket_unix} já existe e não é um socket Unix.")
+            os.remove(socket_unix)
+        servidor = ServidorUnix(socket_unix, manipulador)
+        print(f"Serviço de reconhecimento ouvindo em unix:{socket_unix}")
+    else:
+        servidor = ThreadingHTTPServer((host, porta), manipulador)
+        print(f"Serviço de reconhecimento ouvindo em http://{host}:{porta}")
+
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serviço local de reconhecimento facial.")
+    parser.add_argument("diretorio_base")
+    parser.add_argument("--num-autofaces", type=int, default=50)
+    parser.add_argument("--diretorio-cache")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8000)
+    parser.add_argument("--socket-unix")
+    parser.add_argument("--tamanho-max-lote", type=int, default=32)
+    parser.add_argument("--espera-max-ms", type=float, default=5.0)
+    parser.add_argument("--cinza", action="store_true",
+                        help="Treina e reconhece em escala de cinza.")
+    parser.add_argument("--resolucao", type=int, nargs=2, metavar=("ALTURA", "LARGURA"))
+    parser.add_argument("--empacotar", action="store_true",
+                        help="Guarda a base decodificada num pacote no diretório de cache.")
+    parser.add_argument("--variancia-explicada", type=float,
+                        help="Fração da variância a explicar (--num-autofaces vira o máximo).")
+    parser.add_argument("--diretorio-imagens",
+                        help="Diretório de onde as imagens do campo 'caminho' são lidas.")
+    parser.add_argument("--cadastros",
+                        help="Arquivo onde os cadastros são guardados entre execuções.")
+    parser.add_argument("--metricas", action="store_true",
+                        help="Mede as etapas e as publica em GET /metricas.")
+    argumentos = parser.parse_args()
+
+    executar_servico(
+        argumentos.diretorio_base, argumentos.num_autofaces, argumentos.diretorio_cache,
+        argumentos.host, argumentos.porta, argumentos.socket_unix,
+        argumentos.tamanho_max_lote, argumentos.espera_max_ms, metricas=argumentos.metricas,
+        cinza=argumentos.cinza, resolucao=argumentos.resolucao, empacotar=argumentos.empacotar,
+        variancia_explicada=argumentos.variancia_explicada,
+        diretorio_imagens=argumentos.diretorio_imagens, caminho_cadastros=argumentos.cadastros)
@@ -0,0 +1,362 @@
+import json
+import time
+import queue
+import threading
+import cv2
+import numpy as np
+from modelo import obter_modelo
+from projecao import matriz_de_autofaces, projetar_lote
+from distancias import buscar_k_vizinhos, calcular_normas
+from reconhecimento import listar_bases_de_dados
+from instrumentacao import instrumentacao_ativa, gerar_relatorio
+
+POLITICAS_FILA = ("descartar", "bloquear")
+_FIM = None
+
+
+def criar_detector_de_rostos():
+    """
+    Cria o detector de rostos Haar que acompanha o OpenCV.
+
+    Returns:
+        cv2.CascadeClassifier: Detector, ou None se a instalação do OpenCV não incluir o
+        módulo de detecção ou os seus arquivos.
+    """
+
+    diretorio = getattr(getattr(cv2, "data", None), "haarcascades", None)
+    if diretorio is None or not hasattr(cv2, "CascadeClassifier"):
+        return None
+    detector = cv2.CascadeClassifier(diretorio + "haarcascade_frontalface_default.xml")
+    return None if detector.empty() else detector
+
+
+def recortar_centro(quadro, altura, largura):
+    """
+    Recorta a maior região central do quadro com a proporção altura/largura do modelo.
+
+    Args:
+        quadro (numpy.array): Quadro do vídeo.
+        altura (int): Altura de entrada do modelo.
+        largura (int): Largura de entrada do modelo.
+
+    Returns:
+        numpy.array: Visão (sem cópia) da região recortada.
+    """
+
+    altura_quadro, largura_quadro = quadro.shape[:2]
+    if altura_quadro * largura > largura_quadro * altura:
+        nova_altura = largura_quadro * altura // largura
+        topo = (altura_quadro - nova_altura) // 2
+        return quadro[topo:topo + nova_altura]
+    nova_largura = altura_quadro * largura // altura
+    esquerda = (largura_quadro - nova_largura) // 2
+    return quadro[:, esquerda:esquerda + nova_largura]
+
+
+def preparar_quadro(quadro, formato, detector=None):
+    """
+    Converte um quadro BGR do vídeo para o formato de entrada do modelo: escala de cinza
+    (se o modelo for em cinza), recorte do rosto (ou do centro) na proporção do modelo e
+    redimensionamento. A normalização para float32 fica para o lote inteiro.
+
+    Args:
+        quadro (numpy.array): Quadro BGR uint8.
+        formato (tuple): Formato de entrada do modelo.
+        detector (cv2.CascadeClassifier, opcional): Se informado, recorta o maior rosto
+            detectado; sem rosto, recorta o centro. Padrão é None.
+
+    Returns:
+        numpy.array: Quadro uint8 no formato do modelo.
+    """
+
+    altura, largura = formato[:2]
+    cinza = None
+    if len(formato) == 2 or detector is not None:
+        cinza = cv2.cvtColor(quadro, cv2.COLOR_BGR2GRAY)
+    origem = cinza if len(formato) == 2 else quadro
+
+    if detector is not None:
+        rostos = detector.detectMultiScale(cinza, scaleFactor=1.2, minNeighbors=4)
+        if len(rostos) > 0:
+            x, y, w, h = max(rostos, key=lambda rosto: rosto[2] * rosto[3])
+            origem = origem[y:y + h, x:x + w]
+
+    recorte = recortar_centro(origem, altura, largura)
+    return cv2.resize(recorte, (largura, altura), interpolation=cv2.INTER_AREA)
+
+
+class ReconhecedorDeVideo:
+    """
+    Reconhece os quadros de um arquivo de vídeo num pipeline produtor/consumidor.
+
+    Uma thread decodifica o vídeo com `cv2.VideoCapture`, prepara cada quadro e o coloca
+    numa fila limitada; `num_trabalhadores` threads retiram da fila até `tamanho_lote`
+    quadros por vez, projetam o lote com um único produto de matrizes e o comparam com a
+    galeria. O OpenCV e o BLAS liberam o GIL, então decodificação e projeção se sobrepõem.
+
+    Quando a fila está cheia, a política "descartar" joga fora o quadro mais antigo, o que
+    mantém a latência limitada se o reconhecimento não acompanha o vídeo; a política
+    "bloquear" faz o decodificador esperar e processa todos os quadros.
+    """
+
+    def __init__(self, face_media, autofaces, vetores_de_pesos, rotulos, formato,
+                 num_trabalhadores=2, tamanho_lote=8, capacidade_fila=16, politica="descartar",
+                 pular_quadros=1, tempo_real=False, detectar_rostos=False):
+        if politica not in POLITICAS_FILA:
+            raise ValueError(f"Política desconhecida: {politica}. Use uma de {POLITICAS_FILA}.")
+
+        self.face_media = np.asarray(face_media, dtype=np.float32).reshape(-1)
+        self.autofaces = matriz_de_autofaces(autofaces)
+        self.galeria = np.asarray(vetores_de_pesos, dtype=np.float32)
+        self.normas_galeria = calcular_normas(self.galeria)
+        self.rotulos = list(rotulos)
+        self.formato = tuple(formato)
+        self.num_trabalhadores = num_trabalhadores
+        self.tamanho_lote = tamanho_lote
+        self.capacidade_fila = capacidade_fila
+        self.politica = politica
+        self.pular_quadros = max(1, pular_quadros)
+        self.tempo_real = tempo_real
+        self.detector = criar_detector_de_rostos() if detectar_rostos else None
+        if detectar_rostos and self.detector is None:
+            print("Detector de rostos indisponível nesta instalação do OpenCV: "
+                  "os quadros serão recortados no centro.")
+
+    def processar(self, caminho_video, limite_quadros=None):
+        """
+        Reconhece os quadros de um vídeo.
+
+        Args:
+            caminho_video (str): Caminho do arquivo de vídeo.
+            limite_quadros (int, opcional): Número máximo de quadros lidos. Padrão é None.
+
+        Returns:
+            tuple: Lista com o resultado de cada quadro reconhecido (índice do quadro,
+            rótulo, índice na galeria, distância e latência em ms), em ordem, e dicionário
+            de contadores (quadros lidos, pulados, descartados e fps do vídeo).
+        """
+
+        captura = cv2.VideoCapture(caminho_video)
+        if not captura.isOpened():
+            raise ValueError(f"Não foi possível abrir o vídeo {caminho_video}.")
+
+        fila = queue.Queue(maxsize=self.capacidade_fila)
+        resultados = []
+        trava = threading.Lock()
+        contadores = {"quadros_lidos": 0, "quadros_pulados": 0, "quadros_descartados": 0,
+                      "fps_video": captura.get(cv2.CAP_PROP_FPS) or 0.0}
+        erros = []
+
+        decodificador = threading.Thread(
+            target=self._decodificar, args=(captura, fila, contadores, limite_quadros, erros))
+        trabalhadores = [
+            threading.Thread(target=self._trabalhar, args=(fila, resultados, trava, erros))
+            for _ in range(self.num_trabalhadores)]
+
+        decodificador.start()
+        for trabalhador in trabalhadores:
+            trabalhador.start()
+        decodificador.join()
+        for trabalhador in trabalhadores:
+            trabalhador.join()
+        captura.release()
+
+        if erros:
+            raise erros[0]
+
+        resultados.sort(key=lambda resultado: resultado["quadro"])
+        return resultados, contadores
+
+    def _decodificar(self, captura, fila, contadores, limite_quadros, erros):
+        intervalo = 1.0 / contadores["fps_video"] if contadores["fps_video"] > 0 else 0.0
+        inicio = time.perf_counter()
+        indice = 0
+        try:
+            while limite_quadros is None or indice < limite_quadros:
+                if not captura.grab():
+                    break
+                indice += 1
+                contadores["quadros_lidos"] += 1
+
+                # No modo tempo real, o quadro só "chega" no seu instante de exibição
+                chegada = time.perf_counter()
+                if self.tempo_real and intervalo > 0:
+                    chegada = inicio + (indice - 1) * intervalo
+                    espera = chegada - time.perf_counter()
+                    if espera > 0:
+                        time.sleep(espera)
+
+                # Quadros pulados não são nem decodificados (grab sem retrieve)
+                if (indice - 1) % self.pular_quadros:
+                    contadores["quadros_pulados"] += 1
+                    continue
+
+                ok, quadro = captura.retrieve()
+                if not ok:
+                    break
+                item = (indice - 1, chegada, preparar_quadro(quadro, self.formato, self.detector))
+
+                if self.politica == "bloquear":
+                    fila.put(item)
+                    continue
+                while True:
+                    try:
+                        fila.put_nowait(item)
+                        break
+                    except queue.Full:
+                        try:
+                            fila.get_nowait()
+                            contadores["quadros_descartados"] += 1
+                        except queue.Empty:
+                            pass
+        except Exception as erro:
+            erros.append(erro)
+        finally:
+            for _ in range(self.num_trabalhadores):
+                fila.put(_FIM)
+
+    def _recolher_lote(self, fila):
+        # Não espera o lote encher: junta o que já está na fila, para não somar latência
+        lote = [fila.get()]
+        while lote[-1] is not _FIM and len(lote) < self.tamanho_lote:
+            try:
+                lote.append(fila.get_nowait())
+            except queue.Empty:
+                break
+        return lote
+
+    def _trabalhar(self, fila, resultados, trava, erros):
+        while True:
+            lote = self._recolher_lote(fila)
+            fim = lote[-1] is _FIM
+            if fim:
+                lote.pop()
+            if lote:
+                try:
+                    parciais = self._reconhecer(lote)
+                except Exception as erro:
+                    erros.append(erro)
+                    parciais = []
+                with trava:
+                    resultados.extend(parciais)
+            if fim:
+                return
+
+    def _reconhecer(self, lote):
+        quadros = np.stack([item[2] for item in lote])
+        imagens = np.divide(quadros.reshape(len(lote), -1), np.float32(255.0), dtype=np.float32)
+        pesos = projetar_lote(imagens, self.face_media, self.autofaces)
+        indices, distancias = buscar_k_vizinhos(
+            pesos, self.galeria, k=1, normas_galeria=self.normas_galeria, num_threads=1)
+
+        agora = time.perf_counter()
+        return [{
+            "quadro": indice_quadro,
+            "rotulo": self.rotulos[indice],
+            "indice_galeria": int(indice),
+            "distancia": float(distancia),
+            "latencia_ms": (agora - chegada) * 1000.0,
+        } for (indice_quadro, chegada, _), indice, distancia in zip(
+            lote, indices[:, 0], distancias[:, 0])]
+
+
+def executar_reconhecimento_video(diretorio_base, caminho_video, num_autofaces=50,
+                                  diretorio_cache=None, cinza=False, resolucao=None,
+                                  variancia_explicada=None, num_trabalhadores=2, tamanho_lote=8,
+                                  capacidade_fila=16, politica="descartar", pular_quadros=1,
+                                  tempo_real=False, detectar_rostos=False, limite_quadros=None,
+                                  caminho_relatorio=None):
+    """
+    Reconhece as pessoas nos quadros de um arquivo de vídeo e mede a vazão sustentada e a
+    latência de ponta a ponta (da chegada do quadro até o resultado da busca).
+
+    Args:
+        diretorio_base (str): Diretório contendo a base de imagens, uma pasta por pessoa.
+        caminho_video (str): Caminho do arquivo de vídeo.
+        num_autofaces (int, opcional): Número de autofaces a serem utilizadas. Padrão é 50.
+        diretorio_cache (str, opcional): Diretório do cache de modelos treinados. Padrão é None.
+        cinza (bool, opcional): Se True, o modelo trabalha em escala de cinza. Padrão é False.
+        resolucao (tuple, opcional): Resolução (altura, largura) do modelo. Padrão é None.
+        variancia_explicada (float, opcional): Fração da variância que as autofaces devem
+            explicar. Padrão é None.
+        num_trabalhadores (int, opcional): Threads de reconhecimento. Padrão é 2.
+        tamanho_lote (int, opcional): Máximo de quadros projetados juntos. Padrão é 8.
+        capacidade_fila (int, opcional): Quadros que podem esperar na fila. Padrão é 16.
+        politica (str, opcional): "descartar" (joga fora o quadro mais antigo com a fila
+            cheia) ou "bloquear" (o decodificador espera). Padrão é "descartar".
+        pular_quadros (int, opcional): Processa um a cada `pular_quadros` quadros.
+            Padrão é 1.
+        tempo_real (bool, opcional): Se True, entrega os quadros no ritmo do vídeo, como uma
+            câmera; se False, tão rápido quanto a decodificação permite. Padrão é False.
+        detectar_rostos (bool, opcional): Se True, recorta o maior rosto de cada quadro com
+            o detector Haar do OpenCV. Padrão é False.
+        limite_quadros (int, opcional): Número máximo de quadros lidos. Padrão é None.
+        caminho_relatorio (str, opcional): Se informado, salva o relatório em JSON.
+            Padrão é None.
+
+    Returns:
+        dict: Relatório com os contadores de quadros, a vazão em quadros por segundo, os
+        percentis de latência (ms), o rótulo mais frequente e o resultado de cada quadro.
+    """
+
+    arquivos, rotulos = listar_bases_de_dados([diretorio_base], rotulo_por_pasta=True)
+    if not arquivos:
+        raise ValueError(f"Nenhuma imagem válida encontrada nos diretórios: {[diretorio_base]}")
+
+    modelo = obter_modelo(arquivos, rotulos, num_autofaces, diretorio_cache=diretorio_cache,
+                          cinza=cinza, resolucao=resolucao,
+                          variancia_explicada=variancia_explicada)
+
+    reconhecedor = ReconhecedorDeVideo(
+        modelo["face_media"], modelo["autofaces"], modelo["vetores_de_pesos"], modelo["rotulos"],
+        modelo["formato"], num_trabalhadores, tamanho_lote, capacidade_fila, politica,
+        pular_quadros, tempo_real, detectar_rostos)
+
+    inicio = time.perf_counter()
+    resultados, contadores = reconhecedor.processar(caminho_video, limite_quadros)
+    duracao = time.perf_counter() - inicio
+
+    if not resultados:
+        raise ValueError("Nenhum quadro do vídeo foi reconhecido.")
+
+    latencias_ms = np.array([resultado["latencia_ms"] for resultado in resultados])
+    valores, contagens = np.unique([resultado["rotulo"] for resultado in resultados],
+                                   return_counts=True)
+
+    relatorio = {
+        **contadores,
+        "quadros_reconhecidos": len(resultados),
+        "tempo_s": duracao,
+        "quadros_por_segundo": len(resultados) / max(duracao, 1e-9),
+        "quadros_lidos_por_segundo": contadores["quadros_lidos"] / max(duracao, 1e-9),
+        "latencia_ms": {
+            "p50": float(np.percentile(latencias_ms, 50)),
+            "p90": float(np.percentile(latencias_ms, 90)),
+            "p99": float(np.percentile(latencias_ms, 99)),
+            "max": float(latencias_ms.max()),
+        },
+        "rotulo_mais_frequente": str(valores[np.argmax(contagens)]),
+        "parametros": {
+            "num_trabalhadores": num_trabalhadores,
+            "tamanho_lote": tamanho_lote,
+            "capacidade_fila": capacidade_fila,
+            "politica": politica,
+            "pular_quadros": pular_quadros,
+            "tempo_real": tempo_real,
+        },
+        "quadros": resultados,
+    }
+    if instrumentacao_ativa():
+        relatorio["etapas"] = gerar_relatorio()
+
+    print(f"{len(resultados)} de {contadores['quadros_lidos']} quadros reconhecidos "
+          f"({relatorio['quadros_por_segundo']:.1f} quadros/s, "
+          f"{contadores['quadros_descartados']} descartados, "
+          f"latência p50 {relatorio['latencia_ms']['p50']:.1f} ms, "
+          f"p99 {relatorio['latencia_ms']['p99']:.1f} ms).")
+
+    if caminho_relatorio is not None:
+        with open(caminho_relatorio, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+
+    return relatorio
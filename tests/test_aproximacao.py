@@ -0,0 +1,20 @@
+import numpy as np
+from aproximacao import aproximar_imagem_postos, calcular_curva_erro, curva_de_erro
+
+
+def test_curva_igual_ao_erro_das_reconstrucoes():
+    gerador = np.random.default_rng(0)
+    autofaces = np.linalg.qr(gerador.normal(size=(120, 12)))[0].T.reshape(12, 10, 12)
+    face_media = gerador.random((10, 12)).astype(np.float32)
+    imagem = gerador.random((10, 12)).astype(np.float32)
+    postos = [0, 1, 4, 12]
+
+    aproximacoes, pesos, residuo = aproximar_imagem_postos(
+        imagem, face_media, autofaces, postos, retornar_projecao=True)
+    curva = curva_de_erro(pesos, residuo)
+
+    energia = np.linalg.norm(imagem - face_media)
+    erros = [np.linalg.norm(imagem - aproximacao) / energia for aproximacao in aproximacoes]
+    np.testing.assert_allclose(curva[postos], erros, rtol=1e-4)
+    np.testing.assert_allclose(calcular_curva_erro(imagem, face_media, autofaces), curva,
+                               rtol=1e-5)
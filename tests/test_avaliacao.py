@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+import avaliacao
+from auxiliares import montar_gram
+from avaliacao import remover_posto_um, avaliar_num_autofaces, avaliar_dobra
+
+
+def autopares_de_referencia(autovalores, vetor, rho, k):
+    valores, vetores = np.linalg.eigh(np.diag(autovalores) - rho * np.outer(vetor, vetor))
+    return valores[::-1][:k], vetores[:, ::-1][:, :k]
+
+
+@pytest.mark.parametrize("caso", ["distintos", "repetidos", "componentes_nulas", "k_maior"])
+def test_remover_posto_um_igual_a_eigh(caso):
+    gerador = np.random.default_rng(0)
+    autovalores = np.sort(gerador.gamma(1.0, size=40) * 10 ** gerador.uniform(-2, 2, 40))[::-1]
+    vetor = gerador.normal(size=40)
+    k = 10
+    if caso == "repetidos":
+        autovalores[[3, 4, 5, 20, 21]] = autovalores[3]
+        autovalores = np.sort(autovalores)[::-1]
+    elif caso == "componentes_nulas":
+        vetor[[0, 2, 7, 30]] = 0.0
+    elif caso == "k_maior":
+        k = 60
+
+    valores, vetores = remover_posto_um(autovalores, vetor, 0.8, k)
+    esperados, _ = autopares_de_referencia(autovalores, vetor, 0.8, k)
+    matriz = np.diag(autovalores) - 0.8 * np.outer(vetor, vetor)
+
+    escala = np.abs(esperados).max()
+    np.testing.assert_allclose(valores, esperados, rtol=0, atol=1e-12 * escala)
+    np.testing.assert_allclose(matriz @ vetores, vetores * valores, rtol=0, atol=1e-11 * escala)
+    np.testing.assert_allclose(vetores.T @ vetores, np.eye(len(valores)), atol=1e-10)
+
+
+def test_deixar_um_de_fora_igual_a_decompor_cada_dobra():
+    gerador = np.random.default_rng(1)
+    centros = gerador.normal(size=(6, 200))
+    rotulos = np.repeat(np.arange(6), 8)
+    imagens = (centros[rotulos] + 0.5 * gerador.normal(size=(48, 200))).astype(np.float32)
+    lista_autofaces = [1, 3, 10, 30]
+
+    resultado = avaliar_num_autofaces(imagens, rotulos, lista_autofaces, num_dobras=48,
+                                      num_processos=1)
+
+    avaliacao._COMPARTILHADO.update(
+        gram=montar_gram(imagens, imagens.mean(axis=0), simetrica=True), rotulos=rotulos)
+    for amostra in range(48):
+        esperado = avaliar_dobra(np.array([amostra]), lista_autofaces)
+        np.testing.assert_array_equal(resultado["acertos"][amostra], esperado["acertos"][0])
+        np.testing.assert_allclose(resultado["distancias"][amostra], esperado["distancias"][0],
+                                   rtol=1e-4, atol=1e-5)
@@ -0,0 +1,35 @@
+import cv2
+import pytest
+from auxiliares import carregar_arquivos
+from benchmark import gerar_faces_sinteticas
+from modelo import treinar_modelo
+from incremental import treinar_modelo_incremental
+from cadastro import cadastrar_pessoas, retreinar_modelo
+
+
+@pytest.fixture(scope="module")
+def arquivos(tmp_path_factory):
+    pasta = tmp_path_factory.mktemp("base")
+    imagens, _ = gerar_faces_sinteticas(40, 28, 23, canais=1, num_pessoas=8)
+    caminhos = [str(pasta / f"{i:02d}.png") for i in range(len(imagens))]
+    for caminho, imagem in zip(caminhos, imagens):
+        cv2.imwrite(caminho, imagem)
+    return caminhos
+
+
+@pytest.mark.parametrize("treinar", [
+    lambda arquivos: treinar_modelo(arquivos, None, 20, cinza=True, variancia_explicada=0.8),
+    lambda arquivos: treinar_modelo_incremental(arquivos, None, 12, 8, cinza=True,
+                                                variancia_explicada=0.9),
+])
+def test_retreino_mantem_os_parametros(arquivos, treinar):
+    modelo = treinar(arquivos[:30])
+    imagens, _ = carregar_arquivos(arquivos[30:], cinza=True)
+    cadastrado = cadastrar_pessoas(modelo, imagens, [""] * len(imagens), arquivos[30:])
+
+    retreinado = retreinar_modelo(cadastrado)
+    esperado = treinar(arquivos)
+
+    assert retreinado["parametros"] == modelo["parametros"]
+    assert len(retreinado["autofaces"]) == len(esperado["autofaces"])
+    assert retreinado["arquivos"] == arquivos
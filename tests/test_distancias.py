@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from distancias import buscar_k_vizinhos
+
+
+def distancias_completas(consultas, galeria):
+    diferencas = consultas[:, None, :].astype(np.float64) - galeria[None, :, :]
+    return np.sqrt((diferencas ** 2).sum(axis=2))
+
+
+def conferir_exatidao(indices, distancias, consultas, galeria, k):
+    """
+    Compara o resultado com o argsort das distâncias completas. Em empates, qualquer
+    índice com a mesma distância é aceito, desde que não se repita na linha.
+    """
+
+    completas = distancias_completas(consultas, galeria)
+    esperadas = np.take_along_axis(completas, np.argsort(completas, axis=1)[:, :k], axis=1)
+
+    assert indices.shape == distancias.shape == (len(consultas), min(k, len(galeria)))
+    np.testing.assert_allclose(distancias, esperadas, rtol=1e-5, atol=1e-4)
+    np.testing.assert_allclose(np.take_along_axis(completas, indices, axis=1), esperadas,
+                               rtol=1e-5, atol=1e-4)
+    for linha in indices:
+        assert len(np.unique(linha)) == len(linha)
+
+
+@pytest.mark.parametrize("k", [1, 5, 37])
+def test_igual_ao_argsort(k):
+    gerador = np.random.default_rng(0)
+    galeria = gerador.normal(size=(300, 16)).astype(np.float32)
+    consultas = gerador.normal(size=(50, 16)).astype(np.float32)
+
+    # Blocos pequenos para exercitar a combinação entre blocos de consultas e da galeria
+    indices, distancias = buscar_k_vizinhos(consultas, galeria, k=k, bloco_consultas=16,
+                                            bloco_galeria=64, num_threads=2)
+    conferir_exatidao(indices, distancias, consultas, galeria, k)
+
+
+def test_empates():
+    # Vetores inteiros e repetidos: muitas distâncias idênticas, calculadas sem arredondamento
+    gerador = np.random.default_rng(1)
+    distintos = gerador.integers(-2, 3, size=(20, 4)).astype(np.float32)
+    galeria = np.repeat(distintos, 5, axis=0)
+    consultas = np.vstack((distintos[:5], gerador.integers(-2, 3, size=(10, 4)))).astype(np.float32)
+
+    indices, distancias = buscar_k_vizinhos(consultas, galeria, k=7, bloco_galeria=16)
+    conferir_exatidao(indices, distancias, consultas, galeria, 7)
+    np.testing.assert_array_equal(distancias[:5, :5], 0.0)
+
+
+@pytest.mark.parametrize("k", [30, 31, 100])
+def test_k_maior_ou_igual_a_galeria(k):
+    gerador = np.random.default_rng(2)
+    galeria = gerador.normal(size=(30, 8)).astype(np.float32)
+    consultas = gerador.normal(size=(4, 8)).astype(np.float32)
+
+    indices, distancias = buscar_k_vizinhos(consultas, galeria, k=k, bloco_galeria=8)
+    conferir_exatidao(indices, distancias, consultas, galeria, k)
+    np.testing.assert_array_equal(np.sort(indices, axis=1), np.tile(np.arange(30), (4, 1)))
@@ -0,0 +1,20 @@
+import os
+import pytest
+from empacotamento import caminho_do_pacote
+
+
+def test_um_arquivo_usa_o_pacote_da_sua_pasta(tmp_path):
+    pasta = tmp_path / "s0"
+    arquivos = [str(pasta / "1.png"), str(pasta / "2.png")]
+
+    assert caminho_do_pacote(arquivos[:1], "cache") == caminho_do_pacote(arquivos, "cache")
+    assert caminho_do_pacote([os.path.relpath(arquivos[0])], "cache") == \
+        caminho_do_pacote(arquivos, "cache")
+    assert caminho_do_pacote(arquivos, "cache") != caminho_do_pacote(
+        arquivos + [str(tmp_path / "s1" / "1.png")], "cache")
+    assert caminho_do_pacote(arquivos, "cache") != caminho_do_pacote(arquivos, "cache", cinza=True)
+
+
+def test_lista_vazia():
+    with pytest.raises(ValueError, match="Não há arquivos"):
+        caminho_do_pacote([], "cache")
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+from fragmentos import GaleriaFragmentada
+from test_distancias import conferir_exatidao
+
+
+@pytest.fixture(scope="module")
+def gerador():
+    return np.random.default_rng(0)
+
+
+def test_igual_ao_argsort(gerador):
+    galeria = gerador.normal(size=(500, 16)).astype(np.float32)
+    consultas = gerador.normal(size=(40, 16)).astype(np.float32)
+
+    with GaleriaFragmentada(galeria, num_fragmentos=7, num_processos=2) as fragmentada:
+        for k in (1, 10):
+            indices, distancias = fragmentada.buscar(consultas, k=k)
+            conferir_exatidao(indices, distancias, consultas, galeria, k)
+
+
+def test_empates_entre_fragmentos(gerador):
+    # Cópias de cada vetor caem em fragmentos diferentes
+    distintos = gerador.integers(-2, 3, size=(10, 4)).astype(np.float32)
+    galeria = np.tile(distintos, (6, 1))
+    consultas = distintos[:5]
+
+    with GaleriaFragmentada(galeria, num_fragmentos=4, num_processos=2) as fragmentada:
+        indices, distancias = fragmentada.buscar(consultas, k=8)
+    conferir_exatidao(indices, distancias, consultas, galeria, 8)
+    np.testing.assert_array_equal(distancias[:, :6], 0.0)
+
+
+@pytest.mark.parametrize("k", [25, 60])
+def test_k_maior_ou_igual_a_galeria(gerador, k):
+    galeria = gerador.normal(size=(25, 8)).astype(np.float32)
+    consultas = gerador.normal(size=(3, 8)).astype(np.float32)
+
+    with GaleriaFragmentada(galeria, num_fragmentos=4, num_processos=2) as fragmentada:
+        indices, distancias = fragmentada.buscar(consultas, k=k)
+    conferir_exatidao(indices, distancias, consultas, galeria, k)
+    np.testing.assert_array_equal(np.sort(indices, axis=1), np.tile(np.arange(25), (3, 1)))
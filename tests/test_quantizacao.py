@@ -0,0 +1,22 @@
+import numpy as np
+from distancias import buscar_k_vizinhos
+from quantizacao import quantizar_galeria, buscar_galeria_quantizada
+
+REVOCACAO_MINIMA_INT8 = 0.9
+
+
+def test_revocacao_int8():
+    # Pesos com variância decrescente por dimensão, como os das autofaces
+    gerador = np.random.default_rng(0)
+    desvios = 1.0 / np.sqrt(np.arange(1, 65))
+    vetores = (gerador.normal(size=(5000, 64)) * desvios).astype(np.float32)
+    consultas = (vetores[:200] + gerador.normal(scale=0.05, size=(200, 64)) * desvios)
+
+    verdadeiros, _ = buscar_k_vizinhos(consultas, vetores, k=10)
+    galeria = quantizar_galeria(vetores, "int8")
+    encontrados, _ = buscar_galeria_quantizada(galeria, consultas, k=10, bloco_galeria=1024)
+
+    assert galeria["codigos"].dtype == np.int8
+    revocacao = np.mean([len(np.intersect1d(a, b)) for a, b in zip(verdadeiros, encontrados)]) / 10
+    assert revocacao >= REVOCACAO_MINIMA_INT8
+    assert np.mean(verdadeiros[:, 0] == encontrados[:, 0]) >= REVOCACAO_MINIMA_INT8
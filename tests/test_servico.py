@@ -0,0 +1,129 @@
+import json
+import base64
+import threading
+from concurrent.futures import Future
+from http.client import HTTPConnection
+from http.server import ThreadingHTTPServer
+import cv2
+import numpy as np
+import pytest
+from servico import Galeria, AgrupadorDeLotes, criar_manipulador
+
+FORMATO = (6, 5)
+
+
+@pytest.fixture
+def agrupador():
+    gerador = np.random.default_rng(0)
+    autofaces = np.linalg.qr(gerador.normal(size=(30, 4)))[0].T.astype(np.float32)
+    galeria = Galeria(gerador.normal(size=(8, 4)), [f"p{i}" for i in range(8)],
+                      [f"{i}.png" for i in range(8)])
+    return AgrupadorDeLotes(np.full(FORMATO, 0.5, dtype=np.float32), autofaces, galeria,
+                            espera_max_ms=1.0)
+
+
+@pytest.fixture
+def servir():
+    servidores = []
+
+    def iniciar(agrupador, tempo_limite=5.0):
+        servidor = ThreadingHTTPServer(
+            ("127.0.0.1", 0), criar_manipulador(agrupador, FORMATO, tempo_limite=tempo_limite))
+        threading.Thread(target=servidor.serve_forever, args=(0.05,), daemon=True).start()
+        servidores.append(servidor)
+        return servidor.server_address[1]
+
+    yield iniciar
+    for servidor in servidores:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def postar(porta, rota, corpo):
+    conexao = HTTPConnection("127.0.0.1", porta, timeout=10)
+    conexao.request("POST", rota, body=corpo, headers={"Content-Type": "application/json"})
+    resposta = conexao.getresponse()
+    status, conteudo = resposta.status, json.loads(resposta.read())
+    conexao.close()
+    return status, conteudo
+
+
+def imagem_base64():
+    ok, dados = cv2.imencode(".png", np.full(FORMATO, 128, dtype=np.uint8))
+    return base64.b64encode(dados.tobytes()).decode("ascii")
+
+
+@pytest.mark.parametrize("corpo", [
+    b"5", b"[1, 2]", b'"texto"', b"null", b"{nao e json", b"\xff\xfe",
+    b"{}", b'{"imagem": ""}', b'{"imagem": 5}', b'{"imagem": "bm8gZXMgaW1hZ2Vu"}',
+    b'{"caminho": "a.png"}',
+])
+def test_corpos_malformados_recebem_400(agrupador, servir, corpo):
+    porta = servir(agrupador)
+    for rota in ("/reconhecer", "/cadastrar"):
+        status, conteudo = postar(porta, rota, corpo)
+        assert status == 400
+        assert "erro" in conteudo
+
+
+def test_campos_invalidos_recebem_400(agrupador, servir):
+    porta = servir(agrupador)
+    imagem = imagem_base64()
+    assert postar(porta, "/reconhecer", json.dumps({"imagem": imagem, "k": "3"}))[0] == 400
+    assert postar(porta, "/reconhecer", json.dumps({"imagem": imagem, "k": 0}))[0] == 400
+    assert postar(porta, "/cadastrar", json.dumps({"imagem": imagem}))[0] == 400
+
+    status, conteudo = postar(porta, "/reconhecer", json.dumps({"imagem": imagem, "k": 3}))
+    assert status == 200 and len(conteudo["resultados"]) == 3
+
+
+class AgrupadorFalso:
+    """
+    Agrupador que devolve um Future pronto (ou nunca concluído) sem processar nada.
+    """
+
+    def __init__(self, futuro):
+        self.futuro = futuro
+        self.galeria = Galeria(np.zeros((0, 4)), [], [])
+        self.estatisticas = {}
+
+    def reconhecer(self, imagem, k=1):
+        return self.futuro
+
+
+def test_tempo_esgotado_recebe_504(servir):
+    porta = servir(AgrupadorFalso(Future()), tempo_limite=0.05)
+    status, _ = postar(porta, "/reconhecer", json.dumps({"imagem": imagem_base64()}))
+    assert status == 504
+
+
+def test_erro_inesperado_recebe_500(servir):
+    futuro = Future()
+    futuro.set_exception(RuntimeError("falha no lote"))
+    porta = servir(AgrupadorFalso(futuro))
+    status, conteudo = postar(porta, "/reconhecer", json.dumps({"imagem": imagem_base64()}))
+    assert status == 500
+    assert "falha no lote" in conteudo["erro"]
+
+
+def test_cadastro_nao_salvo_e_desfeito(agrupador, tmp_path, monkeypatch):
+    galeria = agrupador.galeria
+    galeria.caminho_cadastros = str(tmp_path / "cadastros.npy")
+
+    def falhar(dados, caminho):
+        raise OSError("disco cheio")
+
+    monkeypatch.setattr("servico.salvar_arrays", falhar)
+    imagem = np.full(FORMATO, 0.3, dtype=np.float32)
+    futuros = [agrupador.cadastrar(imagem, "z", "z.png"), agrupador.cadastrar(imagem, "w")]
+    for futuro in futuros:
+        with pytest.raises(OSError):
+            futuro.result(5)
+
+    assert galeria.tamanho == 8
+    assert galeria.rotulos == [f"p{i}" for i in range(8)]
+    assert len(galeria.arquivos) == 8
+
+    monkeypatch.undo()
+    assert agrupador.cadastrar(imagem, "z", "z.png").result(5) == 8
+    assert galeria.rotulos[8:] == ["z"] and galeria.tamanho == 9
@@ -20,8 +20,7 @@ def converter_pgm_para_png(pasta_raiz):
                 try:
                     with Image.open(caminho_pgm) as img:
                         img.save(novo_caminho_png, 'PNG')
-                        print(f"Convertido: {
-                              caminho_pgm} -> {novo_caminho_png}")
+                        print(f"Convertido: {caminho_pgm} -> {novo_caminho_png}")
 
                     os.remove(caminho_pgm)
                     print(f"Removido: {caminho_pgm}")
@@ -30,5 +29,6 @@ def converter_pgm_para_png(pasta_raiz):
                     print(f"Erro ao converter {caminho_pgm}: {e}")
 
 
-pasta_raiz = "../assets/images"
-converter_pgm_para_png(pasta_raiz)
+if __name__ == "__main__":
+    pasta_raiz = "../assets/images"
+    converter_pgm_para_png(pasta_raiz)
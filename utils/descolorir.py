@@ -26,5 +26,6 @@ def descolorir_arquivo(caminho_imagem):
     print(f"Imagem descolorida salva em: {caminho_saida}")
 
 
-caminho_imagem = '../assets/images/miltin.jpg'
-descolorir_arquivo(caminho_imagem)
+if __name__ == "__main__":
+    caminho_imagem = '../assets/images/miltin.jpg'
+    descolorir_arquivo(caminho_imagem)
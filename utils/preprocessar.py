@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+
+EXTENSOES_ENTRADA = (".pgm", ".png", ".jpg", ".jpeg")
+NOME_MANIFESTO = ".preprocessamento.json"
+
+
+def listar_entradas(pasta_raiz):
+    """
+    Lista as imagens de uma pasta e de suas subpastas, com caminhos relativos à pasta.
+
+    Args:
+        pasta_raiz (str): Caminho da pasta raiz onde as imagens estão localizadas.
+
+    Returns:
+        list: Caminhos relativos das imagens, em ordem.
+    """
+
+    entradas = []
+    for raiz, _, arquivos in os.walk(pasta_raiz):
+        for arquivo in arquivos:
+            if arquivo.lower().endswith(EXTENSOES_ENTRADA):
+                entradas.append(os.path.relpath(os.path.join(raiz, arquivo), pasta_raiz))
+    return sorted(entradas)
+
+
+def caminho_de_saida(relativo, pasta_saida, formato):
+    """
+    Define o caminho de saída de uma imagem, trocando a extensão pelo formato de saída.
+
+    Args:
+        relativo (str): Caminho da imagem relativo à pasta de entrada.
+        pasta_saida (str): Pasta de saída.
+        formato (str): Extensão de saída, como "png".
+
+    Returns:
+        str: Caminho do arquivo de saída.
+    """
+
+    return os.path.join(pasta_saida, os.path.splitext(relativo)[0] + "." + formato)
+
+
+def resumir_arquivo(caminho):
+    """
+    Calcula o hash SHA-1 do conteúdo de um arquivo.
+
+    Args:
+        caminho (str): Caminho do arquivo.
+
+    Returns:
+        str: Hash hexadecimal.
+    """
+
+    resumo = hashlib.sha1()
+    with open(caminho, "rb") as arquivo:
+        for bloco in iter(lambda: arquivo.read(1 << 20), b""):
+            resumo.update(bloco)
+    return resumo.hexdigest()
+
+
+def processar_arquivo(tarefa):
+    """
+    Aplica as etapas de pré-processamento a uma imagem, todas em memória: decodificação
+    (direto em escala de cinza, se pedido), redimensionamento e codificação no formato de
+    saída. A escrita é feita num arquivo temporário renomeado ao final.
+
+    Args:
+        tarefa (tuple): Caminho de entrada, caminho de saída, se converte para escala de
+            cinza, resolução (largura, altura) ou None e se calcula o hash da entrada.
+
+    Returns:
+        tuple: Caminho de saída, mensagem de erro (ou None), bytes lidos e hash da entrada
+        (ou None).
+    """
+
+    entrada, saida, cinza, resolucao, calcular_hash = tarefa
+    try:
+        imagem = cv2.imread(entrada, cv2.IMREAD_GRAYSCALE if cinza else cv2.IMREAD_UNCHANGED)
+        if imagem is None:
+            return saida, "não foi possível decodificar a imagem", 0, None
+
+        if resolucao is not None and (imagem.shape[1], imagem.shape[0]) != tuple(resolucao):
+            # INTER_AREA para reduções; ampliações ficam melhores com interpolação cúbica
+            reduzindo = resolucao[0] * resolucao[1] < imagem.shape[0] * imagem.shape[1]
+            imagem = cv2.resize(imagem, tuple(resolucao),
+                                interpolation=cv2.INTER_AREA if reduzindo else cv2.INTER_CUBIC)
+
+        extensao = os.path.splitext(saida)[1]
+        ok, codificada = cv2.imencode(extensao, imagem)
+        if not ok:
+            return saida, f"não foi possível codificar em {extensao}", 0, None
+
+        os.makedirs(os.path.dirname(saida), exist_ok=True)
+        temporario = f"{saida}.{os.getpid()}.tmp"
+        with open(temporario, "wb") as arquivo:
+            arquivo.write(codificada.tobytes())
+        os.replace(temporario, saida)
+
+        resumo = resumir_arquivo(entrada) if calcular_hash else None
+        return saida, None, os.path.getsize(entrada), resumo
+    except (OSError, cv2.error) as erro:
+        return saida, str(erro), 0, None
+
+
+def carregar_manifesto(pasta_saida):
+    """
+    Carrega o manifesto de uma pasta de saída, ou um manifesto vazio se ele não existir.
+
+    Args:
+        pasta_saida (str): Pasta de saída.
+
+    Returns:
+        dict: Manifesto com a assinatura dos parâmetros e, para cada imagem de entrada,
+        a data de modificação, o tamanho e (opcionalmente) o hash no último processamento.
+    """
+
+    caminho = os.path.join(pasta_saida, NOME_MANIFESTO)
+    if not os.path.exists(caminho):
+        return {"parametros": None, "arquivos": {}}
+    with open(caminho, encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+
+def salvar_manifesto(pasta_saida, manifesto):
+    """
+    Salva o manifesto de uma pasta de saída.
+
+    Args:
+        pasta_saida (str): Pasta de saída.
+        manifesto (dict): Manifesto a salvar.
+    """
+
+    os.makedirs(pasta_saida, exist_ok=True)
+    caminho = os.path.join(pasta_saida, NOME_MANIFESTO)
+    with open(caminho + ".tmp", "w", encoding="utf-8") as arquivo:
+        json.dump(manifesto, arquivo, ensure_ascii=False)
+    os.replace(caminho + ".tmp", caminho)
+
+
+def preprocessar(pasta_entrada, pasta_saida, cinza=False, resolucao=None, formato="png",
+                 usar_hash=False, num_processos=None, forcar=False):
+    """
+    Pré-processa uma árvore de imagens (conversão de PGM e outros formatos, escala de cinza
+    e redimensionamento) em paralelo, escrevendo o resultado numa árvore de saída com a
+    mesma estrutura.
+
+    O processamento é idempotente: o manifesto da pasta de saída guarda a data de
+    modificação e o tamanho (ou o hash, com `usar_hash`) de cada entrada, e as imagens que
+    não mudaram desde o último processamento com os mesmos parâmetros são puladas. As
+    saídas de entradas removidas (ou geradas com outro formato) são apagadas, para que a
+    árvore de saída não acumule imagens antigas. Entradas que levariam à mesma saída (como
+    "a.pgm" e "a.png" na mesma pasta) são reportadas como erro e não são processadas.
+
+    Args:
+        pasta_entrada (str): Pasta raiz com as imagens originais.
+        pasta_saida (str): Pasta raiz das imagens processadas.
+        cinza (bool, opcional): Se True, converte para escala de cinza. Padrão é False.
+        resolucao (tuple, opcional): Resolução de saída (largura, altura). Se None, mantém a
+            resolução original. Padrão é None.
+        formato (str, opcional): Formato de saída ("png" ou "jpg"). Padrão é "png".
+        usar_hash (bool, opcional): Se True, decide se uma imagem mudou pelo hash do
+            conteúdo, e não pela data de modificação e pelo tamanho. Padrão é False.
+        num_processos (int, opcional): Número de processos. Se None, usa o número de CPUs.
+            Padrão é None.
+        forcar (bool, opcional): Se True, reprocessa todas as imagens. Padrão é False.
+
+    Returns:
+        dict: Número de imagens processadas, puladas e com erro, tempo total e vazão.
+    """
+
+    inicio = time.perf_counter()
+    parametros = {"cinza": cinza, "resolucao": list(resolucao) if resolucao else None,
+                  "formato": formato}
+
+    anterior = carregar_manifesto(pasta_saida)
+    manifesto = anterior
+    if forcar or manifesto["parametros"] != parametros:
+        manifesto = {"parametros": parametros, "arquivos": {}}
+
+    entradas = listar_entradas(pasta_entrada)
+
+    # Entradas com a mesma saída não podem ser processadas sem que uma sobrescreva a outra
+    origens = {}
+    for relativo in entradas:
+        origens.setdefault(caminho_de_saida(relativo, pasta_saida, formato), []).append(relativo)
+    erros = [(relativo, f"mesma saída que {', '.join(r for r in conflitantes if r != relativo)}")
+             for conflitantes in origens.values() if len(conflitantes) > 1
+             for relativo in conflitantes]
+    em_conflito = {relativo for relativo, _ in erros}
+
+    # Saídas de entradas removidas (ou de outro formato) são apagadas, e as entradas saem
+    # do manifesto
+    if anterior["parametros"] is not None:
+        formato_anterior = anterior["parametros"]["formato"]
+        for relativo in anterior["arquivos"]:
+            saida_anterior = caminho_de_saida(relativo, pasta_saida, formato_anterior)
+            if saida_anterior not in origens and os.path.exists(saida_anterior):
+                os.remove(saida_anterior)
+    # Os registros das entradas em conflito são mantidos, para que a saída já existente
+    # continue associada à entrada que a gerou
+    manifesto["arquivos"] = {relativo: manifesto["arquivos"][relativo]
+                             for relativo in entradas if relativo in manifesto["arquivos"]}
+
+    tarefas = []
+    estados = {}
+    puladas = 0
+    for relativo in entradas:
+        if relativo in em_conflito:
+            continue
+        entrada = os.path.join(pasta_entrada, relativo)
+        saida = caminho_de_saida(relativo, pasta_saida, formato)
+        estado = os.stat(entrada)
+        estados[saida] = (relativo, estado.st_mtime_ns, estado.st_size)
+
+        registro = manifesto["arquivos"].get(relativo)
+        if registro is not None and os.path.exists(saida):
+            if registro["mtime"] == estado.st_mtime_ns and registro["tamanho"] == estado.st_size:
+                puladas += 1
+                continue
+            if usar_hash and registro.get("hash") == resumir_arquivo(entrada):
+                registro["mtime"] = estado.st_mtime_ns
+                puladas += 1
+                continue
+
+        tarefas.append((entrada, saida, cinza, resolucao, usar_hash))
+
+    bytes_lidos = 0
+    if tarefas:
+        num_processos = num_processos or os.cpu_count() or 1
+        tamanho_bloco = max(1, len(tarefas) // (num_processos * 8))
+        with ProcessPoolExecutor(max_workers=num_processos) as executor:
+            for saida, erro, tamanho, resumo in executor.map(
+                    processar_arquivo, tarefas, chunksize=tamanho_bloco):
+                relativo, mtime, tamanho_entrada = estados[saida]
+                if erro is not None:
+                    erros.append((relativo, erro))
+                    continue
+                bytes_lidos += tamanho
+                manifesto["arquivos"][relativo] = {
+                    "mtime": mtime, "tamanho": tamanho_entrada, "hash": resumo}
+
+    salvar_manifesto(pasta_saida, manifesto)
+
+    duracao = time.perf_counter() - inicio
+    processadas = len(tarefas) - (len(erros) - len(em_conflito))
+    for relativo, erro in erros:
+        print(f"Erro ao processar {relativo}: {erro}")
+    print(f"{processadas} imagens processadas, {puladas} já atualizadas e {len(erros)} com "
+          f"erro em {duracao:.2f} s ({processadas / max(duracao, 1e-9):.1f} imagens/s, "
+          f"{bytes_lidos / 2 ** 20 / max(duracao, 1e-9):.1f} MB/s).")
+
+    return {
+        "processadas": processadas,
+        "puladas": puladas,
+        "erros": len(erros),
+        "tempo_s": duracao,
+        "imagens_por_segundo": processadas / max(duracao, 1e-9),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Pré-processa uma base de imagens: conversão para PNG, escala de cinza "
+                    "e redimensionamento, em paralelo.")
+    parser.add_argument("entrada", help="Pasta raiz com as imagens originais.")
+    parser.add_argument("saida", help="Pasta raiz das imagens processadas.")
+    parser.add_argument("--cinza", action="store_true", help="Converte para escala de cinza.")
+    parser.add_argument("--resolucao", type=int, nargs=2, metavar=("LARGURA", "ALTURA"),
+                        help="Redimensiona para a resolução informada.")
+    parser.add_argument("--formato", choices=("png", "jpg"), default="png")
+    parser.add_argument("--hash", action="store_true",
+                        help="Detecta mudanças pelo hash do conteúdo.")
+    parser.add_argument("--processos", type=int, help="Número de processos.")
+    parser.add_argument("--forcar", action="store_true", help="Reprocessa todas as imagens.")
+    argumentos = parser.parse_args()
+
+    preprocessar(argumentos.entrada, argumentos.saida, argumentos.cinza, argumentos.resolucao,
+                 argumentos.formato, argumentos.hash, argumentos.processos, argumentos.forcar)
@@ -15,7 +15,8 @@ def redimensionar_imagens(pasta_raiz, largura=180, altura=220):
                     print(f"Imagem redimensionada: {caminho_imagem}")
 
 
-pastas = ["caminho/para/teste"]
+if __name__ == "__main__":
+    pastas = ["caminho/para/teste"]
 
-for pasta in pastas:
-    redimensionar_imagens(pasta)
+    for pasta in pastas:
+        redimensionar_imagens(pasta)